@@ -0,0 +1,288 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+from collections.abc import Mapping, MutableMapping
+from numbers import Number
+
+import numpy as np
+
+# Agent state fields that group several named quantities (see BaseAgent)
+STATE_GROUPS = ("inventory", "escrow", "endogenous")
+
+
+def _is_scalar(value):
+    return isinstance(value, Number) and not isinstance(value, complex)
+
+
+def _is_numeric_array(value):
+    return (
+        isinstance(value, np.ndarray)
+        and value.ndim > 0
+        and np.issubdtype(value.dtype, np.number)
+    )
+
+
+def _column_spec(value):
+    """Return the (shape, dtype, promote) of the column storing a state field holding
+    value (see AgentStateTable.add_column), or None if the field is not stored in the
+    table."""
+    if isinstance(value, np.generic) and _is_scalar(value):
+        return (), value.dtype, False
+    if isinstance(value, bool):
+        return (), np.bool_, True
+    if isinstance(value, int):
+        return (), np.int64, True
+    if _is_scalar(value):
+        return (), np.float64, False
+    if _is_numeric_array(value):
+        return value.shape, value.dtype, False
+    if isinstance(value, str):
+        return (), object, False
+    return None
+
+
+class AgentStateTable:
+    """Struct-of-arrays store of the numeric state fields of the mobile agents.
+
+    Each scalar state field (inventory, escrow and endogenous quantities, and any
+    scalar field added by components, such as "build_payment") is stored as a
+    contiguous (n_agents,) array, or column. Columns are identified by the path of
+    the field in the agent state, e.g. ("inventory", "Coin") or ("build_payment",).
+    Fields holding a python float when the agent is attached are stored as float64
+    columns, python ints as int64 columns and bools as bool columns. Since such
+    fields often start out as 0 and accumulate floats (e.g. the coin inventory),
+    writing floats to an int64 column (or ints to a bool column) through the table
+    promotes the column to float64 (or int64), instead of truncating the values.
+    Fields holding a numeric array (e.g. a history window) are stored as
+    (n_agents, ...) columns of that shape. Each agent sees its row as a writable
+    view, and assigning to the field writes into the row (so the shape of the field
+    is fixed). Fields holding a NumPy scalar or array keep its dtype (e.g.
+    np.int32), and string fields (e.g. a date) are stored as object columns.
+
+    Once an agent is attached to the table (see attach), its state becomes an
+    AgentStateView: a dict-like view that reads and writes its scalar fields in the
+    table, so that code using agent.state["inventory"]["Coin"] keeps working while
+    vectorized code reads or writes whole columns.
+
+    Args:
+        n_agents (int): The number of (mobile) agents.
+    """
+
+    def __init__(self, n_agents):
+        self.n_agents = int(n_agents)
+        assert self.n_agents > 0
+        self._columns = {}
+        # Keys of the columns that are promoted on assignment (see add_column)
+        self._promotable = set()
+
+    @staticmethod
+    def _key(key):
+        return tuple(key) if isinstance(key, (tuple, list)) else (key,)
+
+    def __contains__(self, key):
+        return self._key(key) in self._columns
+
+    def __getitem__(self, key):
+        """Return the (writable) column of key."""
+        return self._columns[self._key(key)]
+
+    def keys(self):
+        """Return the keys of all the columns."""
+        return self._columns.keys()
+
+    def add_column(
+        self, key, fill_value=0.0, shape=(), dtype=np.float64, promote=False
+    ):
+        """Add a column (if not already present) and return it.
+
+        Args:
+            key (str or tuple): The field name or path of the column.
+            fill_value (float): The initial value of the column.
+            shape (tuple): The shape of the field of each agent (() for scalars).
+            dtype (np.dtype): The dtype of the column.
+            promote (bool): Whether assign promotes the (integer or bool) column to
+                the type of the values written to it, when they do not fit its
+                dtype. Otherwise, the values are cast to the dtype of the column.
+        """
+        key = self._key(key)
+        shape = (self.n_agents,) + tuple(shape)
+        if key not in self._columns:
+            self._columns[key] = np.full(shape, fill_value, dtype=dtype)
+            if promote:
+                self._promotable.add(key)
+        assert self._columns[key].shape == shape
+        assert key in self._promotable or np.can_cast(dtype, self._columns[key].dtype)
+        return self._columns[key]
+
+    def assign(self, key, index, values):
+        """Write values to the rows index (e.g. an agent index, or slice(None) for
+        all the agents) of the column of key, promoting the column first if needed
+        (see add_column)."""
+        key = self._key(key)
+        column = self._columns[key]
+        if key in self._promotable:
+            dtype = np.promote_types(column.dtype, np.asarray(values).dtype)
+            if dtype != column.dtype and dtype.kind in "biuf":
+                column = self._columns[key] = column.astype(dtype)
+                if dtype.kind == "f":
+                    self._promotable.discard(key)
+        column[index] = values
+
+    def attach(self, agent):
+        """Move the numeric state fields of agent into the table, and replace its state
+        with a view over the table."""
+        assert 0 <= agent.idx < self.n_agents
+        state = agent.state
+        if isinstance(state, AgentStateView):
+            state = state.to_dict()
+
+        view = AgentStateView(self, agent.idx)
+        for name, value in state.items():
+            if name in STATE_GROUPS and isinstance(value, Mapping):
+                group = _StateGroupView(self, name, agent.idx)
+                for k, v in value.items():
+                    spec = _column_spec(v)
+                    if spec is not None:
+                        group.add_column(k, *spec)
+                    group[k] = v
+                view._fields[name] = group
+            else:
+                spec = _column_spec(value)
+                if spec is not None:
+                    view.add_column(name, *spec)
+                view[name] = value
+        agent.state = view
+
+
+class _StateGroupView(MutableMapping):
+    """Dict-like view of a group of state fields (e.g. the inventory) of one agent.
+
+    Fields with a column in the table are read from/written to the table. Other
+    fields (e.g. lists or fields added after the agent was attached) are stored in
+    the view itself.
+    """
+
+    def __init__(self, table, name, idx):
+        self._table = table
+        self._name = name
+        self._idx = idx
+        # Field name -> path of its column (None for fields stored in self._extra).
+        # (Columns are looked up by path, since the table may promote them.)
+        self._fields = {}
+        self._extra = {}
+
+    def _path(self, k):
+        return (self._name, k)
+
+    def add_column(self, k, shape=(), dtype=np.float64, promote=False):
+        self._table.add_column(self._path(k), shape=shape, dtype=dtype, promote=promote)
+        self._fields[k] = self._path(k)
+
+    def __getitem__(self, k):
+        path = self._fields[k]
+        if path is None:
+            return self._extra[k]
+        return self._table._columns[path][self._idx]
+
+    def __setitem__(self, k, v):
+        path = self._fields.get(k)
+        if path is not None:
+            column = self._table._columns[path]
+            if column.ndim == 1 and column.dtype != object and not _is_scalar(v):
+                raise TypeError(
+                    "State field {} is stored in the agent state table and must be a "
+                    "scalar (got {}).".format("/".join(path), type(v))
+                )
+            self._table.assign(path, self._idx, v)
+        else:
+            self._fields[k] = None
+            self._extra[k] = v
+
+    def __delitem__(self, k):
+        if self._fields[k] is not None:
+            raise TypeError(
+                "State field {} is stored in the agent state table and cannot be "
+                "deleted.".format("/".join(self._path(k)))
+            )
+        del self._fields[k]
+        del self._extra[k]
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def replace(self, values):
+        """Replace the contents of the group with values (a mapping), as when
+        assigning a new dictionary to the group."""
+        missing = [
+            k for k, c in self._fields.items() if c is not None and k not in values
+        ]
+        if missing:
+            raise KeyError(
+                "State fields {} of {} are stored in the agent state table and cannot "
+                "be removed.".format(missing, self._name)
+            )
+        for k in [k for k in self._extra if k not in values]:
+            del self[k]
+        for k, v in values.items():
+            self[k] = v
+
+    def to_dict(self):
+        """Return a copy of the group as a dictionary."""
+        values = {}
+        for k in self._fields:
+            v = self[k]
+            values[k] = v.copy() if isinstance(v, np.ndarray) else v
+        return values
+
+
+class AgentStateView(_StateGroupView):
+    """Dict-like view of the state of one agent, backed by an AgentStateTable.
+
+    Behaves like the agent state dictionary: state["inventory"] (as well as
+    state["escrow"] and state["endogenous"]) are dict-like views of the group fields,
+    and assigning a dictionary to them replaces their contents.
+    """
+
+    def __init__(self, table, idx):
+        super().__init__(table, None, idx)
+
+    def _path(self, k):
+        return (k,)
+
+    def __getitem__(self, k):
+        field = self._fields[k]
+        if isinstance(field, _StateGroupView):
+            return field
+        return super().__getitem__(k)
+
+    def __setitem__(self, k, v):
+        field = self._fields.get(k)
+        if isinstance(field, _StateGroupView):
+            if v is not field:
+                field.replace(v)
+        else:
+            super().__setitem__(k, v)
+
+    def __delitem__(self, k):
+        if isinstance(self._fields.get(k), _StateGroupView):
+            raise TypeError(
+                "State field {} is a group of the agent state table and cannot be "
+                "deleted.".format(k)
+            )
+        super().__delitem__(k)
+
+    def to_dict(self):
+        """Return a copy of the state as (nested) dictionaries."""
+        return {
+            k: v.to_dict() if isinstance(v, _StateGroupView) else v
+            for k, v in super().to_dict().items()
+        }
@@ -18,6 +18,8 @@ class BaseAgent:
     instances are stateful, capturing location, inventory, endogenous variables,
     and any additional state fields created by environment components during
     construction (see BaseComponent.get_additional_state_fields in base_component.py).
+    If the environment uses an agent state table (see AgentStateTable in
+    agent_state.py), the state of mobile agents is a dict-like view over the table.
 
     They also provide a simple API for getting/setting actions for each of their
     registered action subspaces (which depend on the components used to build
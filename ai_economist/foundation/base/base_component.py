@@ -91,6 +91,11 @@ class BaseComponent(ABC):
 
         self._inventory_scale = float(inventory_scale)
 
+        # Whether the dense log of this component will be collected in the current
+        # episode (set by the environment at each reset). Components may skip
+        # building dense log records while this is False.
+        self.dense_logging = True
+
     @property
     def world(self):
         """The world object of the environment this component instance is part of.
@@ -4,13 +4,15 @@
 # For full license text, see the LICENSE file in the repo root
 # or https://opensource.org/licenses/BSD-3-Clause
 
+import os
 import random
 from abc import ABC, abstractmethod
-from copy import deepcopy
 
 import numpy as np
 
 from ai_economist.foundation.agents import agent_registry
+from ai_economist.foundation.base.agent_state import AgentStateView
+from ai_economist.foundation.base.dense_log import DenseLog
 from ai_economist.foundation.base.registrar import Registry
 from ai_economist.foundation.base.world import World
 from ai_economist.foundation.components import component_registry
@@ -19,6 +21,7 @@ from ai_economist.foundation.entities import (
     landmark_registry,
     resource_registry,
 )
+from ai_economist.foundation.episode_log import StreamingDenseLog
 
 
 class BaseEnvironment(ABC):
@@ -160,6 +163,23 @@ class BaseEnvironment(ABC):
             (the default), the world state will be included in the dense log for
             timesteps where t is a multiple of 50.
             Note: More frequent world snapshots increase the dense log memory footprint.
+        collate_agent_step_and_reset_data (bool): Whether to collate all the mobile
+            agents' reset and step data into a single agent with index "a".
+        compact_replay_log (bool): Whether to record a compact replay log. By
+            default (compact_replay_log=False), the full numpy RNG state is stored
+            at reset and at every timestep. If True, a single integer seed is drawn
+            at reset and the numpy RNG is re-seeded at every timestep with a seed
+            derived from (episode seed, timestep), so that the replay log only
+            needs to store the episode seed and the actions.
+        use_agent_state_table (bool): Whether to store the scalar state fields of the
+            mobile agents (inventory, escrow, endogenous quantities, etc.) in a
+            struct-of-arrays table (see AgentStateTable in agent_state.py), so that
+            components can read and write them for all agents at once via
+            world.get_agent_state_column and world.set_agent_state_column. Agent
+            states remain accessible as dictionaries through agent.state. Note:
+            with the table, these fields are read back as NumPy scalars, whose dtype
+            follows the type of the field when the table is built (see
+            AgentStateTable). Default is False.
         seed (int, optional): If provided, sets the numpy and built-in random number
             generator seeds to seed. You can control the seed after env construction
             using the 'seed' method.
@@ -189,6 +209,8 @@ class BaseEnvironment(ABC):
         dense_log_frequency=None,
         world_dense_log_frequency=50,
         collate_agent_step_and_reset_data=False,
+        compact_replay_log=False,
+        use_agent_state_table=False,
         seed=None,
     ):
 
@@ -282,6 +304,11 @@ class BaseEnvironment(ABC):
         self._world_dense_log_frequency = int(world_dense_log_frequency)
         assert self._world_dense_log_frequency >= 1
 
+        # Where (if anywhere) to stream dense logs to while they are being created
+        # (see set_dense_log_directory)
+        self._dense_log_directory = None
+        self._dense_log_chunk_length = None
+
         # Seed control
         if seed is not None:
             self.seed(seed)
@@ -344,6 +371,8 @@ class BaseEnvironment(ABC):
             agent.register_components(self._components)
         self.world.planner.register_inventory(self.resources)
         self.world.planner.register_components(self._components)
+        if use_agent_state_table:
+            self.world.build_agent_state_table()
 
         self._agent_lookup = {str(agent.idx): agent for agent in self.all_agents}
 
@@ -352,13 +381,18 @@ class BaseEnvironment(ABC):
         self._last_ep_metrics = None
 
         # For dense logging
-        self._dense_log = {"world": [], "states": [], "actions": [], "rewards": []}
-        self._last_ep_dense_log = self.dense_log.copy()
+        self._dense_log = self._new_dense_log()
+        self._last_ep_dense_log = self._new_dense_log()
 
         # For episode replay
         self._replay_log = {"reset": dict(seed_state=None), "step": []}
         self._last_ep_replay_log = self.replay_log.copy()
 
+        # Whether to store an episode seed (rather than the full numpy RNG state
+        # at every timestep) in the replay log, and the seed of the current episode
+        self._compact_replay_log = bool(compact_replay_log)
+        self._episode_seed = None
+
         self._packagers = {}
 
         # To collate all the agents ('0', '1', ...) data during reset and step
@@ -439,7 +473,7 @@ class BaseEnvironment(ABC):
     @property
     def dense_log(self):
         """The contents of the current (potentially incomplete) dense log."""
-        return self._dense_log
+        return self._dense_log.to_dict()
 
     @property
     def replay_log(self):
@@ -448,8 +482,44 @@ class BaseEnvironment(ABC):
 
     @property
     def previous_episode_dense_log(self):
-        """Dense log from the last completed episode that was being logged."""
-        return self._last_ep_dense_log
+        """Dense log from the last completed episode that was being logged.
+
+        The dense log is recorded into preallocated arrays during the episode and is
+        only converted to its nested list/dict format when this property is first
+        accessed (see DenseLog in dense_log.py). If dense logs are streamed to disk
+        (see set_dense_log_directory), it is read back from disk.
+        """
+        return self._last_ep_dense_log.to_dict()
+
+    @property
+    def previous_episode_dense_log_dirpath(self):
+        """Directory holding the dense log from the last completed episode that was
+        being logged, if dense logs are streamed to disk (see
+        set_dense_log_directory). None otherwise."""
+        return getattr(self._last_ep_dense_log, "dirpath", None)
+
+    def set_dense_log_directory(self, directory, chunk_length=100):
+        """Stream the dense logs of the following episodes to disk.
+
+        Instead of being kept in memory until the end of the episode, each dense log
+        is written to its own sub-directory of directory (in the columnar format of
+        foundation/episode_log.py), chunk_length timesteps at a time. Only the last
+        chunk is buffered in memory. As with in-memory dense logs, only the log of the
+        last completed episode is kept (see previous_episode_dense_log_dirpath): the
+        sub-directory of an older log is deleted once a newer log is completed (or
+        when the episode is reset before it is done). Logs left in directory when
+        streaming is redirected are kept. Use directory=None to go back to
+        in-memory dense logs.
+
+        Args:
+            directory (str): Directory to write the dense logs to. The log of
+                episode N is written to <directory>/episode<N>.
+            chunk_length (int): Number of timesteps buffered in memory before they
+                are written to disk.
+        """
+        self._dense_log_directory = directory
+        self._dense_log_chunk_length = int(chunk_length)
+        assert self._dense_log_chunk_length >= 1
 
     @property
     def previous_episode_replay_log(self):
@@ -467,6 +537,11 @@ class BaseEnvironment(ABC):
                 _ = env.step(**replay_step)
             dense_log = env.previous_episode_dense_log
             metrics = env.previous_episode_metrics
+
+        If the environment uses a compact replay log, replay_log['reset'] holds the
+        episode seed and each replay_log['step'] entry only holds the actions; the
+        per-timestep RNG seeds are re-derived during the replay. See also
+        foundation.utils.replay_episode.
         """
         return self._last_ep_replay_log
 
@@ -493,6 +568,14 @@ class BaseEnvironment(ABC):
         np.random.seed(seed)
         random.seed(seed)
 
+    @staticmethod
+    def _seed_timestep(episode_seed, timestep):
+        """Re-seed the numpy RNG with a seed derived from (episode_seed, timestep).
+
+        Used for compact replay logging, where only the episode seed is stored.
+        """
+        np.random.seed([int(episode_seed), int(timestep)])
+
     # Getters & Setters
     # -----------------
 
@@ -767,35 +850,8 @@ class BaseEnvironment(ABC):
         if not self._dense_log_this_episode:
             return
 
-        def recursive_cast(d):
-            if isinstance(d, (list, tuple, set)):
-                new_d = [recursive_cast(v_) for v_ in d]
-                return new_d
-            if isinstance(d, dict):
-                for k, v in d.items():
-                    if isinstance(v, (list, tuple, set, dict)):
-                        d[k] = recursive_cast(v)
-                    elif isinstance(v, (int, float, str)):
-                        d[k] = v
-                    elif isinstance(v, (np.ndarray, np.integer, np.floating)):
-                        d[k] = v.tolist()
-                    else:
-                        raise NotImplementedError(
-                            "Not clear how to handle {} with type {}".format(k, type(v))
-                        )
-                return d
-            if isinstance(d, (int, float, str)):
-                return d
-            if isinstance(d, (np.ndarray, np.integer, np.floating)):
-                return d.tolist()
-            raise NotImplementedError(
-                "Not clear how to handle {} with type {}".format(d, type(d))
-            )
-
-        self._dense_log["world"].append(deepcopy(self.world.maps.state_dict))
-        self._dense_log["states"].append(
-            {str(agent.idx): deepcopy(agent.state) for agent in self.all_agents}
-        )
+        self._dense_log.log_world(self.world.maps.state_dict)
+        self._dense_log.log_states(self._get_agent_states_for_log())
 
         # Back-fill the log with each component's dense log to complete the aggregate
         # dense log
@@ -805,13 +861,53 @@ class BaseEnvironment(ABC):
                 continue
             if isinstance(component_log, dict):
                 for k, v in component_log.items():
-                    self._dense_log[component.shorthand + "-" + k] = v
+                    self._dense_log.add_component_log(component.shorthand + "-" + k, v)
             elif isinstance(component_log, (tuple, list)):
-                self._dense_log[component.shorthand] = list(component_log)
+                self._dense_log.add_component_log(
+                    component.shorthand, list(component_log)
+                )
             else:
                 raise TypeError
 
-        self._last_ep_dense_log = recursive_cast(self._dense_log)
+        self._dense_log.close()
+        superseded_dense_log = self._last_ep_dense_log
+        self._last_ep_dense_log = self._dense_log
+        self._discard_dense_log(superseded_dense_log)
+
+    def _get_agent_states_for_log(self):
+        # Agent states backed by the agent state table are logged as plain dicts
+        return {
+            str(agent.idx): (
+                agent.state.to_dict()
+                if isinstance(agent.state, AgentStateView)
+                else agent.state
+            )
+            for agent in self.all_agents
+        }
+
+    def _new_dense_log(self):
+        if self._dense_log_directory is not None and self._dense_log_this_episode:
+            return StreamingDenseLog(
+                os.path.join(
+                    self._dense_log_directory,
+                    "episode{:06d}".format(self._completions),
+                ),
+                chunk_length=self._dense_log_chunk_length,
+            )
+        return DenseLog(self._episode_length, self._world_dense_log_frequency)
+
+    def _discard_dense_log(self, dense_log):
+        # Dense logs streamed to the current directory are deleted from disk once
+        # they are superseded, unless they are the log of the last completed episode,
+        # so that only that one is kept (as in memory)
+        if (
+            isinstance(dense_log, StreamingDenseLog)
+            and self._dense_log_directory is not None
+            and os.path.dirname(os.path.normpath(dense_log.dirpath))
+            == os.path.normpath(self._dense_log_directory)
+            and dense_log is not self._last_ep_dense_log
+        ):
+            dense_log.delete()
 
     def collate_agent_obs(self, obs):
         # Collating observations from all agents
@@ -849,7 +945,7 @@ class BaseEnvironment(ABC):
             del info[str(agent_idx)]
         return info
 
-    def reset(self, seed_state=None, force_dense_logging=False):
+    def reset(self, seed_state=None, force_dense_logging=False, seed=None):
         """
         Reset the state of the environment to initialize a new episode.
 
@@ -860,6 +956,13 @@ class BaseEnvironment(ABC):
             force_dense_logging (bool): Optional whether to force dense logging to take
                 place this episode; default behavior is to do dense logging every
                 create_dense_log_every episodes
+            seed (int): Optional episode seed. If provided (or if the environment
+                uses a compact replay log), the numpy RNG is seeded with it prior to
+                the reset cycle and re-seeded at every step with a seed derived from
+                (seed, timestep). Only the episode seed is stored in the replay log.
+                Cannot be combined with seed_state. If a seed_state is given (e.g.,
+                when replaying a full replay log), the episode is recorded with the
+                full RNG states, even if the environment uses a compact replay log.
 
         Returns:
             obs (dict): A dictionary of {"agent_idx": agent_obs} with an entry for
@@ -868,6 +971,12 @@ class BaseEnvironment(ABC):
                 which itself is a dictionary. The "agent_idx" key matches the
                 agent.idx property for the given agent.
         """
+        if seed is not None and seed_state is not None:
+            raise ValueError(
+                "Only one of 'seed' and 'seed_state' can be provided to reset the "
+                "environment."
+            )
+
         if seed_state is not None:
             assert isinstance(seed_state, (tuple, list))
             assert len(seed_state) == 5
@@ -889,11 +998,24 @@ class BaseEnvironment(ABC):
                 self._completions % self._create_dense_log_every
             ) == 0
 
-        # For dense logging
-        self._dense_log = {"world": [], "states": [], "actions": [], "rewards": []}
+        # For dense logging (an unfinished log is deleted first, as the new one may be
+        # streamed to the same directory)
+        self._discard_dense_log(self._dense_log)
+        self._dense_log = self._new_dense_log()
 
         # For episode replay
-        self._replay_log = {"reset": dict(seed_state=np.random.get_state()), "step": []}
+        if seed is None and seed_state is None and self._compact_replay_log:
+            seed = np.random.randint(1, np.iinfo(np.int32).max)
+        if seed is not None:
+            self._episode_seed = int(seed)
+            self._seed_timestep(self._episode_seed, 0)
+            self._replay_log = {"reset": dict(seed=self._episode_seed), "step": []}
+        else:
+            self._episode_seed = None
+            self._replay_log = {
+                "reset": dict(seed_state=np.random.get_state()),
+                "step": [],
+            }
 
         # Reset the timestep counter
         self.world.timestep = 0
@@ -905,6 +1027,7 @@ class BaseEnvironment(ABC):
 
         # Perform the component resets for each registered component
         for component in self._components:
+            component.dense_logging = self._dense_log_this_episode
             component.reset()
 
         # Take any customized reset actions
@@ -975,22 +1098,29 @@ class BaseEnvironment(ABC):
                 int(seed_state[3]),
                 float(seed_state[4]),
             )
+            if self._episode_seed is not None:
+                raise ValueError(
+                    "A seed_state cannot be provided to step an episode that was "
+                    "reset with an episode seed; the RNG is re-seeded from the "
+                    "episode seed at every step."
+                )
             np.random.set_state(seed_state)
 
-        self._replay_log["step"].append(
-            dict(actions=actions, seed_state=np.random.get_state())
-        )
+        if self._episode_seed is not None:
+            self._seed_timestep(self._episode_seed, self.world.timestep + 1)
+            self._replay_log["step"].append(dict(actions=actions))
+        else:
+            self._replay_log["step"].append(
+                dict(actions=actions, seed_state=np.random.get_state())
+            )
 
         if self._dense_log_this_episode:
-            self._dense_log["world"].append(
-                deepcopy(self.world.maps.state_dict)
-                if (self.world.timestep % self._world_dense_log_frequency) == 0
-                else {}
-            )
-            self._dense_log["states"].append(
-                {str(agent.idx): deepcopy(agent.state) for agent in self.all_agents}
+            self._dense_log.log_world(
+                self.world.maps.state_dict,
+                snapshot=(self.world.timestep % self._world_dense_log_frequency) == 0,
             )
-            self._dense_log["actions"].append(
+            self._dense_log.log_states(self._get_agent_states_for_log())
+            self._dense_log.log_actions(
                 {
                     str(agent.idx): {k: v for k, v in agent.action.items() if v > 0}
                     for agent in self.all_agents
@@ -1013,7 +1143,7 @@ class BaseEnvironment(ABC):
         info = {k: {} for k in obs.keys()}
 
         if self._dense_log_this_episode:
-            self._dense_log["rewards"].append(rew)
+            self._dense_log.log_rewards(rew)
 
         for agent in self.all_agents:
             agent.reset_actions()
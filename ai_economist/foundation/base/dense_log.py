@@ -0,0 +1,379 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+from copy import deepcopy
+
+import numpy as np
+
+# Type codes used to restore the python type of each logged numeric value
+_FLOAT, _INT, _BOOL = 0, 1, 2
+_KIND_TO_CODE = {"f": _FLOAT, "i": _INT, "u": _INT, "b": _BOOL}
+
+
+def recursive_cast(d):
+    """Recursively convert numpy arrays and scalars (and tuples/sets) inside d into
+    native python lists and scalars, so that d can be JSON-encoded."""
+    if isinstance(d, (list, tuple, set)):
+        new_d = [recursive_cast(v_) for v_ in d]
+        return new_d
+    if isinstance(d, dict):
+        for k, v in d.items():
+            if isinstance(v, (list, tuple, set, dict)):
+                d[k] = recursive_cast(v)
+            elif isinstance(v, (int, float, str)):
+                d[k] = v
+            elif isinstance(v, (np.ndarray, np.integer, np.floating)):
+                d[k] = v.tolist()
+            else:
+                raise NotImplementedError(
+                    "Not clear how to handle {} with type {}".format(k, type(v))
+                )
+        return d
+    if isinstance(d, (int, float, str)):
+        return d
+    if isinstance(d, (np.ndarray, np.integer, np.floating)):
+        return d.tolist()
+    raise NotImplementedError(
+        "Not clear how to handle {} with type {}".format(d, type(d))
+    )
+
+
+def collect_leaves(d, prefix, leaves):
+    """Append the (path, value) pairs of all the leaves of d to leaves. Empty
+    dictionaries are treated as leaves."""
+    for k, v in d.items():
+        if isinstance(v, dict) and v:
+            collect_leaves(v, prefix + (k,), leaves)
+        else:
+            leaves.append((prefix + (k,), v))
+
+
+def _numeric_leaf(v):
+    """Return (flat values, type code, shape) if v can be stored in a numeric buffer,
+    or None if it has to be stored as a python object."""
+    if isinstance(v, (bool, np.bool_)):
+        return [bool(v)], _BOOL, ()
+    if isinstance(v, (int, np.integer)):
+        return [v], _INT, ()
+    if isinstance(v, (float, np.floating)):
+        return [v], _FLOAT, ()
+    if isinstance(v, np.ndarray):
+        code = _KIND_TO_CODE.get(v.dtype.kind)
+        if code is None:
+            return None
+        return v.ravel().tolist(), code, v.shape
+    if isinstance(v, (list, tuple)) and v:
+        # Only homogeneous, flat lists are stored numerically, so that they are
+        # restored exactly (e.g. agent locations)
+        if all(isinstance(x, (int, np.integer)) for x in v) and not any(
+            isinstance(x, (bool, np.bool_)) for x in v
+        ):
+            return list(v), _INT, (len(v),)
+        if all(isinstance(x, (float, np.floating)) for x in v):
+            return list(v), _FLOAT, (len(v),)
+    return None
+
+
+def _restore(values, code, shape):
+    """Inverse of _numeric_leaf: convert buffer values back to python types."""
+    if code == _INT:
+        values = values.astype(np.int64)
+    elif code == _BOOL:
+        values = values.astype(bool)
+    if shape == ():
+        return values[0].item()
+    return values.reshape(shape).tolist()
+
+
+def build_nested(paths, values):
+    """Build a nested dictionary from a list of leaf paths and values."""
+    d = {}
+    for path, value in zip(paths, values):
+        sub_d = d
+        for k in path[:-1]:
+            sub_d = sub_d.setdefault(k, {})
+        sub_d[path[-1]] = value
+    return d
+
+
+class _StateGroup:
+    """Preallocated buffers for a group of agents that share the same state layout.
+
+    Numeric leaves are flattened into columns of a (timesteps x agents x columns)
+    float64 value buffer with a matching int8 type-code buffer, so that each value
+    is restored with its original python type. Non-numeric leaves are stored as
+    python objects.
+    """
+
+    def __init__(self, agent_keys, leaves, capacity):
+        self.agent_keys = list(agent_keys)
+        self.slot = {k: i for i, k in enumerate(self.agent_keys)}
+        self.paths = [path for path, _ in leaves]
+
+        # For each leaf: (column slice, shape) if numeric, else None
+        self.layout = []
+        n_cols = 0
+        for _, v in leaves:
+            numeric = _numeric_leaf(v)
+            if numeric is None:
+                self.layout.append(None)
+            else:
+                n = len(numeric[0])
+                self.layout.append((slice(n_cols, n_cols + n), numeric[2]))
+                n_cols += n
+        self.n_cols = n_cols
+        self.has_objects = any(leaf_layout is None for leaf_layout in self.layout)
+
+        n_agents = len(self.agent_keys)
+        self.values = np.zeros((capacity, n_agents, n_cols), dtype=np.float64)
+        self.codes = np.zeros((capacity, n_agents, n_cols), dtype=np.int8)
+        self.objects = {}
+
+        # The first logged step that includes these agents
+        self.first_row = 0
+
+    def grow(self, capacity):
+        """Extend the buffers along the time dimension to the new capacity."""
+        extra = capacity - self.values.shape[0]
+        if extra <= 0:
+            return
+        self.values = np.concatenate(
+            [self.values, np.zeros((extra,) + self.values.shape[1:])], axis=0
+        )
+        self.codes = np.concatenate(
+            [self.codes, np.zeros((extra,) + self.codes.shape[1:], dtype=np.int8)],
+            axis=0,
+        )
+
+    def write(self, t, agent_key, leaves):
+        """Write the state leaves of an agent. Returns False if the leaves do not
+        match the layout of this group."""
+        if len(leaves) != len(self.paths):
+            return False
+        i = self.slot[agent_key]
+        row_values = self.values[t, i]
+        row_codes = self.codes[t, i]
+        objects = []
+        for (path, v), expected_path, leaf_layout in zip(
+            leaves, self.paths, self.layout
+        ):
+            if path != expected_path:
+                return False
+            if leaf_layout is None:
+                objects.append(deepcopy(v))
+                continue
+            numeric = _numeric_leaf(v)
+            if numeric is None or numeric[2] != leaf_layout[1]:
+                return False
+            row_values[leaf_layout[0]] = numeric[0]
+            row_codes[leaf_layout[0]] = numeric[1]
+        if self.has_objects:
+            self.objects[(t, i)] = objects
+        return True
+
+    def read(self, t, agent_key):
+        """Return the (nested) state dictionary of an agent at logged step t."""
+        i = self.slot[agent_key]
+        objects = iter(self.objects.get((t, i), []))
+        row_values = self.values[t, i]
+        row_codes = self.codes[t, i]
+        values = []
+        for leaf_layout in self.layout:
+            if leaf_layout is None:
+                values.append(recursive_cast(deepcopy(next(objects))))
+                continue
+            cols, shape = leaf_layout
+            values.append(_restore(row_values[cols], row_codes[cols][0], shape))
+        return build_nested(self.paths, values)
+
+
+class DenseLog:
+    """Array-backed dense log of an episode.
+
+    Agent states and world map snapshots are written in place into typed numpy
+    buffers that are preallocated on the first logged step (episode_length x agents
+    x fields for agent states and snapshots x map channels x H x W for the world
+    maps), instead of being deep-copied at every timestep. The nested list/dict
+    format of the dense log (see BaseEnvironment.previous_episode_dense_log) is
+    only created when requested through to_dict(), and is cached afterwards.
+
+    Args:
+        episode_length (int): Number of timesteps in an episode.
+        world_dense_log_frequency (int): How often (in timesteps) the world maps are
+            logged.
+    """
+
+    def __init__(self, episode_length, world_dense_log_frequency):
+        self.episode_length = int(episode_length)
+        self.world_dense_log_frequency = int(world_dense_log_frequency)
+
+        # One entry per logged step: the world snapshot index (or None)
+        self._world_rows = []
+        self._world_keys = None
+        self._world_maps = None
+        self._world_dtypes = []
+
+        self._n_state_rows = 0
+        self._state_groups = []
+        self._agent_group = {}
+        # States that did not fit the buffer layout, keyed by (row, agent_key)
+        self._state_overrides = {}
+
+        self.actions = []
+        self.rewards = []
+        self.component_logs = {}
+
+        self._as_dict = None
+
+    @property
+    def n_world_snapshots(self):
+        """Number of world map snapshots logged so far."""
+        return len(self._world_dtypes)
+
+    def _state_capacity(self):
+        return self.episode_length + 1
+
+    def _world_capacity(self):
+        return self.episode_length // self.world_dense_log_frequency + 2
+
+    # Logging
+    # -------
+
+    def log_world(self, state_dict, snapshot=True):
+        """Log a snapshot of the world maps (or an empty entry if snapshot=False)."""
+        self._as_dict = None
+        if not snapshot:
+            self._world_rows.append(None)
+            return
+
+        leaves = []
+        collect_leaves(state_dict, (), leaves)
+        if self._world_maps is None:
+            self._world_keys = [path for path, _ in leaves]
+            shape = np.shape(leaves[0][1]) if leaves else (0, 0)
+            self._world_maps = np.zeros(
+                (self._world_capacity(), len(leaves)) + tuple(shape), dtype=np.float64
+            )
+        assert [path for path, _ in leaves] == self._world_keys
+
+        s = self.n_world_snapshots
+        if s >= self._world_maps.shape[0]:
+            self._world_maps = np.concatenate(
+                [self._world_maps, np.zeros_like(self._world_maps)], axis=0
+            )
+        for c, (_, world_map) in enumerate(leaves):
+            self._world_maps[s, c] = world_map
+        self._world_dtypes.append([np.asarray(v).dtype for _, v in leaves])
+        self._world_rows.append(s)
+
+    def log_states(self, agent_states):
+        """Log the states of all the agents, given as {agent_key: state_dict}."""
+        self._as_dict = None
+        t = self._n_state_rows
+        agent_leaves = {}
+        for agent_key, state in agent_states.items():
+            leaves = []
+            collect_leaves(state, (), leaves)
+            agent_leaves[agent_key] = leaves
+
+        new_agent_keys = [k for k in agent_leaves if k not in self._agent_group]
+        if new_agent_keys:
+            self._add_groups(t, new_agent_keys, agent_leaves)
+
+        for agent_key, leaves in agent_leaves.items():
+            group = self._agent_group[agent_key]
+            if t >= group.values.shape[0]:
+                group.grow(2 * group.values.shape[0])
+            if not group.write(t, agent_key, leaves):
+                self._state_overrides[(t, agent_key)] = deepcopy(
+                    agent_states[agent_key]
+                )
+        self._n_state_rows += 1
+
+    def _add_groups(self, t, agent_keys, agent_leaves):
+        """Allocate the buffers for agents logged for the first time at step t,
+        grouping together the agents with the same state layout."""
+        groups = {}
+        for agent_key in agent_keys:
+            paths = tuple(path for path, _ in agent_leaves[agent_key])
+            groups.setdefault(paths, []).append(agent_key)
+        for group_agent_keys in groups.values():
+            group = _StateGroup(
+                group_agent_keys,
+                agent_leaves[group_agent_keys[0]],
+                max(self._state_capacity(), t + 1),
+            )
+            group.first_row = t
+            self._state_groups.append(group)
+            for agent_key in group_agent_keys:
+                self._agent_group[agent_key] = group
+
+    def log_actions(self, actions):
+        """Log the (non-NO-OP) actions of all the agents."""
+        self._as_dict = None
+        self.actions.append(actions)
+
+    def log_rewards(self, rewards):
+        """Log the rewards of all the agents."""
+        self._as_dict = None
+        self.rewards.append(rewards)
+
+    def add_component_log(self, key, log):
+        """Add the dense log of a component under key."""
+        self._as_dict = None
+        self.component_logs[key] = log
+
+    def close(self):
+        """Mark the end of the episode. Nothing to do for an in-memory log."""
+
+    # Reading
+    # -------
+
+    @property
+    def n_state_rows(self):
+        """Number of logged agent-state entries."""
+        return self._n_state_rows
+
+    def get_world(self, t):
+        """Return the world maps logged at step t (an empty dict if not logged)."""
+        s = self._world_rows[t]
+        if s is None:
+            return {}
+        values = [
+            self._world_maps[s, c].astype(dtype).tolist()
+            for c, dtype in enumerate(self._world_dtypes[s])
+        ]
+        return build_nested(self._world_keys, values)
+
+    def get_states(self, t):
+        """Return {agent_key: state_dict} as logged at step t."""
+        states = {}
+        for agent_key, group in self._agent_group.items():
+            if t < group.first_row:
+                continue
+            if (t, agent_key) in self._state_overrides:
+                states[agent_key] = recursive_cast(
+                    deepcopy(self._state_overrides[(t, agent_key)])
+                )
+            else:
+                states[agent_key] = group.read(t, agent_key)
+        return states
+
+    def to_dict(self):
+        """Return the dense log in its (JSON-compatible) nested list/dict format.
+
+        The result is cached until something new is logged.
+        """
+        if self._as_dict is None:
+            dense_log = {
+                "world": [self.get_world(t) for t in range(len(self._world_rows))],
+                "states": [self.get_states(t) for t in range(self._n_state_rows)],
+                "actions": recursive_cast(self.actions),
+                "rewards": recursive_cast(self.rewards),
+            }
+            dense_log.update(recursive_cast(self.component_logs))
+            self._as_dict = dense_log
+        return self._as_dict
@@ -7,6 +7,7 @@
 import numpy as np
 
 from ai_economist.foundation.agents import agent_registry
+from ai_economist.foundation.base.agent_state import AgentStateTable
 from ai_economist.foundation.entities import landmark_registry, resource_registry
 
 
@@ -92,23 +93,46 @@ class Maps:
             else:
                 raise NotImplementedError
 
+        # All the maps returned by get (including the health of private landmarks)
+        # are views into one contiguous (C x H x W) buffer, so that the stacked map
+        # state is available without copying
+        self._state = np.zeros([len(self._maps)] + list(self.size), dtype=np.float32)
+        self._state_channels = {}
+        for channel, entity_name in enumerate(self._maps.keys()):
+            self._state_channels[entity_name] = channel
+            if entity_name in self._private_landmark_types:
+                self._maps[entity_name]["health"] = self._state[channel]
+            else:
+                self._maps[entity_name] = self._state[channel]
+        self._empty = None
+
+        # The dtype of each (non-private) map as set by the scenario, which is the
+        # dtype state_dict returns it with (the buffer itself is always float32)
+        self._map_dtypes = {
+            entity_name: np.dtype(np.float64)
+            for entity_name in self._maps
+            if entity_name not in self._private_landmark_types
+        }
+
         self._idx_map = np.stack(
             [i * np.ones(shape=self.size) for i in range(self.n_agents)]
         )
         self._idx_array = np.arange(self.n_agents)
+        # Per-landmark accessibility, and the net accessibility (the product over
+        # landmarks), which is kept up to date on the cells that change
         if self._accessibility_lookup:
             self._accessibility = np.ones(
                 shape=[len(self._accessibility_lookup), self.n_agents] + self.size,
                 dtype=bool,
             )
-            self._net_accessibility = None
         else:
             self._accessibility = None
-            self._net_accessibility = np.ones(
-                shape=[self.n_agents] + self.size, dtype=bool
-            )
+        self._net_accessibility = np.ones(shape=[self.n_agents] + self.size, dtype=bool)
 
-        self._agent_locs = [None for _ in range(self.n_agents)]
+        # Agent locations ([-1, -1] for agents that are not on the map) and the map
+        # of which agent (if any, else -1) occupies each location
+        self._agent_locs = -np.ones((self.n_agents, 2), dtype=np.int64)
+        self._loc_map = -np.ones(shape=self.size, dtype=np.int16)
         self._unoccupied = np.ones(self.size, dtype=bool)
 
     def clear(self, entity_name=None):
@@ -116,36 +140,38 @@ class Maps:
         if entity_name is not None:
             assert entity_name in self._maps
             if entity_name in self._private_landmark_types:
-                self._maps[entity_name] = dict(
-                    owner=-np.ones(shape=self.size, dtype=np.int16),
-                    health=np.zeros(shape=self.size),
+                self._maps[entity_name]["owner"] = -np.ones(
+                    shape=self.size, dtype=np.int16
+                )
+            self._state[self._state_channels[entity_name]] = 0
+            self._empty = None
+
+            if entity_name in self._accessibility_lookup:
+                self._set_accessibility(
+                    entity_name, np.ones(shape=[self.n_agents] + self.size, dtype=bool)
                 )
-            else:
-                self._maps[entity_name] *= 0
 
         else:
             for name in self.keys():
                 self.clear(entity_name=name)
 
-        if self._accessibility is not None:
-            self._accessibility = np.ones_like(self._accessibility)
-            self._net_accessibility = None
-
     def clear_agent_loc(self, agent=None):
         """Remove agents or agent from the world map."""
         # Clear all agent locations
         if agent is None:
-            self._agent_locs = [None for _ in range(self.n_agents)]
+            self._agent_locs[:] = -1
+            self._loc_map[:, :] = -1
             self._unoccupied[:, :] = 1
 
         # Clear the location of the provided agent
         else:
             i = agent.idx
-            if self._agent_locs[i] is None:
+            if self._agent_locs[i, 0] < 0:
                 return
             r, c = self._agent_locs[i]
             self._unoccupied[r, c] = 1
-            self._agent_locs[i] = None
+            self._loc_map[r, c] = -1
+            self._agent_locs[i] = -1
 
     def set_agent_loc(self, agent, r, c):
         """Set the location of agent to [r, c].
@@ -157,7 +183,7 @@ class Maps:
         assert (0 <= r < self.size[0]) and (0 <= c < self.size[1])
         i = agent.idx
         # If the agent is currently on the board...
-        if self._agent_locs[i] is not None:
+        if self._agent_locs[i, 0] >= 0:
             curr_r, curr_c = self._agent_locs[i]
             # If the agent isn't actually moving, just return
             if (curr_r, curr_c) == (r, c):
@@ -165,12 +191,14 @@ class Maps:
             # Make the location the agent is currently at as unoccupied
             # (since the agent is going to move)
             self._unoccupied[curr_r, curr_c] = 1
+            self._loc_map[curr_r, curr_c] = -1
 
         # Set the agent location to the specified coordinates
-        # and update the occupation map
+        # and update the occupation and agent index maps
         agent.state["loc"] = [r, c]
         self._agent_locs[i] = [r, c]
         self._unoccupied[r, c] = 0
+        self._loc_map[r, c] = i
 
     def keys(self):
         """Return an iterable over map keys."""
@@ -208,29 +236,44 @@ class Maps:
             if len(tmp) > 0:
                 assert np.min(tmp) >= 0
 
-            self._maps[entity_name] = dict(owner=o, health=h)
+            self._maps[entity_name]["owner"] = o
+            self._set_layer(entity_name, h)
 
             owned_by_agent = o[None] == self._idx_map
             owned_by_none = o[None] == -1
-            self._accessibility[
-                self._accessibility_lookup[entity_name]
-            ] = np.logical_or(owned_by_agent, owned_by_none)
-            self._net_accessibility = None
+            self._set_accessibility(
+                entity_name, np.logical_or(owned_by_agent, owned_by_none)
+            )
 
         else:
             assert self.get(entity_name).shape == map_state.shape
-            self._maps[entity_name] = np.maximum(0, map_state)
+            layer = np.maximum(0, map_state)
+            # (float32 maps are computed from the buffer, so they keep the dtype)
+            if layer.dtype != np.float32:
+                self._map_dtypes[entity_name] = layer.dtype
+            self._set_layer(entity_name, layer)
 
             if entity_name in self._blocked:
-                self._accessibility[
-                    self._accessibility_lookup[entity_name]
-                ] = np.repeat(map_state[None] == 0, self.n_agents, axis=0)
-                self._net_accessibility = None
+                self._set_accessibility(
+                    entity_name, np.repeat(map_state[None] == 0, self.n_agents, axis=0)
+                )
+
+    def _set_layer(self, entity_name, layer):
+        """Write layer into the buffer channel of entity_name and update the empty
+        map on the cells that changed."""
+        channel = self._state[self._state_channels[entity_name]]
+        if self._empty is not None:
+            changed = channel != layer
+            channel[:] = layer
+            self._empty[changed] = ~self._state[:, changed].any(axis=0)
+        else:
+            channel[:] = layer
 
     def set_add(self, entity_name, map_state):
         """Add map_state to the existing map for entity_name."""
         assert entity_name not in self._private_landmark_types
-        self.set(entity_name, self.get(entity_name) + map_state)
+        entity_map = self.get(entity_name).astype(self._map_dtypes[entity_name])
+        self.set(entity_name, entity_map + map_state)
 
     def get_point(self, entity_name, r, c, **kwargs):
         """Return the entity state at the specified coordinates."""
@@ -250,22 +293,41 @@ class Maps:
             else:
                 o[r, c] = int(owner)
 
-            self._maps[entity_name]["owner"] = o
-            self._maps[entity_name]["health"] = h
-
-            self._accessibility[
-                self._accessibility_lookup[entity_name], :, r, c
-            ] = np.logical_or(o[r, c] == self._idx_array, o[r, c] == -1).astype(bool)
-            self._net_accessibility = None
+            self._set_point_accessibility(
+                entity_name,
+                r,
+                c,
+                np.logical_or(o[r, c] == self._idx_array, o[r, c] == -1),
+            )
 
         else:
             self._maps[entity_name][r, c] = np.maximum(0, val)
 
             if entity_name in self._blocked:
-                self._accessibility[
-                    self._accessibility_lookup[entity_name]
-                ] = np.repeat(np.array([val]) == 0, self.n_agents, axis=0)
-                self._net_accessibility = None
+                self._set_point_accessibility(entity_name, r, c, val == 0)
+
+        if self._empty is not None:
+            self._empty[r, c] = not self._state[:, r, c].any()
+
+    def _set_accessibility(self, entity_name, accessibility):
+        """Set the accessibility layer of entity_name and update the net
+        accessibility on the cells where the layer changed."""
+        layer = self._accessibility[self._accessibility_lookup[entity_name]]
+        changed = np.any(layer != accessibility, axis=0)
+        if not changed.any():
+            return
+        layer[:] = accessibility
+        self._net_accessibility[:, changed] = self._accessibility[:, :, changed].all(
+            axis=0
+        )
+
+    def _set_point_accessibility(self, entity_name, r, c, accessibility):
+        """Set the accessibility of entity_name at [r, c] (for each agent) and update
+        the net accessibility at that cell."""
+        self._accessibility[self._accessibility_lookup[entity_name], :, r, c] = (
+            accessibility
+        )
+        self._net_accessibility[:, r, c] = self._accessibility[:, :, r, c].all(axis=0)
 
     def set_point_add(self, entity_name, r, c, value, **kwargs):
         """Add value to the existing entity state at the specified coordinates."""
@@ -297,24 +359,54 @@ class Maps:
         """Return a boolean map indicating which locations are unoccupied."""
         return self._unoccupied
 
+    @property
+    def agent_locs(self):
+        """Return an (n_agents x 2) array of agent locations, as read-only view.
+
+        Agents that are not on the map have location [-1, -1]."""
+        agent_locs = self._agent_locs.view()
+        agent_locs.flags.writeable = False
+        return agent_locs
+
+    @property
+    def loc_map(self):
+        """Return a map indicating the agent index occupying each location, as a
+        read-only view.
+
+        Locations with a value of -1 are not occupied by an agent."""
+        loc_map = self._loc_map.view()
+        loc_map.flags.writeable = False
+        return loc_map
+
     @property
     def accessibility(self):
-        """Return a boolean map indicating which locations are accessible."""
-        if self._net_accessibility is None:
-            self._net_accessibility = self._accessibility.prod(axis=0).astype(bool)
+        """Return a boolean map indicating which locations are accessible.
+
+        The map is kept up to date as the landmark maps change, and should not be
+        modified in place."""
         return self._net_accessibility
 
     @property
     def empty(self):
         """Return a boolean map indicating which locations are empty.
 
-        Empty locations have no landmarks or resources."""
-        return self.state.sum(axis=0) == 0
+        Empty locations have no landmarks or resources. The map is kept up to date
+        as the maps change (it is returned as a read-only view)."""
+        if self._empty is None:
+            self._empty = ~self._state.any(axis=0)
+        empty = self._empty.view()
+        empty.flags.writeable = False
+        return empty
 
     @property
     def state(self):
-        """Return the concatenated maps of landmark and resources."""
-        return np.stack([self.get(k) for k in self.keys()]).astype(np.float32)
+        """Return the concatenated maps of landmark and resources.
+
+        This is a read-only view of the maps (not a copy), so it reflects any later
+        change to the maps."""
+        state = self._state.view()
+        state.flags.writeable = False
+        return state
 
     @property
     def owner_state(self):
@@ -325,8 +417,22 @@ class Maps:
 
     @property
     def state_dict(self):
-        """Return a dictionary of the map states."""
-        return self._maps
+        """Return a dictionary of the map states.
+
+        Each map is a copy with the dtype it was set with (float64 by default), and
+        the health of private landmarks is float64."""
+        state_dict = {}
+        for entity_name, entity_map in self._maps.items():
+            if entity_name in self._private_landmark_types:
+                state_dict[entity_name] = dict(
+                    owner=entity_map["owner"],
+                    health=entity_map["health"].astype(np.float64),
+                )
+            else:
+                state_dict[entity_name] = entity_map.astype(
+                    self._map_dtypes[entity_name]
+                )
+        return state_dict
 
 
 class World:
@@ -385,6 +491,10 @@ class World:
         ]
         self._planner = planner_class(multi_action_mode=self.multi_action_mode_planner)
 
+        # Struct-of-arrays store of the mobile agents' scalar state fields
+        # (see build_agent_state_table)
+        self.agent_state_table = None
+
         self.timestep = 0
 
         # CUDA-related attributes (for GPU simulations).
@@ -407,13 +517,72 @@ class World:
     def loc_map(self):
         """Return a map indicating the agent index occupying each location.
 
-        Locations with a value of -1 are not occupied by an agent.
+        Locations with a value of -1 are not occupied by an agent. This is a
+        read-only view of the index map maintained by the maps object.
+        """
+        return self.maps.loc_map
+
+    def build_agent_state_table(self):
+        """Store the scalar state fields of the mobile agents in an AgentStateTable.
+
+        After this, each mobile agent's state is a dict-like view over the table (see
+        agent_state.py), and get_agent_state_column returns a view of the underlying
+        column rather than a gathered copy. Should be called once the agents' states
+        have been fully registered.
+        """
+        self.agent_state_table = AgentStateTable(self.n_agents)
+        for agent in self.agents:
+            self.agent_state_table.attach(agent)
+
+    def get_agent_state_column(self, key):
+        """Return the state field key of every mobile agent as an (n_agents, ...) array.
+
+        Args:
+            key (str or tuple): The field name (e.g. "build_payment") or path (e.g.
+                ("inventory", "Coin")) of the state field.
+
+        If the agent state table is in use, a read-only view of the column is
+        returned. Otherwise, the values are gathered from the agents' states.
         """
-        idx_map = -np.ones(shape=self.world_size, dtype=np.int16)
+        key = tuple(key) if isinstance(key, (tuple, list)) else (key,)
+        if self.agent_state_table is not None and key in self.agent_state_table:
+            column = self.agent_state_table[key].view()
+            column.flags.writeable = False
+            return column
+        values = []
         for agent in self.agents:
-            r, c = agent.loc
-            idx_map[r, c] = int(agent.idx)
-        return idx_map
+            value = agent.state
+            for k in key:
+                value = value[k]
+            values.append(value)
+        return np.array(values)
+
+    def set_agent_state_column(self, key, values):
+        """Set the state field key of every mobile agent from an (n_agents, ...) array.
+
+        See get_agent_state_column for the format of key.
+        """
+        key = tuple(key) if isinstance(key, (tuple, list)) else (key,)
+        assert len(values) == self.n_agents
+        if self.agent_state_table is not None and key in self.agent_state_table:
+            self.agent_state_table.assign(key, slice(None), values)
+            return
+        for agent, value in zip(self.agents, values):
+            state = agent.state
+            for k in key[:-1]:
+                state = state[k]
+            if isinstance(value, np.generic):
+                value = value.item()
+            elif isinstance(value, np.ndarray):
+                value = value.copy()
+            state[key[-1]] = value
+
+    def get_agent_total_endowments(self, resource):
+        """Return the combined inventory+escrow endowment of resource of every mobile
+        agent as an (n_agents,) array (see BaseAgent.total_endowment)."""
+        return self.get_agent_state_column(
+            ("inventory", resource)
+        ) + self.get_agent_state_column(("escrow", resource))
 
     def get_random_order_agents(self):
         """The agent list in a randomized order."""
@@ -4,6 +4,9 @@
 # For full license text, see the LICENSE file in the repo root
 # or https://opensource.org/licenses/BSD-3-Clause
 
+import heapq
+from collections import deque
+
 import numpy as np
 
 from ai_economist.foundation.base.base_component import (
@@ -13,6 +16,59 @@ from ai_economist.foundation.base.base_component import (
 from ai_economist.foundation.entities import resource_registry
 
 
+class _OrderBook:
+    """The open orders on one side (bids or asks) of the market for a commodity,
+    kept in a heap in price-time priority.
+
+    Bids are prioritized by highest price, asks by lowest price; ties are broken by
+    the order in which the orders were created. Removing an order that is not at
+    the top of the book (such as an expired order) is done lazily.
+
+    Args:
+        is_bid (bool): Whether this is the bid (True) or ask (False) side.
+    """
+
+    def __init__(self, is_bid):
+        self.is_bid = bool(is_bid)
+        self._heap = []
+        self._n_open = 0
+
+    def __len__(self):
+        return self._n_open
+
+    def push(self, order):
+        """Add an (open) order to the book."""
+        price = -order["price"] if self.is_bid else order["price"]
+        heapq.heappush(self._heap, (price, order["seq"], order))
+        self._n_open += 1
+
+    def peek(self):
+        """Return the highest priority open order (None if empty)."""
+        while self._heap and not self._heap[0][2]["open"]:
+            heapq.heappop(self._heap)
+        if self._heap:
+            return self._heap[0][2]
+        return None
+
+    def pop(self):
+        """Remove and return the highest priority open order (None if empty)."""
+        order = self.peek()
+        if order is not None:
+            heapq.heappop(self._heap)
+            self._n_open -= 1
+        return order
+
+    def remove(self, order):
+        """Remove an open order from anywhere in the book."""
+        assert order["open"]
+        order["open"] = False
+        self._n_open -= 1
+        # Drop the closed orders once they make up most of the heap
+        if len(self._heap) > 2 * self._n_open + 64:
+            self._heap = [entry for entry in self._heap if entry[2]["open"]]
+            heapq.heapify(self._heap)
+
+
 @component_registry.add
 class ContinuousDoubleAuction(BaseComponent):
     """Allows mobile agents to buy/sell collectible resources with one another.
@@ -77,24 +133,15 @@ class ContinuousDoubleAuction(BaseComponent):
         ]
 
         # These get reset at the start of an episode:
-        self.asks = {c: [] for c in self.commodities}
-        self.bids = {c: [] for c in self.commodities}
-        self.n_orders = {
-            c: {i: 0 for i in range(self.n_agents)} for c in self.commodities
-        }
+        self.asks = {c: _OrderBook(is_bid=False) for c in self.commodities}
+        self.bids = {c: _OrderBook(is_bid=True) for c in self.commodities}
+        # Open orders of each commodity, in order of creation (for expiration)
+        self._order_queue = {c: deque() for c in self.commodities}
+        # Counters used to order and age the orders
+        self._n_created_orders = 0
+        self._order_clock = 0
         self.executed_trades = []
-        self.price_history = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
-        self.bid_hists = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
-        self.ask_hists = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
+        self._reset_market_arrays()
 
     # Convenience methods
     # -------------------
@@ -105,6 +152,43 @@ class ContinuousDoubleAuction(BaseComponent):
 
         return np.zeros(1 + self.price_ceiling - self.price_floor)
 
+    def _reset_market_arrays(self):
+        """Reset the order counts and the bid/ask/price histograms.
+
+        These are stored as dense (n_commodities x n_agents [x n_prices]) arrays.
+        n_orders, price_history, bid_hists and ask_hists map each commodity to its
+        (n_agents [x n_prices]) slice, so that, for example,
+        bid_hists[resource][agent_idx] is the bid histogram of an agent. The
+        bid/ask histograms summed over agents are kept as running totals.
+        """
+        n_commodities = len(self.commodities)
+        n_prices = len(self._price_zeros())
+        self._n_orders = np.zeros((n_commodities, self.n_agents), dtype=np.int64)
+        self._price_history = np.zeros((n_commodities, self.n_agents, n_prices))
+        self._bid_hists = np.zeros((n_commodities, self.n_agents, n_prices))
+        self._ask_hists = np.zeros((n_commodities, self.n_agents, n_prices))
+        self._bid_totals = np.zeros((n_commodities, n_prices))
+        self._ask_totals = np.zeros((n_commodities, n_prices))
+
+        self._commodity_idx = {c: i for i, c in enumerate(self.commodities)}
+        self.n_orders = {c: self._n_orders[i] for c, i in self._commodity_idx.items()}
+        self.price_history = {
+            c: self._price_history[i] for c, i in self._commodity_idx.items()
+        }
+        self.bid_hists = {c: self._bid_hists[i] for c, i in self._commodity_idx.items()}
+        self.ask_hists = {c: self._ask_hists[i] for c, i in self._commodity_idx.items()}
+
+    def _update_hists(self, resource, order, delta):
+        """Add delta to the bid (or ask) histogram count of an order."""
+        c = self._commodity_idx[resource]
+        p = order["price"] - self.price_floor
+        if order["is_bid"]:
+            self._bid_hists[c, order["agent"], p] += delta
+            self._bid_totals[c, p] += delta
+        else:
+            self._ask_hists[c, order["agent"], p] += delta
+            self._ask_totals[c, p] += delta
+
     def available_asks(self, resource, agent):
         """
         Get a histogram of asks for resource to which agent could bid against.
@@ -118,14 +202,9 @@ class ContinuousDoubleAuction(BaseComponent):
             ask_hist (ndarray): For each possible price level, the number of
                 available asks.
         """
-        if agent is None:
-            a_idx = -1
-        else:
-            a_idx = agent.idx
-        ask_hist = self._price_zeros()
-        for i, h in self.ask_hists[resource].items():
-            if a_idx != i:
-                ask_hist += h
+        ask_hist = np.array(self._ask_totals[self._commodity_idx[resource]])
+        if agent is not None:
+            ask_hist -= self.ask_hists[resource][agent.idx]
         return ask_hist
 
     def available_bids(self, resource, agent):
@@ -141,14 +220,9 @@ class ContinuousDoubleAuction(BaseComponent):
             bid_hist (ndarray): For each possible price level, the number of
                 available bids.
         """
-        if agent is None:
-            a_idx = -1
-        else:
-            a_idx = agent.idx
-        bid_hist = self._price_zeros()
-        for i, h in self.bid_hists[resource].items():
-            if a_idx != i:
-                bid_hist += h
+        bid_hist = np.array(self._bid_totals[self._commodity_idx[resource]])
+        if agent is not None:
+            bid_hist -= self.bid_hists[resource][agent.idx]
         return bid_hist
 
     def can_bid(self, resource, agent):
@@ -162,6 +236,22 @@ class ContinuousDoubleAuction(BaseComponent):
             and agent.state["inventory"][resource] > 0
         )
 
+    def _new_order(self, agent, price, is_bid):
+        order = {
+            "agent": agent.idx,
+            "price": int(price),
+            "is_bid": is_bid,
+            "created": self._order_clock,
+            "seq": self._n_created_orders,
+            "open": True,
+        }
+        self._n_created_orders += 1
+        return order
+
+    def _lifetime(self, order):
+        """Number of timesteps the order has been in the books."""
+        return self._order_clock - order["created"]
+
     # Core components for this market
     # -------------------------------
 
@@ -183,11 +273,12 @@ class ContinuousDoubleAuction(BaseComponent):
 
         assert self.price_floor <= max_payment <= self.price_ceiling
 
-        bid = {"buyer": agent.idx, "bid": int(max_payment), "bid_lifetime": 0}
+        bid = self._new_order(agent, max_payment, is_bid=True)
 
         # Add this to the bid book
-        self.bids[resource].append(bid)
-        self.bid_hists[resource][bid["buyer"]][bid["bid"] - self.price_floor] += 1
+        self.bids[resource].push(bid)
+        self._order_queue[resource].append(bid)
+        self._update_hists(resource, bid, 1)
         self.n_orders[resource][agent.idx] += 1
 
         # Set aside whatever money the agent is willing to pay
@@ -214,11 +305,12 @@ class ContinuousDoubleAuction(BaseComponent):
         # is there an upper limit?
         assert self.price_floor <= min_income <= self.price_ceiling
 
-        ask = {"seller": agent.idx, "ask": int(min_income), "ask_lifetime": 0}
+        ask = self._new_order(agent, min_income, is_bid=False)
 
         # Add this to the ask book
-        self.asks[resource].append(ask)
-        self.ask_hists[resource][ask["seller"]][ask["ask"] - self.price_floor] += 1
+        self.asks[resource].push(ask)
+        self._order_queue[resource].append(ask)
+        self._update_hists(resource, ask, 1)
         self.n_orders[resource][agent.idx] += 1
 
         # Set aside the resource the agent is willing to sell
@@ -243,111 +335,108 @@ class ContinuousDoubleAuction(BaseComponent):
         self.executed_trades.append([])
 
         for resource in self.commodities:
+            bids, asks = self.bids[resource], self.asks[resource]
             possible_match = [True for _ in range(self.n_agents)]
-            keep_checking = True
 
-            bids = sorted(
-                self.bids[resource],
-                key=lambda b: (b["bid"], b["bid_lifetime"]),
-                reverse=True,
-            )
-            asks = sorted(
-                self.asks[resource], key=lambda a: (a["ask"], -a["ask_lifetime"])
-            )
+            # Bids from buyers that cannot be matched (anymore) on this round, to
+            # be put back in the books after matching
+            unmatched_bids = []
+
+            while True:
+                # Stop once the highest bid is below the lowest ask: no other
+                # bid can be matched
+                best_bid, best_ask = bids.peek(), asks.peek()
+                if best_bid is None or best_ask is None:
+                    break
+                if best_bid["price"] < best_ask["price"]:
+                    break
+
+                # The highest priority bid, skipping buyers known to be no good
+                # for this round
+                bid = bids.pop()
+                if not possible_match[bid["agent"]]:
+                    unmatched_bids.append(bid)
+                    continue
+
+                # The highest priority ask that does not come from this buyer
+                own_asks = []
+                ask = asks.pop()
+                while ask is not None and ask["agent"] == bid["agent"]:
+                    own_asks.append(ask)
+                    ask = asks.pop()
+
+                if ask is None or bid["price"] < ask["price"]:
+                    # This buyer can't be matched (its other bids are not higher
+                    # than this one, and asks only get removed)
+                    possible_match[bid["agent"]] = False
+                    unmatched_bids.append(bid)
+                    if ask is not None:
+                        asks.push(ask)
+                else:
+                    # TRADE!
+                    self._execute_trade(resource, bid, ask)
+
+                for own_ask in own_asks:
+                    asks.push(own_ask)
+
+            for bid in unmatched_bids:
+                bids.push(bid)
+
+    def _execute_trade(self, resource, bid, ask):
+        """Execute the trade between a (matched) bid and ask, which have already
+        been taken out of the books."""
+        bid["open"] = False
+        ask["open"] = False
+
+        trade = {
+            "commodity": resource,
+            "buyer": bid["agent"],
+            "bid": bid["price"],
+            "bid_lifetime": self._lifetime(bid),
+            "seller": ask["agent"],
+            "ask": ask["price"],
+            "ask_lifetime": self._lifetime(ask),
+        }
 
-            while any(possible_match) and keep_checking:
-                idx_bid, idx_ask = 0, 0
-                while True:
-                    # Out of bids to check. Exit both loops.
-                    if idx_bid >= len(bids):
-                        keep_checking = False
-                        break
-
-                    # Already know this buyer is no good for this round.
-                    # Skip to next bid.
-                    if not possible_match[bids[idx_bid]["buyer"]]:
-                        idx_bid += 1
-
-                    # Out of asks to check. This buyer won't find a match on this round.
-                    # (maybe) Restart inner loop.
-                    elif idx_ask >= len(asks):
-                        possible_match[bids[idx_bid]["buyer"]] = False
-                        break
-
-                    # Skip to next ask if this ask comes from the buyer
-                    # of the current bid.
-                    elif asks[idx_ask]["seller"] == bids[idx_bid]["buyer"]:
-                        idx_ask += 1
-
-                    # If this bid/ask pair can't be matched, this buyer
-                    # can't be matched. (maybe) Restart inner loop.
-                    elif bids[idx_bid]["bid"] < asks[idx_ask]["ask"]:
-                        possible_match[bids[idx_bid]["buyer"]] = False
-                        break
-
-                    # TRADE! (then restart inner loop)
-                    else:
-                        bid = bids.pop(idx_bid)
-                        ask = asks.pop(idx_ask)
-
-                        trade = {"commodity": resource}
-                        trade.update(bid)
-                        trade.update(ask)
-
-                        if (
-                            bid["bid_lifetime"] <= ask["ask_lifetime"]
-                        ):  # Ask came earlier. (in other words,
-                            # trade triggered by new bid)
-                            trade["price"] = int(trade["ask"])
-                        else:  # Bid came earlier. (in other words,
-                            # trade triggered by new ask)
-                            trade["price"] = int(trade["bid"])
-                        trade["cost"] = trade["price"]  # What the buyer pays in total
-                        trade["income"] = trade[
-                            "price"
-                        ]  # What the seller receives in total
-
-                        buyer = self.world.agents[trade["buyer"]]
-                        seller = self.world.agents[trade["seller"]]
-
-                        # Bookkeeping
-                        self.bid_hists[resource][bid["buyer"]][
-                            bid["bid"] - self.price_floor
-                        ] -= 1
-                        self.ask_hists[resource][ask["seller"]][
-                            ask["ask"] - self.price_floor
-                        ] -= 1
-                        self.n_orders[trade["commodity"]][seller.idx] -= 1
-                        self.n_orders[trade["commodity"]][buyer.idx] -= 1
-                        self.executed_trades[-1].append(trade)
-                        self.price_history[resource][trade["seller"]][
-                            trade["price"]
-                        ] += 1
-
-                        # The resource goes from the seller's escrow
-                        # to the buyer's inventory
-                        seller.state["escrow"][resource] -= 1
-                        buyer.state["inventory"][resource] += 1
-
-                        # Buyer's money (already set aside) leaves escrow
-                        pre_payment = int(trade["bid"])
-                        buyer.state["escrow"]["Coin"] -= pre_payment
-                        assert buyer.state["escrow"]["Coin"] >= 0
-
-                        # Payment is removed from the pre_payment
-                        # and given to the seller. Excess returned to buyer.
-                        payment_to_seller = int(trade["price"])
-                        excess_payment_from_buyer = pre_payment - payment_to_seller
-                        assert excess_payment_from_buyer >= 0
-                        seller.state["inventory"]["Coin"] += payment_to_seller
-                        buyer.state["inventory"]["Coin"] += excess_payment_from_buyer
-
-                        # Restart the inner loop
-                        break
-
-            # Keep the unfilled bids/asks
-            self.bids[resource] = bids
-            self.asks[resource] = asks
+        if (
+            trade["bid_lifetime"] <= trade["ask_lifetime"]
+        ):  # Ask came earlier. (in other words,
+            # trade triggered by new bid)
+            trade["price"] = int(trade["ask"])
+        else:  # Bid came earlier. (in other words,
+            # trade triggered by new ask)
+            trade["price"] = int(trade["bid"])
+        trade["cost"] = trade["price"]  # What the buyer pays in total
+        trade["income"] = trade["price"]  # What the seller receives in total
+
+        buyer = self.world.agents[trade["buyer"]]
+        seller = self.world.agents[trade["seller"]]
+
+        # Bookkeeping
+        self._update_hists(resource, bid, -1)
+        self._update_hists(resource, ask, -1)
+        self.n_orders[trade["commodity"]][seller.idx] -= 1
+        self.n_orders[trade["commodity"]][buyer.idx] -= 1
+        self.executed_trades[-1].append(trade)
+        self.price_history[resource][trade["seller"]][trade["price"]] += 1
+
+        # The resource goes from the seller's escrow
+        # to the buyer's inventory
+        seller.state["escrow"][resource] -= 1
+        buyer.state["inventory"][resource] += 1
+
+        # Buyer's money (already set aside) leaves escrow
+        pre_payment = int(trade["bid"])
+        buyer.state["escrow"]["Coin"] -= pre_payment
+        assert buyer.state["escrow"]["Coin"] >= 0
+
+        # Payment is removed from the pre_payment
+        # and given to the seller. Excess returned to buyer.
+        payment_to_seller = int(trade["price"])
+        excess_payment_from_buyer = pre_payment - payment_to_seller
+        assert excess_payment_from_buyer >= 0
+        seller.state["inventory"]["Coin"] += payment_to_seller
+        buyer.state["inventory"]["Coin"] += excess_payment_from_buyer
 
     def remove_expired_orders(self):
         """
@@ -360,50 +449,39 @@ class ContinuousDoubleAuction(BaseComponent):
         """
         world = self.world
 
-        for resource in self.commodities:
+        # Age all the orders by one timestep
+        self._order_clock += 1
 
-            bids_ = []
-            for bid in self.bids[resource]:
-                bid["bid_lifetime"] += 1
-                # If the bid is not expired, keep it in the bids
-                if bid["bid_lifetime"] <= self.order_duration:
-                    bids_.append(bid)
-                # Otherwise, remove it and do the associated bookkeeping
-                else:
+        for resource in self.commodities:
+            # Orders expire in the order in which they were created
+            queue = self._order_queue[resource]
+            while queue and (
+                not queue[0]["open"] or self._lifetime(queue[0]) > self.order_duration
+            ):
+                order = queue.popleft()
+                if not order["open"]:  # Already filled
+                    continue
+
+                if order["is_bid"]:
+                    self.bids[resource].remove(order)
                     # Return the set aside money to the buyer
-                    amount = world.agents[bid["buyer"]].escrow_to_inventory(
-                        "Coin", bid["bid"]
+                    amount = world.agents[order["agent"]].escrow_to_inventory(
+                        "Coin", order["price"]
                     )
-                    assert amount == bid["bid"]
+                    assert amount == order["price"]
                     # Adjust the bid histogram to reflect the removal of the bid
-                    self.bid_hists[resource][bid["buyer"]][
-                        bid["bid"] - self.price_floor
-                    ] -= 1
-                    # Adjust the order counter
-                    self.n_orders[resource][bid["buyer"]] -= 1
-
-            asks_ = []
-            for ask in self.asks[resource]:
-                ask["ask_lifetime"] += 1
-                # If the ask is not expired, keep it in the asks
-                if ask["ask_lifetime"] <= self.order_duration:
-                    asks_.append(ask)
-                # Otherwise, remove it and do the associated bookkeeping
+                    self._update_hists(resource, order, -1)
                 else:
+                    self.asks[resource].remove(order)
                     # Return the set aside resource to the seller
-                    resource_unit = world.agents[ask["seller"]].escrow_to_inventory(
+                    resource_unit = world.agents[order["agent"]].escrow_to_inventory(
                         resource, 1
                     )
                     assert resource_unit == 1
                     # Adjust the ask histogram to reflect the removal of the ask
-                    self.ask_hists[resource][ask["seller"]][
-                        ask["ask"] - self.price_floor
-                    ] -= 1
-                    # Adjust the order counter
-                    self.n_orders[resource][ask["seller"]] -= 1
-
-            self.bids[resource] = bids_
-            self.asks[resource] = asks_
+                    self._update_hists(resource, order, -1)
+                # Adjust the order counter
+                self.n_orders[resource][order["agent"]] -= 1
 
     # Required methods for implementing components
     # --------------------------------------------
@@ -446,10 +524,10 @@ class ContinuousDoubleAuction(BaseComponent):
         """
         world = self.world
 
+        self._price_history *= 0.995
+
         for resource in self.commodities:
             for agent in world.agents:
-                self.price_history[resource][agent.idx] *= 0.995
-
                 # Create bid action
                 # -----------------
                 resource_action = agent.get_component_action(
@@ -502,40 +580,42 @@ class ContinuousDoubleAuction(BaseComponent):
         obs = {a.idx: {} for a in world.agents + [world.planner]}
 
         prices = np.arange(self.price_floor, self.price_ceiling + 1)
-        for c in self.commodities:
-            net_price_history = np.sum(
-                np.stack([self.price_history[c][i] for i in range(self.n_agents)]),
-                axis=0,
-            )
+        net_price_histories = np.sum(self._price_history, axis=1)
+
+        # The bids/asks of each agent, and the bids/asks available to each agent
+        # (that is, excluding its own): (n_commodities, n_agents, n_prices)
+        my_asks = np.array(self._ask_hists)
+        my_bids = np.array(self._bid_hists)
+        available_asks = self._ask_totals[:, None] - self._ask_hists
+        available_bids = self._bid_totals[:, None] - self._bid_hists
+
+        for c_idx, c in enumerate(self.commodities):
+            net_price_history = net_price_histories[c_idx]
             market_rate = prices.dot(net_price_history) / np.maximum(
                 0.001, np.sum(net_price_history)
             )
             scaled_price_history = net_price_history * self.inv_scale
 
-            full_asks = self.available_asks(c, agent=None)
-            full_bids = self.available_bids(c, agent=None)
-
             obs[world.planner.idx].update(
                 {
                     "market_rate-{}".format(c): market_rate,
                     "price_history-{}".format(c): scaled_price_history,
-                    "full_asks-{}".format(c): full_asks,
-                    "full_bids-{}".format(c): full_bids,
+                    "full_asks-{}".format(c): np.array(self._ask_totals[c_idx]),
+                    "full_bids-{}".format(c): np.array(self._bid_totals[c_idx]),
                 }
             )
 
-            for _, agent in enumerate(world.agents):
+            for agent in world.agents:
+                i = agent.idx
                 # Private to the agent
-                obs[agent.idx].update(
+                obs[i].update(
                     {
                         "market_rate-{}".format(c): market_rate,
                         "price_history-{}".format(c): scaled_price_history,
-                        "available_asks-{}".format(c): full_asks
-                        - self.ask_hists[c][agent.idx],
-                        "available_bids-{}".format(c): full_bids
-                        - self.bid_hists[c][agent.idx],
-                        "my_asks-{}".format(c): self.ask_hists[c][agent.idx],
-                        "my_bids-{}".format(c): self.bid_hists[c][agent.idx],
+                        "available_asks-{}".format(c): available_asks[c_idx, i],
+                        "available_bids-{}".format(c): available_bids[c_idx, i],
+                        "my_asks-{}".format(c): my_asks[c_idx, i],
+                        "my_bids-{}".format(c): my_bids[c_idx, i],
                     }
                 )
 
@@ -551,31 +631,32 @@ class ContinuousDoubleAuction(BaseComponent):
         """
         world = self.world
 
-        masks = dict()
-
-        for agent in world.agents:
-            masks[agent.idx] = {}
+        coin = np.array([agent.inventory["Coin"] for agent in world.agents])
+        inventories = np.array(
+            [[agent.inventory[c] for agent in world.agents] for c in self.commodities]
+        )
 
-            can_pay = np.arange(self.max_bid_ask + 1) <= agent.inventory["Coin"]
+        # (n_commodities, n_agents): whether each agent can place a bid/ask
+        can_bid = self._n_orders < self.max_num_orders
+        can_ask = np.logical_and(can_bid, inventories > 0)
+        # (n_agents, n_prices): whether each agent can pay each price
+        can_pay = np.arange(self.max_bid_ask + 1)[None] <= coin[:, None]
 
-            for resource in self.commodities:
-                if not self.can_ask(resource, agent):  # asks_maxed:
-                    masks[agent.idx]["Sell_{}".format(resource)] = np.zeros(
-                        1 + self.max_bid_ask
-                    )
-                else:
-                    masks[agent.idx]["Sell_{}".format(resource)] = np.ones(
-                        1 + self.max_bid_ask
-                    )
+        sell_masks = np.repeat(
+            can_ask[:, :, None].astype(np.float64), 1 + self.max_bid_ask, axis=2
+        )
+        buy_masks = np.logical_and(can_bid[:, :, None], can_pay[None]).astype(np.int32)
 
-                if not self.can_bid(resource, agent):
-                    masks[agent.idx]["Buy_{}".format(resource)] = np.zeros(
-                        1 + self.max_bid_ask
-                    )
-                else:
-                    masks[agent.idx]["Buy_{}".format(resource)] = can_pay.astype(
-                        np.int32
-                    )
+        masks = dict()
+        for agent in world.agents:
+            masks[agent.idx] = {}
+            for c_idx, resource in enumerate(self.commodities):
+                masks[agent.idx]["Sell_{}".format(resource)] = sell_masks[
+                    c_idx, agent.idx
+                ]
+                masks[agent.idx]["Buy_{}".format(resource)] = buy_masks[
+                    c_idx, agent.idx
+                ]
 
         return masks
 
@@ -646,24 +727,12 @@ class ContinuousDoubleAuction(BaseComponent):
 
         Reset the order books.
         """
-        self.bids = {c: [] for c in self.commodities}
-        self.asks = {c: [] for c in self.commodities}
-        self.n_orders = {
-            c: {i: 0 for i in range(self.n_agents)} for c in self.commodities
-        }
-
-        self.price_history = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
-        self.bid_hists = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
-        self.ask_hists = {
-            c: {i: self._price_zeros() for i in range(self.n_agents)}
-            for c in self.commodities
-        }
+        self.bids = {c: _OrderBook(is_bid=True) for c in self.commodities}
+        self.asks = {c: _OrderBook(is_bid=False) for c in self.commodities}
+        self._order_queue = {c: deque() for c in self.commodities}
+        self._n_created_orders = 0
+        self._order_clock = 0
+        self._reset_market_arrays()
 
         self.executed_trades = []
 
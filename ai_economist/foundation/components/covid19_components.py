@@ -95,16 +95,18 @@ class ControlUSStateOpenCloseStatus(BaseComponent):
         return None
 
     def generate_masks(self, completions=0):
-        for agent in self.world.agents:
-            if self.world.use_real_world_policies:
-                self.masks["a"][:, agent.idx] = self.default_agent_action_mask
-            else:
-                if self.world.timestep < self.action_in_cooldown_until[agent.idx]:
-                    # Keep masking the actions
-                    self.masks["a"][:, agent.idx] = self.no_op_agent_action_mask
-                else:  # self.world.timestep == self.action_in_cooldown_until[agent.idx]
-                    # Cooldown period has ended; unmask the "subsequent" action
-                    self.masks["a"][:, agent.idx] = self.default_agent_action_mask
+        if self.world.use_real_world_policies:
+            in_cooldown = np.zeros(self.n_agents, dtype=bool)
+        else:
+            # Keep masking the actions of the agents in their cooldown period, and
+            # unmask the "subsequent" action of the others (whose cooldown period has
+            # ended, i.e., self.world.timestep == self.action_in_cooldown_until)
+            in_cooldown = self.world.timestep < self.action_in_cooldown_until
+        self.masks["a"][:] = np.where(
+            in_cooldown[None],
+            np.array(self.no_op_agent_action_mask)[:, None],
+            np.array(self.default_agent_action_mask)[:, None],
+        )
         return self.masks
 
     def get_data_dictionary(self):
@@ -177,48 +179,47 @@ class ControlUSStateOpenCloseStatus(BaseComponent):
                     )
                 self._checked_n_stringency_levels = True
 
-            for agent in self.world.agents:
-                if self.world.use_real_world_policies:
-                    # Use the action taken in the previous timestep
-                    action = self.world.real_world_stringency_policy[
-                        self.world.timestep - 1, agent.idx
-                    ]
-                else:
-                    action = agent.get_component_action(self.name)
-                assert 0 <= action <= self.n_stringency_levels
-
-                # We only update the stringency level if the action is not a NO-OP.
-                self.world.global_state["Stringency Level"][
-                    self.world.timestep, agent.idx
-                ] = (
-                    self.world.global_state["Stringency Level"][
-                        self.world.timestep - 1, agent.idx
-                    ]
-                    * (action == 0)
-                    + action
+            if self.world.use_real_world_policies:
+                # Use the actions taken in the previous timestep
+                actions = self.world.real_world_stringency_policy[
+                    self.world.timestep - 1
+                ]
+            else:
+                actions = np.fromiter(
+                    (
+                        agent.get_component_action(self.name)
+                        for agent in self.world.agents
+                    ),
+                    dtype=self.np_int_dtype,
+                    count=self.n_agents,
                 )
+            assert np.all((0 <= actions) & (actions <= self.n_stringency_levels))
 
-                agent.state[
-                    "Current Open Close Stringency Level"
-                ] = self.world.global_state["Stringency Level"][
-                    self.world.timestep, agent.idx
-                ]
+            # We only update the stringency level if the action is not a NO-OP.
+            stringency_level = self.world.global_state["Stringency Level"]
+            stringency_level[self.world.timestep] = (
+                stringency_level[self.world.timestep - 1] * (actions == 0) + actions
+            )
 
-                # Check if the action cooldown period has ended, and set the next
-                # time until action cooldown. If current action is a no-op
-                # (i.e., no new action was taken), the agent can take an action
-                # in the very next step, otherwise it needs to wait for
-                # self.action_cooldown_period steps. When in the action cooldown
-                # period, whatever actions the agents take are masked out,
-                # so it's always a NO-OP (see generate_masks() above)
-                # The logic below influences the action masks.
-                if self.world.timestep == self.action_in_cooldown_until[agent.idx] + 1:
-                    if action == 0:  # NO-OP
-                        self.action_in_cooldown_until[agent.idx] += 1
-                    else:
-                        self.action_in_cooldown_until[
-                            agent.idx
-                        ] += self.action_cooldown_period
+            self.world.set_agent_state_column(
+                "Current Open Close Stringency Level",
+                stringency_level[self.world.timestep],
+            )
+
+            # Check if the action cooldown period has ended, and set the next
+            # time until action cooldown. If current action is a no-op
+            # (i.e., no new action was taken), the agent can take an action
+            # in the very next step, otherwise it needs to wait for
+            # self.action_cooldown_period steps. When in the action cooldown
+            # period, whatever actions the agents take are masked out,
+            # so it's always a NO-OP (see generate_masks() above)
+            # The logic below influences the action masks.
+            cooldown_ended = self.world.timestep == self.action_in_cooldown_until + 1
+            self.action_in_cooldown_until[cooldown_ended] += np.where(
+                actions[cooldown_ended] == 0,  # NO-OP
+                1,
+                self.action_cooldown_period,
+            )
 
     def generate_observations(self):
 
@@ -305,6 +306,10 @@ class FederalGovernmentSubsidy(BaseComponent):
         self.max_daily_subsidy_per_state = (
             self.world.us_state_population * self.max_annual_subsidy_per_person / 365
         )
+        # The subsidy levels of the real-world policies are accumulated again
+        # during each episode (see component_step)
+        self._subsidy_amount_per_level = None
+        self._subsidy_level_array = None
 
     def get_n_actions(self, agent_cls_name):
         if agent_cls_name == "BasicPlanner":
@@ -404,7 +409,7 @@ class FederalGovernmentSubsidy(BaseComponent):
                 # Use the action taken in the previous timestep
                 current_subsidy_amount = self.world.real_world_subsidy[
                     self.world.timestep - 1
-                ]
+                ].item()
                 if current_subsidy_amount > 0:
                     _subsidy_level = np.round(
                         (current_subsidy_amount / self._subsidy_amount_per_level)
@@ -623,8 +628,11 @@ class VaccinationCampaign(BaseComponent):
                 return
 
             # Deliver vaccines to each state
-            for aidx, vaccines in enumerate(self.num_vaccines_per_delivery):
-                self.world.agents[aidx].state["Vaccines Available"] += vaccines
+            self.world.set_agent_state_column(
+                "Vaccines Available",
+                self.world.get_agent_state_column("Vaccines Available")
+                + self.num_vaccines_per_delivery,
+            )
 
     def generate_observations(self):
         # Allow the agents/planner to know when the next vaccines might come.
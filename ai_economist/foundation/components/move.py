@@ -173,15 +173,24 @@ class Gather(BaseComponent):
         """
         world = self.world
 
-        coords = np.array([agent.loc for agent in world.agents])[:, :, None]
-        ris = coords[:, 0] + self._roff + 1
-        cis = coords[:, 1] + self._coff + 1
-
-        occ = np.pad(world.maps.unoccupied, ((1, 1), (1, 1)))
-        acc = np.pad(world.maps.accessibility, ((0, 0), (1, 1), (1, 1)))
-        mask_array = np.logical_and(occ[ris, cis], acc[self._aidx, ris, cis]).astype(
-            np.float32
+        coords = world.maps.agent_locs[:, :, None]
+        ris = coords[:, 0] + self._roff
+        cis = coords[:, 1] + self._coff
+
+        # Moves that would leave the world are invalid; clip the other coordinates
+        # so that they can be used to index the maps
+        in_bounds = (
+            (ris >= 0)
+            & (ris < world.world_size[0])
+            & (cis >= 0)
+            & (cis < world.world_size[1])
         )
+        ris = np.clip(ris, 0, world.world_size[0] - 1)
+        cis = np.clip(cis, 0, world.world_size[1] - 1)
+
+        occ = world.maps.unoccupied[ris, cis]
+        acc = world.maps.accessibility[self._aidx, ris, cis]
+        mask_array = (in_bounds & occ & acc).astype(np.float32)
 
         masks = {agent.idx: mask_array[i] for i, agent in enumerate(world.agents)}
 
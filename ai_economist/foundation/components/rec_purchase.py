@@ -45,28 +45,62 @@ class BuyRECFromVirtualStore(BaseComponent):
         return masks
         
     def component_step(self):
-        for agent in self.world.get_random_order_agents():
-
-            action = agent.get_component_action(self.name)
-
-            if 0 <= action <= self.rec_packages: # Agent wants to buy none/some RECs.
-                recs_percentage = (action-1) * 0.05
-                new_green_score = min([1.0, agent.state["endogenous"]["InitialGreenScore"] + recs_percentage])
-                agent.state["endogenous"]["GreenScoresLastDay"] = agent.state["endogenous"]["GreenScoresLastDay"][1:]
-                agent.state["endogenous"]["GreenScoresLastDay"]= np.append(agent.state["endogenous"]["GreenScoresLastDay"], new_green_score)
-                if np.sum(agent.state["endogenous"]["ConsumedEnergy"]) > 0.0:
-                    agent.state["endogenous"]["GreenScore"] = np.sum(agent.state["endogenous"]["GreenScoresLastDay"] * agent.state["endogenous"]["ConsumedEnergy"]) / np.sum(agent.state["endogenous"]["ConsumedEnergy"])
-                else:
-                    agent.state["endogenous"]["GreenScore"] = np.mean(agent.state["endogenous"]["GreenScoresLastDay"])
-                agent.state["endogenous"]["RECsPrice"] = self.rec_price * agent.state["endogenous"]["ConsumedEnergy"][-1] * recs_percentage
-                green_score_importance = self.green_score_importance
-                if not self.static:
-                    green_score_importance = self.world.planner.state["GreenScoreImportance"]
-                reliability_score_importance = 1 - green_score_importance
-                agent.state["endogenous"]["TotalScore"] = (green_score_importance * agent.state["endogenous"]["GreenScore"]) + (reliability_score_importance * agent.state["endogenous"]["ReliabilityScore"])
-
-            else: # We only declared 21 actions for this agent type, so action > 21 is an error.
-                raise ValueError
+        world = self.world
+
+        # Agents' REC purchases are independent, so they are computed for all agents
+        # at once. The random agent order is still drawn, to keep the random stream
+        # of the per-agent updates.
+        world.get_random_order_agents()
+        # (this component registers a single action subspace, named after it)
+        actions = np.fromiter(
+            (agent.action[self.name] for agent in world.agents),
+            dtype=int,
+            count=world.n_agents,
+        )
+        # We only declared 21 actions for this agent type, so action > 21 is an error.
+        if np.any((actions < 0) | (actions > self.rec_packages)):
+            raise ValueError
+
+        def endogenous(name):
+            return world.get_agent_state_column(("endogenous", name))
+
+        # Agents buy none/some RECs.
+        recs_percentage = (actions - 1) * 0.05
+        new_green_scores = np.minimum(
+            1.0, endogenous("InitialGreenScore") + recs_percentage
+        )
+        green_scores = endogenous("GreenScoresLastDay")
+        green_scores = np.concatenate(
+            [green_scores[:, 1:], new_green_scores[:, None]], axis=1
+        )
+        consumed_energy = endogenous("ConsumedEnergy")
+
+        # Energy-weighted green score over the last day (or the plain average, if no
+        # energy was consumed)
+        total_energy = np.sum(consumed_energy, axis=1)
+        green_score = np.divide(
+            np.sum(green_scores * consumed_energy, axis=1),
+            total_energy,
+            out=np.mean(green_scores, axis=1),
+            where=total_energy > 0.0,
+        )
+        recs_price = self.rec_price * consumed_energy[:, -1] * recs_percentage
+
+        green_score_importance = self.green_score_importance
+        if not self.static:
+            green_score_importance = world.planner.state["GreenScoreImportance"]
+        reliability_score_importance = 1 - green_score_importance
+        total_score = (green_score_importance * green_score) + (
+            reliability_score_importance * endogenous("ReliabilityScore")
+        )
+
+        for name, values in [
+            ("GreenScoresLastDay", green_scores),
+            ("GreenScore", green_score),
+            ("RECsPrice", recs_price),
+            ("TotalScore", total_score),
+        ]:
+            world.set_agent_state_column(("endogenous", name), values)
 
     def generate_observations(self):
         obs_dict = {}
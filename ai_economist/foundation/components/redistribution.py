@@ -13,6 +13,8 @@ from ai_economist.foundation.base.base_component import (
     component_registry,
 )
 from ai_economist.foundation.components.utils import (
+    RingBuffer,
+    SharedRingBuffers,
     annealed_tax_limit,
     annealed_tax_mask,
 )
@@ -123,6 +125,10 @@ class PeriodicBracketTax(BaseComponent):
         saez_fixed_elas (float, optional): If supplied, this value will be used as
             the elasticity estimate when computing tax rates using the Saez formula.
             If not given (default), elasticity will be estimated empirically.
+        saez_buffer_size (int): Number of (income, marginal rate) samples kept in
+            the local buffer used to compute tax rates with the Saez formula. Saez
+            will use random taxes until it has this many samples. Must be > 0.
+            Default is 500.
         tax_annealing_schedule (list, optional): A length-2 list of
             [tax_annealing_warmup, tax_annealing_slope] describing the tax annealing
             schedule. See annealed_tax_mask function for details. Default behavior is
@@ -150,6 +156,7 @@ class PeriodicBracketTax(BaseComponent):
         fixed_bracket_rates=None,
         pareto_weight_type="inverse_income",
         saez_fixed_elas=None,
+        saez_buffer_size=500,
         tax_annealing_schedule=None,
         **base_component_kwargs
     ):
@@ -273,13 +280,18 @@ class PeriodicBracketTax(BaseComponent):
         # Size of the local buffer. In a distributed context, the global buffer size
         # will be capped at n_replicas * _buffer_size.
         # NOTE: Saez will use random taxes until it has self._buffer_size samples.
-        self._buffer_size = 500
+        self._buffer_size = int(saez_buffer_size)
+        assert self._buffer_size > 0
         self._reached_min_samples = False
         self._additions_this_episode = 0
-        # Local buffer maintained by this replica.
-        self._local_saez_buffer = []
+        # Local buffer maintained by this replica: (income, marginal rate) rows.
+        self._local_saez_buffer = RingBuffer(self._buffer_size, 2)
         # "Global" buffer obtained by combining local buffers of individual replicas.
-        self._global_saez_buffer = []
+        self._global_saez_buffer = None
+        # Alternatively, buffers of all replicas shared through shared memory (see
+        # attach_shared_saez_buffer), and the slot of this replica.
+        self._shared_saez_buffer = None
+        self._shared_saez_slot = None
 
         self._saez_n_estimation_bins = 100
         self._saez_top_rate_cutoff = self.bracket_cutoffs[-1]
@@ -296,16 +308,19 @@ class PeriodicBracketTax(BaseComponent):
 
         # === tax cycle definitions ===
         self.tax_cycle_pos = 1
-        self.last_coin = [0 for _ in range(self.n_agents)]
-        self.last_income = [0 for _ in range(self.n_agents)]
-        self.last_marginal_rate = [0 for _ in range(self.n_agents)]
-        self.last_effective_tax_rate = [0 for _ in range(self.n_agents)]
+        self.last_coin = np.zeros(self.n_agents)
+        self.last_income = np.zeros(self.n_agents)
+        self.last_marginal_rate = np.zeros(self.n_agents)
+        self.last_effective_tax_rate = np.zeros(self.n_agents)
 
         # === trackers ===
         self.total_collected_taxes = 0
         self.all_effective_tax_rates = []
         self._schedules = {"{:03d}".format(int(r)): [0] for r in self.bracket_cutoffs}
         self._occupancy = {"{:03d}".format(int(r)): 0 for r in self.bracket_cutoffs}
+        # Per-agent incomes and taxes paid in each tax period of the episode
+        self._period_incomes = []
+        self._period_taxes_paid = []
         self.taxes = []
 
         # === tax annealing ===
@@ -456,7 +471,7 @@ class PeriodicBracketTax(BaseComponent):
             )
             return
 
-        incomes_and_marginal_rates = np.array(self.saez_buffer)
+        incomes_and_marginal_rates = self.saez_buffer
 
         # Elasticity assumed constant for all incomes.
         # (Run this for the sake of tracking the estimate; will not actually use the
@@ -513,42 +528,90 @@ class PeriodicBracketTax(BaseComponent):
     # ----------------------------------------------------------------------
     @property
     def saez_buffer(self):
-        if not self._global_saez_buffer:
-            saez_buffer = self._local_saez_buffer
+        """(n, 2) array of the (income, marginal rate) samples used by the Saez
+        formula. Without a global buffer, this is a read-only view of the local
+        buffer. With a shared buffer, these are the current samples of all the
+        replicas (including this one)."""
+        if self._shared_saez_buffer is not None:
+            saez_buffer = self._shared_saez_buffer.rows()
+        elif self._global_saez_buffer is None or len(self._global_saez_buffer) == 0:
+            saez_buffer = self._local_saez_buffer.view()
         elif self._additions_this_episode == 0:
             saez_buffer = self._global_saez_buffer
         else:
-            saez_buffer = (
-                self._global_saez_buffer
-                + self._local_saez_buffer[-self._additions_this_episode :]
+            saez_buffer = np.concatenate(
+                [
+                    self._global_saez_buffer,
+                    self._local_saez_buffer.view(self._additions_this_episode),
+                ]
             )
         return saez_buffer
 
     def get_local_saez_buffer(self):
-        return self._local_saez_buffer
+        return np.array(self._local_saez_buffer.view())
 
     def set_global_saez_buffer(self, global_saez_buffer):
-        assert isinstance(global_saez_buffer, list)
+        global_saez_buffer = np.array(global_saez_buffer, dtype=np.float64)
+        global_saez_buffer = global_saez_buffer.reshape(-1, 2)
         assert len(global_saez_buffer) >= len(self._local_saez_buffer)
+        global_saez_buffer.flags.writeable = False
         self._global_saez_buffer = global_saez_buffer
 
-    def _update_saez_buffer(self, tax_info_t):
-        # Update the buffer.
-        for a_idx in range(self.n_agents):
-            z_t = tax_info_t[str(a_idx)]["income"]
-            tau_t = tax_info_t[str(a_idx)]["marginal_rate"]
-            self._local_saez_buffer.append([z_t, tau_t])
-            self._additions_this_episode += 1
+    def attach_shared_saez_buffer(self, shared_saez_buffer, slot):
+        """Share the Saez buffer with other replicas through shared memory.
 
-        while len(self._local_saez_buffer) > self._buffer_size:
-            _ = self._local_saez_buffer.pop(0)
+        This replica's samples are written to its slot of shared_saez_buffer (a
+        SharedRingBuffers instance, with width 2), and the samples of all slots are
+        used by the Saez formula. This replaces set_global_saez_buffer.
+
+        Args:
+            shared_saez_buffer (SharedRingBuffers): The shared buffers.
+            slot (int): The slot of this replica. Each replica must use its own slot.
+        """
+        assert isinstance(shared_saez_buffer, SharedRingBuffers)
+        assert shared_saez_buffer.width == 2
+        assert 0 <= slot < shared_saez_buffer.n_slots
+        self._shared_saez_buffer = shared_saez_buffer
+        self._shared_saez_slot = int(slot)
+        self._global_saez_buffer = None
+
+        # Publish the samples collected so far.
+        shared_saez_buffer.clear(self._shared_saez_slot)
+        shared_saez_buffer.append(
+            self._shared_saez_slot, self._local_saez_buffer.view()
+        )
+
+    def _update_saez_buffer(self, incomes, marginal_rates):
+        # Update the buffer.
+        samples = np.stack([incomes, marginal_rates], axis=1)
+        self._local_saez_buffer.append(samples)
+        self._additions_this_episode += len(incomes)
+        if self._shared_saez_buffer is not None:
+            self._shared_saez_buffer.append(self._shared_saez_slot, samples)
 
     def reset_saez_buffers(self):
-        self._local_saez_buffer = []
-        self._global_saez_buffer = []
+        self._local_saez_buffer.clear()
+        self._global_saez_buffer = None
+        if self._shared_saez_buffer is not None:
+            self._shared_saez_buffer.clear(self._shared_saez_slot)
         self._additions_this_episode = 0
         self._reached_min_samples = False
 
+    def __getstate__(self):
+        # Shared memory does not outlive the processes using it: when pickled,
+        # detach from the shared buffer and keep its current contents as the global
+        # buffer instead.
+        state = self.__dict__.copy()
+        if self._shared_saez_buffer is not None:
+            global_saez_buffer = self.saez_buffer
+            global_saez_buffer.flags.writeable = False
+            state["_global_saez_buffer"] = global_saez_buffer
+            # (The snapshot already includes the local samples.)
+            state["_additions_this_episode"] = 0
+            state["_shared_saez_buffer"] = None
+            state["_shared_saez_slot"] = None
+        return state
+
     def estimate_uniform_income_elasticity(
         self,
         observed_incomes_and_marginal_rates,
@@ -561,14 +624,12 @@ class PeriodicBracketTax(BaseComponent):
         OLS: https://en.wikipedia.org/wiki/Ordinary_least_squares
         Estimating elasticity: https://www.nber.org/papers/w7512
         """
-        zs = []
-        taus = []
-
-        for z_t, tau_t in observed_incomes_and_marginal_rates:
-            # If z_t is <=0 or tau_t is >=1, the operations below will give us nans
-            if z_t > 0 and tau_t < 1:
-                zs.append(z_t)
-                taus.append(tau_t)
+        observed = np.asarray(observed_incomes_and_marginal_rates, dtype=np.float64)
+        observed = observed.reshape(-1, 2)
+        # If z_t is <=0 or tau_t is >=1, the operations below will give us nans
+        valid = np.logical_and(observed[:, 0] > 0, observed[:, 1] < 1)
+        zs = observed[valid, 0]
+        taus = observed[valid, 1]
 
         if len(zs) < 10:
             return float(elas_tm1), float(log_z0_tm1)
@@ -576,12 +637,12 @@ class PeriodicBracketTax(BaseComponent):
             return float(elas_tm1), float(log_z0_tm1)
 
         # Regressing log income against log 1-marginal_rate.
-        x = np.log(np.maximum(1 - np.array(taus), 1e-9))
+        x = np.log(np.maximum(1 - taus, 1e-9))
         # (bias term)
         b = np.ones_like(x)
         # Perform OLS.
         X = np.stack([x, b]).T  # Stack linear & bias terms
-        Y = np.log(np.maximum(np.array(zs), 1e-9))  # Regression targets
+        Y = np.log(np.maximum(zs, 1e-9))  # Regression targets
         XXi = np.linalg.inv(X.T.dot(X))
         XY = X.T.dot(Y)
         elas, log_z0 = XXi.T.dot(XY)
@@ -601,153 +662,109 @@ class PeriodicBracketTax(BaseComponent):
         return elas_t, log_z0
 
     def get_binned_saez_welfare_weight_and_pareto_params(self, population_incomes):
-        def clip(x, lo=None, hi=None):
-            if lo is not None:
-                x = max(lo, x)
-            if hi is not None:
-                x = min(x, hi)
-            return x
-
-        def bin_z(left, right):
-            return 0.5 * (left + right)
-
-        def get_cumul(counts, incomes_below, incomes_above):
-            n_below = len(incomes_below)
-            n_above = len(incomes_above)
-            n_total = np.sum(counts) + n_below + n_above
-
-            def p(i, counts):
-                return counts[i] / n_total
-
-            # Probability that an income is below the taxable threshold.
-            p_below = n_below / n_total
-
-            # pz = p(z' = z): probability that [binned] income z' occurs in bin z.
-            pz = [p(i, counts) for i in range(len(counts))] + [n_above / n_total]
-
-            # Pz = p(z' <= z): Probability z' is less-than or equal to z.
-            cum_pz = [pz[0] + p_below]
-            for p in pz[1:]:
-                cum_pz.append(clip(cum_pz[-1] + p, 0, 1.0))
-
-            return np.array(pz), np.array(cum_pz)
-
-        def compute_binned_g_distribution(counts, lefts, incomes):
-            def pareto(z):
-                if self.pareto_weight_type == "uniform":
-                    pareto_weights = np.ones_like(z)
-                elif self.pareto_weight_type == "inverse_income":
-                    pareto_weights = 1.0 / np.maximum(1, z)
-                else:
-                    raise NotImplementedError
-                return pareto_weights
-
-            incomes_below = incomes[incomes < lefts[0]]
-            incomes_above = incomes[incomes > lefts[-1]]
-
-            # The total (unnormalized) Pareto weight of untaxable incomes.
-            if len(incomes_below) > 0:
-                pareto_weight_below = np.sum(pareto(np.maximum(incomes_below, 0)))
-            else:
-                pareto_weight_below = 0
-
-            # The total (unnormalized) Pareto weight within each bin.
-            if len(incomes_above) > 0:
-                pareto_weight_above = np.sum(pareto(incomes_above))
+        population_incomes = np.asarray(population_incomes)
+        counts, lefts = np.histogram(
+            population_incomes, bins=self._saez_income_bin_edges
+        )
+        incomes_below = population_incomes[population_incomes < lefts[0]]
+        incomes_above = population_incomes[population_incomes > lefts[-1]]
+
+        # z is defined as the MIDDLE point in a bin.
+        # So for a bin [left, right] -> z = (left + right) / 2.
+        bin_z = 0.5 * (lefts[:-1] + lefts[1:])
+
+        # Probabilities of each [binned] income, including the open-ended top "bin".
+        n_below = len(incomes_below)
+        n_above = len(incomes_above)
+        n_total = np.sum(counts) + n_below + n_above
+
+        # pz = p(z' = z): probability that [binned] income z' occurs in bin z.
+        pz = np.concatenate([counts, [n_above]]) / n_total
+
+        # cum_pz = p(z' <= z): Probability z' is less-than or equal to z.
+        # (The probability that an income is below the taxable threshold is folded
+        # into the first bin.)
+        cum_pz = np.cumsum(np.concatenate([[pz[0] + n_below / n_total], pz[1:]]))
+        cum_pz[1:] = np.minimum(cum_pz[1:], 1.0)
+
+        # --- Binned G(z) distribution ---
+        def pareto(z):
+            if self.pareto_weight_type == "uniform":
+                pareto_weights = np.ones_like(z)
+            elif self.pareto_weight_type == "inverse_income":
+                pareto_weights = 1.0 / np.maximum(1, z)
             else:
-                pareto_weight_above = 0
-
-            # The total (unnormalized) Pareto weight within each bin.
-            pareto_weight_per_bin = counts * pareto(bin_z(lefts[:-1], lefts[1:]))
-
-            # The aggregate (unnormalized) Pareto weight of all incomes.
-            cumulative_pareto_weights = pareto_weight_per_bin.sum()
-            cumulative_pareto_weights += pareto_weight_below
-            cumulative_pareto_weights += pareto_weight_above
-
-            # Normalize so that the Pareto density sums to 1.
-            pareto_norm = cumulative_pareto_weights + 1e-9
-            unnormalized_pareto_density = np.concatenate(
-                [pareto_weight_per_bin, [pareto_weight_above]]
-            )
-            normalized_pareto_density = unnormalized_pareto_density / pareto_norm
-
-            # Aggregate Pareto weight of earners with income greater-than or equal to z.
-            cumulative_pareto_density_geq_z = np.cumsum(
-                normalized_pareto_density[::-1]
-            )[::-1]
-
-            # Probability that [binned] income z' is greather-than or equal to z.
-            pz, _ = get_cumul(counts, incomes_below, incomes_above)
-            cumulative_prob_geq_z = np.cumsum(pz[::-1])[::-1]
-
-            # Average (normalized) Pareto weight of earners with income >= z.
-            geq_z_norm = cumulative_prob_geq_z + 1e-9
-            avg_pareto_weight_geq_z = cumulative_pareto_density_geq_z / geq_z_norm
-
-            def interpolate_gzs(gz):
-                # Assume incomes within a bin are evenly distributed within that bin
-                # and re-compute accordingly.
-                gz_at_left_edge = gz[:-1]
-                gz_at_right_edge = gz[1:]
-
-                avg_bin_gz = 0.5 * (gz_at_left_edge + gz_at_right_edge)
-                # Re-attach the gz of the top tax rate (does not need to be
-                # interpolated).
-                gzs = np.concatenate([avg_bin_gz, [gz[-1]]])
-                return gzs
-
-            return interpolate_gzs(avg_pareto_weight_geq_z)
-
-        def compute_binned_a_distribution(counts, lefts, incomes):
-            incomes_below = incomes[incomes < lefts[0]]
-            incomes_above = incomes[incomes > lefts[-1]]
-
-            # z is defined as the MIDDLE point in a bin.
-            # So for a bin [left, right] -> z = (left + right) / 2.
-            Az = []
+                raise NotImplementedError
+            return pareto_weights
+
+        # The total (unnormalized) Pareto weight of untaxable incomes.
+        pareto_weight_below = np.sum(pareto(np.maximum(incomes_below, 0)))
+        # The total (unnormalized) Pareto weight of incomes past the top cutoff.
+        pareto_weight_above = np.sum(pareto(incomes_above))
+        # The total (unnormalized) Pareto weight within each bin.
+        pareto_weight_per_bin = counts * pareto(bin_z)
+
+        # The aggregate (unnormalized) Pareto weight of all incomes.
+        cumulative_pareto_weights = pareto_weight_per_bin.sum()
+        cumulative_pareto_weights += pareto_weight_below
+        cumulative_pareto_weights += pareto_weight_above
+
+        # Normalize so that the Pareto density sums to 1.
+        pareto_norm = cumulative_pareto_weights + 1e-9
+        normalized_pareto_density = (
+            np.concatenate([pareto_weight_per_bin, [pareto_weight_above]]) / pareto_norm
+        )
 
-            # cum_pz = p(z' <= z): Probability z' is less-than or equal to z
-            pz, cum_pz = get_cumul(counts, incomes_below, incomes_above)
+        # Aggregate Pareto weight of earners with income greater-than or equal to z.
+        cumulative_pareto_density_geq_z = np.cumsum(normalized_pareto_density[::-1])[
+            ::-1
+        ]
 
-            # Probability z' is greater-than or equal to z
-            # Note: The "0.5" coefficient gives results more consistent with theory; it
-            # accounts for the assumption that incomes within a particular bin are
-            # uniformly spread between the left & right edges of that bin.
-            p_geq_z = 1 - cum_pz + (0.5 * pz)
+        # Probability that [binned] income z' is greather-than or equal to z.
+        cumulative_prob_geq_z = np.cumsum(pz[::-1])[::-1]
 
-            T = len(lefts[:-1])
+        # Average (normalized) Pareto weight of earners with income >= z.
+        geq_z_norm = cumulative_prob_geq_z + 1e-9
+        avg_pareto_weight_geq_z = cumulative_pareto_density_geq_z / geq_z_norm
 
-            for i in range(T):
-                if pz[i] == 0:
-                    Az.append(np.nan)
-                else:
-                    z = bin_z(lefts[i], lefts[i + 1])
-                    # paz = z * pz[i] / (clip(1 - Pz[i], 0, 1) + 1e-9)
-                    paz = z * pz[i] / (clip(p_geq_z[i], 0, 1) + 1e-9)  # defn of A(z)
-                    paz = paz / (lefts[i + 1] - lefts[i])  # norm by bin width
-                    Az.append(paz)
-
-            # Az for the incomes past the top cutoff,
-            # the bin is [left, infinity]: there is no "middle".
-            # Hence, use the mean value in the last bin.
-            if len(incomes_above) > 0:
-                cutoff = lefts[-1]
-                avg_income_above_cutoff = np.mean(incomes_above)
-                # use a special formula to compute A(z)
-                Az_above = avg_income_above_cutoff / (
-                    avg_income_above_cutoff - cutoff + 1e-9
-                )
-            else:
-                Az_above = 0.0
+        # Assume incomes within a bin are evenly distributed within that bin
+        # and re-compute accordingly. Re-attach the gz of the top tax rate (does not
+        # need to be interpolated).
+        population_gz = np.concatenate(
+            [
+                0.5 * (avg_pareto_weight_geq_z[:-1] + avg_pareto_weight_geq_z[1:]),
+                avg_pareto_weight_geq_z[-1:],
+            ]
+        )
 
-            return np.concatenate([Az, [Az_above]])
+        # --- Binned A(z) distribution ---
+        # Probability z' is greater-than or equal to z
+        # Note: The "0.5" coefficient gives results more consistent with theory; it
+        # accounts for the assumption that incomes within a particular bin are
+        # uniformly spread between the left & right edges of that bin.
+        p_geq_z = 1 - cum_pz + (0.5 * pz)
+
+        # A(z) within each bin, normalized by the bin width (nan for empty bins).
+        bin_pz = pz[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            paz = bin_z * bin_pz / (np.clip(p_geq_z[:-1], 0, 1) + 1e-9)
+            paz = paz / (lefts[1:] - lefts[:-1])
+        Az = np.where(bin_pz == 0, np.nan, paz)
+
+        # Az for the incomes past the top cutoff,
+        # the bin is [left, infinity]: there is no "middle".
+        # Hence, use the mean value in the last bin.
+        if n_above > 0:
+            cutoff = lefts[-1]
+            avg_income_above_cutoff = np.mean(incomes_above)
+            # use a special formula to compute A(z)
+            Az_above = avg_income_above_cutoff / (
+                avg_income_above_cutoff - cutoff + 1e-9
+            )
+        else:
+            Az_above = 0.0
 
-        counts, lefts = np.histogram(
-            population_incomes, bins=self._saez_income_bin_edges
-        )
-        population_gz = compute_binned_g_distribution(counts, lefts, population_incomes)
-        population_az = compute_binned_a_distribution(counts, lefts, population_incomes)
+        population_az = np.concatenate([Az, [Az_above]])
 
         # Return the binned stats used to create a schedule of marginal rates.
         return population_gz, population_az
@@ -759,34 +776,17 @@ class PeriodicBracketTax(BaseComponent):
 
         if interpolate:
             # In bins where there were no incomes found, tau is nan.
-            # Interpolate to fill the gaps.
-            last_real_rate = 0.0
-            last_real_tidx = -1
-            for i, tau in enumerate(taus):
-                # The current tax rate is a real number.
-                if not np.isnan(tau):
-                    # This is the end of a gap. Interpolate.
-                    if (i - last_real_tidx) > 1:
-                        assert (
-                            i != 0
-                        )  # This should never trigger for the first tax bin.
-                        gap_indices = list(range(last_real_tidx + 1, i))
-                        intermediate_rates = np.linspace(
-                            last_real_rate, tau, len(gap_indices) + 2
-                        )[1:-1]
-                        assert len(gap_indices) == len(intermediate_rates)
-                        for gap_index, intermediate_rate in zip(
-                            gap_indices, intermediate_rates
-                        ):
-                            taus[gap_index] = intermediate_rate
-                    # Update the tracker.
-                    last_real_rate = float(tau)
-                    last_real_tidx = int(i)
-
-                # The current tax rate is a nan. Continue without updating
-                # the tracker (indicating the presence of a gap).
-                else:
-                    pass
+            # Interpolate linearly to fill the gaps, starting from a rate of 0 before
+            # the first bin. Gaps after the last real rate are left as nan.
+            is_real = ~np.isnan(taus)
+            real_idx = np.flatnonzero(is_real)
+            if len(real_idx) > 0:
+                gap_idx = np.flatnonzero(~is_real[: real_idx[-1]])
+                taus[gap_idx] = np.interp(
+                    gap_idx,
+                    np.concatenate([[-1], real_idx]),
+                    np.concatenate([[0.0], taus[real_idx]]),
+                )
 
         return taus
 
@@ -795,29 +795,25 @@ class PeriodicBracketTax(BaseComponent):
         # if income was >= the right edge.
         # Divide by the bracket size to get
         # the average marginal rate within that bracket.
-        last_bracket_total = 0
-        bracket_avg_marginal_rates = []
-        for b_idx, income in enumerate(self.bracket_cutoffs[1:]):
-            # How much income occurs within each bin
-            # (including the open-ended, top "bin").
-            past_cutoff = np.maximum(0, income - bin_edges)
-            bin_income = np.minimum(bin_sizes, past_cutoff)
 
-            # To get the total taxes due,
-            # multiply the income within each bin by that bin's marginal rate.
-            bin_taxes = bin_marginal_rates * bin_income
-            taxes_due = np.maximum(0, np.sum(bin_taxes))
+        # How much income occurs within each bin (including the open-ended, top
+        # "bin") for an income at the right edge of each bracket:
+        # (n_brackets - 1, n_bins) matrix.
+        incomes = np.asarray(self.bracket_cutoffs[1:])
+        past_cutoff = np.maximum(0, incomes[:, None] - bin_edges[None])
+        bin_income = np.minimum(bin_sizes[None], past_cutoff)
 
-            bracket_tax_burden = taxes_due - last_bracket_total
-            bracket_size = self.bracket_sizes[b_idx]
+        # To get the total taxes due,
+        # multiply the income within each bin by that bin's marginal rate.
+        taxes_due = np.maximum(0, bin_income.dot(bin_marginal_rates))
 
-            bracket_avg_marginal_rates.append(bracket_tax_burden / bracket_size)
-            last_bracket_total = taxes_due
+        bracket_tax_burden = np.diff(taxes_due, prepend=0)
+        bracket_avg_marginal_rates = bracket_tax_burden / self.bracket_sizes[:-1]
 
         # The top bracket tax rate is computed directly already.
-        bracket_avg_marginal_rates.append(bin_marginal_rates[-1])
-
-        bracket_rates = np.array(bracket_avg_marginal_rates)
+        bracket_rates = np.concatenate(
+            [bracket_avg_marginal_rates, bin_marginal_rates[-1:]]
+        )
         assert len(bracket_rates) == self.n_brackets
 
         return bracket_rates
@@ -850,69 +846,110 @@ class PeriodicBracketTax(BaseComponent):
         bin_taxes = self.curr_marginal_rates * bin_income
         return np.sum(bin_taxes)
 
+    def income_bin_indices(self, incomes):
+        """Return the index of the tax bracket in which each of incomes falls.
+
+        Negative incomes fall in the first bracket.
+        """
+        bracket_idx = np.searchsorted(self.bracket_edges, incomes, side="right") - 1
+        return np.clip(bracket_idx, 0, self.n_brackets - 1)
+
+    def marginal_rates(self, incomes, curr_marginal_rates=None):
+        """Return the marginal tax rate applied at each of incomes (batched version
+        of marginal_rate)."""
+        if curr_marginal_rates is None:
+            curr_marginal_rates = self.curr_marginal_rates
+        rates = np.asarray(curr_marginal_rates)[self.income_bin_indices(incomes)]
+        return np.where(np.asarray(incomes) < 0, 0.0, rates)
+
+    def taxes_due_batch(self, incomes, curr_marginal_rates=None):
+        """Return the total amount of taxes due at each of incomes (batched version
+        of taxes_due)."""
+        if curr_marginal_rates is None:
+            curr_marginal_rates = self.curr_marginal_rates
+        incomes = np.asarray(incomes, dtype=np.float64)
+        past_cutoff = np.maximum(0, incomes[:, None] - self.bracket_cutoffs[None])
+        bin_income = np.minimum(self.bracket_sizes[None], past_cutoff)
+        bin_taxes = curr_marginal_rates * bin_income
+        return np.sum(bin_taxes, axis=1)
+
     def enact_taxes(self):
-        """Calculate period income & tax burden. Collect taxes and redistribute."""
-        net_tax_revenue = 0
-        tax_dict = dict(
-            schedule=np.array(self.curr_marginal_rates),
-            cutoffs=np.array(self.bracket_cutoffs),
-        )
+        """Calculate period income & tax burden. Collect taxes and redistribute.
 
-        for curr_rate, bracket_cutoff in zip(
-            self.curr_marginal_rates, self.bracket_cutoffs
-        ):
+        Taxes are computed for all agents at once. The per-agent tax records are only
+        built (and added to the dense log) if dense logging is active.
+        """
+        curr_marginal_rates = self.curr_marginal_rates
+        for curr_rate, bracket_cutoff in zip(curr_marginal_rates, self.bracket_cutoffs):
             self._schedules["{:03d}".format(int(bracket_cutoff))].append(
                 float(curr_rate)
             )
 
-        self.last_income = []
-        self.last_effective_tax_rate = []
-        self.last_marginal_rate = []
-        for agent, last_coin in zip(self.world.agents, self.last_coin):
-            income = agent.total_endowment("Coin") - last_coin
-            tax_due = self.taxes_due(income)
-            effective_taxes = np.minimum(
-                agent.state["inventory"]["Coin"], tax_due
-            )  # Don't take from escrow.
-            marginal_rate = self.marginal_rate(income)
-            effective_tax_rate = float(effective_taxes / np.maximum(0.000001, income))
-            tax_dict[str(agent.idx)] = dict(
-                income=float(income),
-                tax_paid=float(effective_taxes),
-                marginal_rate=marginal_rate,
-                effective_rate=effective_tax_rate,
-            )
+        coin = self.world.get_agent_state_column(("inventory", "Coin"))
+        escrow = self.world.get_agent_state_column(("escrow", "Coin"))
 
-            # Actually collect the taxes.
-            agent.state["inventory"]["Coin"] -= effective_taxes
-            net_tax_revenue += effective_taxes
+        incomes = (coin + escrow) - self.last_coin
+        taxes_due = self.taxes_due_batch(incomes, curr_marginal_rates)
+        # Don't take from escrow.
+        effective_taxes = np.minimum(coin, taxes_due)
+        marginal_rates = self.marginal_rates(incomes, curr_marginal_rates)
+        effective_tax_rates = effective_taxes / np.maximum(0.000001, incomes)
 
-            self.last_income.append(float(income))
-            self.last_marginal_rate.append(float(marginal_rate))
-            self.last_effective_tax_rate.append(effective_tax_rate)
+        # (Summed agent by agent: a pairwise np.sum can differ in the last digit,
+        # which can change the sign of near-zero incomes in the next period.)
+        net_tax_revenue = float(sum(effective_taxes.tolist()))
+        self.total_collected_taxes += net_tax_revenue
+        lump_sum = net_tax_revenue / self.n_agents
 
-            self.all_effective_tax_rates.append(effective_tax_rate)
-            self._occupancy["{:03d}".format(int(self.income_bin(income)))] += 1
+        # Actually collect the taxes and redistribute them.
+        coin = (coin - effective_taxes) + lump_sum
+        self.world.set_agent_state_column(("inventory", "Coin"), coin)
+        self.last_coin = coin + escrow
 
-        self.total_collected_taxes += float(net_tax_revenue)
+        self.last_income = incomes
+        self.last_marginal_rate = marginal_rates
+        self.last_effective_tax_rate = effective_tax_rates
 
-        lump_sum = net_tax_revenue / self.n_agents
-        for agent in self.world.agents:
-            agent.state["inventory"]["Coin"] += lump_sum
-            tax_dict[str(agent.idx)]["lump_sum"] = float(lump_sum)
-            self.last_coin[agent.idx] = float(agent.total_endowment("Coin"))
-
-        self.taxes.append(tax_dict)
+        self.all_effective_tax_rates.extend(effective_tax_rates.tolist())
+        occupancy = np.bincount(
+            self.income_bin_indices(incomes), minlength=self.n_brackets
+        )
+        for bracket_cutoff, n in zip(self.bracket_cutoffs, occupancy):
+            self._occupancy["{:03d}".format(int(bracket_cutoff))] += int(n)
+        self._period_incomes.append(incomes)
+        self._period_taxes_paid.append(effective_taxes)
+
+        if self.dense_logging:
+            tax_dict = dict(
+                schedule=np.array(curr_marginal_rates),
+                cutoffs=np.array(self.bracket_cutoffs),
+            )
+            for i, (income, tax_paid, marginal_rate, effective_rate) in enumerate(
+                zip(
+                    incomes.tolist(),
+                    effective_taxes.tolist(),
+                    marginal_rates.tolist(),
+                    effective_tax_rates.tolist(),
+                )
+            ):
+                tax_dict[str(i)] = dict(
+                    income=income,
+                    tax_paid=tax_paid,
+                    marginal_rate=marginal_rate,
+                    effective_rate=effective_rate,
+                    lump_sum=float(lump_sum),
+                )
+            self.taxes.append(tax_dict)
 
         # Pre-compute some things that will be useful for generating observations.
-        self._last_income_obs = np.array(self.last_income) / self.period
+        self._last_income_obs = incomes / self.period
         self._last_income_obs_sorted = self._last_income_obs[
             np.argsort(self._last_income_obs)
         ]
 
         # Fold this period's tax data into the saez buffer.
         if self.tax_model == "saez":
-            self._update_saez_buffer(tax_dict)
+            self._update_saez_buffer(incomes, marginal_rates)
 
     # Required methods for implementing components
     # --------------------------------------------
@@ -965,7 +1002,7 @@ class PeriodicBracketTax(BaseComponent):
             self.enact_taxes()
             self.tax_cycle_pos = 0
 
-        else:
+        elif self.dense_logging:
             self.taxes.append([])
 
         # increment timestep.
@@ -997,13 +1034,17 @@ class PeriodicBracketTax(BaseComponent):
             curr_rates=self._curr_rates_obs,
         )
 
+        curr_incomes = (
+            np.array([agent.total_endowment("Coin") for agent in self.world.agents])
+            - self.last_coin
+        )
+        curr_marginal_rates = self.marginal_rates(curr_incomes)
+
         for agent in self.world.agents:
             i = agent.idx
             k = str(i)
 
-            curr_marginal_rate = self.marginal_rate(
-                agent.total_endowment("Coin") - self.last_coin[i]
-            )
+            curr_marginal_rate = curr_marginal_rates[i]
 
             obs[k] = dict(
                 is_tax_day=is_tax_day,
@@ -1115,15 +1156,15 @@ class PeriodicBracketTax(BaseComponent):
         self.curr_rate_indices = [0 for _ in range(self.n_brackets)]
 
         self.tax_cycle_pos = 1
-        self.last_coin = [
-            float(agent.total_endowment("Coin")) for agent in self.world.agents
-        ]
-        self.last_income = [0 for _ in range(self.n_agents)]
-        self.last_marginal_rate = [0 for _ in range(self.n_agents)]
-        self.last_effective_tax_rate = [0 for _ in range(self.n_agents)]
+        self.last_coin = np.array(
+            [float(agent.total_endowment("Coin")) for agent in self.world.agents]
+        )
+        self.last_income = np.zeros(self.n_agents)
+        self.last_marginal_rate = np.zeros(self.n_agents)
+        self.last_effective_tax_rate = np.zeros(self.n_agents)
 
         self._curr_rates_obs = np.array(self.curr_marginal_rates)
-        self._last_income_obs = np.array(self.last_income) / self.period
+        self._last_income_obs = self.last_income / self.period
         self._last_income_obs_sorted = self._last_income_obs[
             np.argsort(self._last_income_obs)
         ]
@@ -1133,6 +1174,8 @@ class PeriodicBracketTax(BaseComponent):
         self.all_effective_tax_rates = []
         self._schedules = {"{:03d}".format(int(r)): [] for r in self.bracket_cutoffs}
         self._occupancy = {"{:03d}".format(int(r)): 0 for r in self.bracket_cutoffs}
+        self._period_incomes = []
+        self._period_taxes_paid = []
         self._planner_masks = None
 
         if self.tax_model == "saez":
@@ -1165,14 +1208,12 @@ class PeriodicBracketTax(BaseComponent):
             idx_poor = np.argmin(agent_coin_endows)
             idx_rich = np.argmax(agent_coin_endows)
 
-            tax_days = self.taxes[(self.period - 1) :: self.period]
+            # (n_tax_periods, n_agents) incomes and taxes paid
+            period_incomes = np.reshape(self._period_incomes, (-1, self.n_agents))
+            period_taxes_paid = np.reshape(self._period_taxes_paid, (-1, self.n_agents))
             for i, tag in zip([idx_poor, idx_rich], ["poorest", "richest"]):
-                total_income = np.maximum(
-                    0, [tax_day[str(i)]["income"] for tax_day in tax_days]
-                ).sum()
-                total_tax_paid = np.sum(
-                    [tax_day[str(i)]["tax_paid"] for tax_day in tax_days]
-                )
+                total_income = np.maximum(0, period_incomes[:, i]).sum()
+                total_tax_paid = np.sum(period_taxes_paid[:, i])
                 # Report the overall tax rate over the episode
                 # for the richest and poorest agents.
                 out["avg_tax_rate/{}".format(tag)] = total_tax_paid / np.maximum(
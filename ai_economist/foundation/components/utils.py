@@ -113,3 +113,182 @@ def annealed_tax_mask(completions, warmup_period, slope, tax_values):
     return np.less_equal(np.abs(tax_values), max_absolute_visible_tax).astype(
         np.float32
     )
+
+
+class RingBuffer:
+    """
+    Fixed-capacity FIFO buffer of fixed-width rows, backed by a NumPy array.
+
+    Rows are appended in batches. Once the buffer holds capacity rows, the oldest
+    rows are evicted to make room for new ones. The buffer contents are always
+    available, in insertion order, as a contiguous (zero-copy) view.
+
+    Internally, rows are written sequentially into an array of twice the capacity;
+    when it fills up, the most recent capacity rows are moved to its start. This
+    makes appending (amortized) O(1) per row.
+
+    Args:
+        capacity (int): Maximum number of rows held by the buffer. Must be > 0.
+        width (int): Number of columns of each row.
+        dtype: Data type of the buffer. Default is float64.
+    """
+
+    def __init__(self, capacity, width, dtype=np.float64):
+        self.capacity = int(capacity)
+        assert self.capacity > 0
+        self._data = np.zeros((2 * self.capacity, int(width)), dtype=dtype)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    def append(self, rows):
+        """Append rows (array-like of shape (n, width)), evicting the oldest rows
+        beyond capacity."""
+        rows = np.asarray(rows, dtype=self._data.dtype)
+        rows = rows.reshape(-1, self._data.shape[1])[-self.capacity :]
+        n = len(rows)
+        if self._end + n > len(self._data):
+            n_kept = min(len(self), self.capacity - n)
+            self._data[:n_kept] = self._data[self._end - n_kept : self._end]
+            self._start, self._end = 0, n_kept
+        self._data[self._end : self._end + n] = rows
+        self._end += n
+        self._start = max(self._start, self._end - self.capacity)
+
+    def view(self, n=None):
+        """Return a read-only view of the last n rows (all rows if n is None)."""
+        start = self._start if n is None else max(self._start, self._end - int(n))
+        data = self._data[start : self._end]
+        data.flags.writeable = False
+        return data
+
+    def clear(self):
+        """Remove all rows."""
+        self._start = 0
+        self._end = 0
+
+
+class SharedRingBuffers:
+    """
+    A set of fixed-capacity FIFO buffers of fixed-width float64 rows, one per
+    writer, stored in a single shared-memory block.
+
+    Each writer (e.g. an environment replica in a worker process) appends to its own
+    slot; any process attached to the block can read the rows of every slot. Slots
+    only hold the last capacity rows appended to them.
+
+    Instances are picklable: unpickling attaches to the existing shared-memory block
+    (instead of copying its contents), so the buffers can be shared with processes
+    on the same machine by passing the instance to them. The process that created
+    the block should call unlink() once the buffers are no longer needed.
+
+    Requires Python >= 3.8 (multiprocessing.shared_memory).
+
+    Args:
+        n_slots (int): Number of slots (writers). Must be > 0.
+        capacity (int): Maximum number of rows held by each slot. Must be > 0.
+        width (int): Number of columns of each row.
+        name (str, optional): Name of an existing shared-memory block to attach to.
+            If not given (default), a new block is created.
+    """
+
+    def __init__(self, n_slots, capacity, width=2, name=None):
+        self.n_slots = int(n_slots)
+        self.capacity = int(capacity)
+        self.width = int(width)
+        assert self.n_slots > 0
+        assert self.capacity > 0
+        assert self.width > 0
+
+        # Layout: the number of rows written to each slot (int64), followed by the
+        # (n_slots, capacity, width) rows (float64).
+        n_bytes = 8 * self.n_slots * (1 + self.capacity * self.width)
+        if name is None:
+            from multiprocessing import shared_memory
+
+            self._shm = shared_memory.SharedMemory(create=True, size=n_bytes)
+        else:
+            self._shm = _attach_shared_memory(name)
+        self._n_written = np.ndarray(
+            (self.n_slots,), dtype=np.int64, buffer=self._shm.buf
+        )
+        self._data = np.ndarray(
+            (self.n_slots, self.capacity, self.width),
+            dtype=np.float64,
+            buffer=self._shm.buf,
+            offset=8 * self.n_slots,
+        )
+        if name is None:
+            self._n_written[:] = 0
+
+    @property
+    def name(self):
+        """Name of the shared-memory block."""
+        return self._shm.name
+
+    def __reduce__(self):
+        return self.__class__, (self.n_slots, self.capacity, self.width, self.name)
+
+    def __len__(self):
+        return int(np.sum(np.minimum(self._n_written, self.capacity)))
+
+    def append(self, slot, rows):
+        """Append rows (array-like of shape (n, width)) to the buffer of slot,
+        evicting its oldest rows beyond capacity."""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.width)
+        n_written = int(self._n_written[slot])
+        rows = rows[-self.capacity :]
+        positions = (n_written + np.arange(len(rows))) % self.capacity
+        self._data[slot, positions] = rows
+        # (Only publish the new rows once they are written.)
+        self._n_written[slot] = n_written + len(rows)
+
+    def slot_rows(self, slot):
+        """Return (a copy of) the rows of slot, in insertion order."""
+        n_written = int(self._n_written[slot])
+        if n_written <= self.capacity:
+            return np.array(self._data[slot, :n_written])
+        start = n_written % self.capacity
+        return np.concatenate(
+            [self._data[slot, start:], self._data[slot, :start]], axis=0
+        )
+
+    def rows(self):
+        """Return the rows of all slots (each in insertion order), concatenated in
+        slot order."""
+        return np.concatenate([self.slot_rows(s) for s in range(self.n_slots)])
+
+    def clear(self, slot=None):
+        """Remove all rows of slot (of all slots if slot is None)."""
+        if slot is None:
+            self._n_written[:] = 0
+        else:
+            self._n_written[slot] = 0
+
+    def close(self):
+        """Detach from the shared-memory block."""
+        self._n_written = None
+        self._data = None
+        self._shm.close()
+
+    def unlink(self):
+        """Request the shared-memory block to be destroyed."""
+        self._shm.unlink()
+
+
+def _attach_shared_memory(name):
+    """Attach to an existing shared-memory block, without registering it with the
+    resource tracker (so that it is not destroyed when an attached process exits)."""
+    from multiprocessing import resource_tracker, shared_memory
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 always registers the block
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
@@ -0,0 +1,657 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Binary, columnar on-disk format for episode (dense) logs.
+
+An episode log is stored as a directory containing a small JSON manifest and one
+.npy file per (chunk, column):
+    manifest.json         <-- layout of the log (keys, dtypes, chunk boundaries)
+    world/<chunk>_<c>.npy <-- snapshots of world map channel c: (snapshots, H, W)
+    states/<chunk>_<f>.npy <-- agent-state field f: (timesteps, agents, *shape)
+    states/<chunk>_<f>_types.npy <-- python types of the values of field f, if
+                                     it mixes them: (timesteps, agents)
+    steps/<chunk>.json    <-- actions and rewards of the timesteps in the chunk
+    states/<chunk>.json   <-- agent-state fields that are not numeric arrays
+    extras.json           <-- component dense logs
+
+The .npy files are opened with np.memmap (via np.load(mmap_mode="r")), so that a
+single map snapshot, or the trajectory of one agent-state field, can be read without
+loading the rest of the log.
+
+Episodes can also be streamed to disk in this format while they are being logged
+(see StreamingDenseLog and BaseEnvironment.set_dense_log_directory).
+
+Numeric state fields are stored with a single dtype per field and chunk. If a field
+mixes integers and floats (such as a coin inventory that starts at 0), the python
+type of each value is stored alongside (as in DenseLog), so that integers are read
+back as integers.
+"""
+
+import bisect
+import json
+import os
+import shutil
+from copy import deepcopy
+
+import numpy as np
+
+from ai_economist.foundation.base.dense_log import (
+    _BOOL,
+    _FLOAT,
+    _INT,
+    _numeric_leaf,
+    _restore,
+    build_nested,
+    collect_leaves,
+    recursive_cast,
+)
+
+FORMAT_NAME = "foundation-columnar-episode-log"
+FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+
+
+def is_columnar_episode_log(path):
+    """Return True if path is a directory holding a columnar episode log."""
+    return os.path.isfile(os.path.join(path, MANIFEST_FILENAME))
+
+
+def _path_str(path):
+    return "/".join(str(k) for k in path)
+
+
+def _type_codes(column, array):
+    """Return the (timesteps, agents) type codes of the values of a numeric column
+    (see DenseLog), None if they all match the dtype of array, or False if the
+    values cannot be restored from array."""
+    codes = np.zeros(array.shape[:2], dtype=np.int8)
+    for t, row in enumerate(column):
+        for j, v in enumerate(row):
+            numeric = _numeric_leaf(v)
+            if numeric is None:
+                return False
+            codes[t, j] = numeric[1]
+    array_code = {"f": _FLOAT, "b": _BOOL}.get(array.dtype.kind, _INT)
+    if np.all(codes == array_code):
+        return None
+    return codes
+
+
+class ColumnarEpisodeLogWriter:
+    """Writes an episode log, chunk by chunk, in the columnar format.
+
+    Example:
+        writer = ColumnarEpisodeLogWriter(dirpath)
+        writer.write_chunk(world=..., states=..., actions=..., rewards=...)
+        ...
+        writer.close(extras=component_logs)
+
+    Args:
+        dirpath (str): Directory to write the log to. Created if it does not exist.
+            If it already holds a log, the files of that log are removed, so that
+            no stale chunks of a longer, previous episode are left behind.
+    """
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        for sub_dir in ["world", "states", "steps"]:
+            sub_dirpath = os.path.join(self.dirpath, sub_dir)
+            os.makedirs(sub_dirpath, exist_ok=True)
+            for filename in os.listdir(sub_dirpath):
+                if filename.endswith((".npy", ".json")):
+                    os.remove(os.path.join(sub_dirpath, filename))
+        if os.path.isfile(self._file("extras.json")):
+            os.remove(self._file("extras.json"))
+
+        self._n_chunks = 0
+        self._manifest = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "world": {
+                "length": 0,
+                "keys": None,
+                "dtypes": None,
+                "timesteps": [],
+                "chunks": [],
+            },
+            "states": {"length": 0, "agents": None, "fields": None, "chunks": []},
+            "steps": {"length": 0, "chunks": []},
+            "closed": False,
+        }
+        self._write_manifest()
+
+    def _file(self, *parts):
+        return os.path.join(self.dirpath, *parts)
+
+    def _write_world(self, chunk, world):
+        manifest = self._manifest["world"]
+        start = manifest["length"]
+        snapshots = []
+        for t, world_maps in enumerate(world):
+            if not world_maps:
+                continue
+            leaves = []
+            collect_leaves(world_maps, (), leaves)
+            if manifest["keys"] is None:
+                manifest["keys"] = [list(path) for path, _ in leaves]
+                manifest["dtypes"] = [np.asarray(v).dtype.str for _, v in leaves]
+            assert [list(path) for path, _ in leaves] == manifest["keys"]
+            manifest["timesteps"].append(start + t)
+            snapshots.append([v for _, v in leaves])
+        manifest["length"] += len(world)
+
+        if not snapshots:
+            return
+        files = []
+        for c, dtype in enumerate(manifest["dtypes"]):
+            filename = "{:05d}_{:03d}.npy".format(chunk, c)
+            np.save(
+                self._file("world", filename),
+                np.stack([np.asarray(s[c], dtype=dtype) for s in snapshots]),
+            )
+            files.append(filename)
+        n_snapshots = len(manifest["timesteps"])
+        manifest["chunks"].append(
+            {"start": n_snapshots - len(snapshots), "files": files}
+        )
+
+    def _write_states(self, chunk, states):
+        manifest = self._manifest["states"]
+        if not states:
+            return
+        start = manifest["length"]
+
+        if manifest["agents"] is None:
+            # The layout of each agent's state is set by its first logged state
+            manifest["agents"] = list(states[0].keys())
+            fields = {}
+            for agent_key in manifest["agents"]:
+                leaves = []
+                collect_leaves(states[0][agent_key], (), leaves)
+                for path, _ in leaves:
+                    fields.setdefault(
+                        _path_str(path), {"path": list(path), "agents": []}
+                    )
+                    fields[_path_str(path)]["agents"].append(agent_key)
+            manifest["fields"] = list(fields.values())
+
+        # Gather the values of each field (column), and the states that do not
+        # match the layout (stored whole, as overrides)
+        field_index = {
+            _path_str(f["path"]): i for i, f in enumerate(manifest["fields"])
+        }
+        slots = [
+            {agent_key: j for j, agent_key in enumerate(f["agents"])}
+            for f in manifest["fields"]
+        ]
+        columns = [
+            [[None] * len(f["agents"]) for _ in states] for f in manifest["fields"]
+        ]
+        overrides = {}
+        for t, agent_states in enumerate(states):
+            for agent_key, state in agent_states.items():
+                leaves = []
+                collect_leaves(state, (), leaves)
+                expected = [i for i, s in enumerate(slots) if agent_key in s]
+                found = [field_index.get(_path_str(path)) for path, _ in leaves]
+                if None in found or sorted(found) != expected:
+                    overrides.setdefault(str(start + t), {})[agent_key] = state
+                    continue
+                for i, (_, v) in zip(found, leaves):
+                    columns[i][t][slots[i][agent_key]] = v
+
+        files = {}
+        types = {}
+        objects = {}
+        for i, column in enumerate(columns):
+            field = manifest["fields"][i]
+            # Cells of overridden states are never read; fill them with any value
+            # of the column so that they do not break its dtype
+            fill = next((v for row in column for v in row if v is not None), None)
+            column = [[fill if v is None else v for v in row] for row in column]
+            array = None
+            try:
+                array = np.array(column)
+            except ValueError:
+                pass
+            is_numeric = (
+                array is not None
+                and array.dtype.kind in "biuf"
+                and array.shape[:2] == (len(states), len(field["agents"]))
+            )
+            codes = _type_codes(column, array) if is_numeric else False
+            if codes is not False:
+                filename = "{:05d}_{:03d}.npy".format(chunk, i)
+                np.save(self._file("states", filename), array)
+                files[str(i)] = filename
+                if codes is not None:
+                    filename = "{:05d}_{:03d}_types.npy".format(chunk, i)
+                    np.save(self._file("states", filename), codes)
+                    types[str(i)] = filename
+            else:
+                objects[str(i)] = recursive_cast(column)
+
+        objects_filename = None
+        if objects or overrides:
+            objects_filename = "{:05d}.json".format(chunk)
+            with open(self._file("states", objects_filename), "w") as fp:
+                json.dump(
+                    {"objects": objects, "overrides": recursive_cast(overrides)}, fp
+                )
+
+        manifest["chunks"].append(
+            {
+                "start": start,
+                "files": files,
+                "types": types,
+                "objects": objects_filename,
+            }
+        )
+        manifest["length"] += len(states)
+
+    def _write_steps(self, chunk, actions, rewards):
+        manifest = self._manifest["steps"]
+        if not actions and not rewards:
+            return
+        filename = "{:05d}.json".format(chunk)
+        with open(self._file("steps", filename), "w") as fp:
+            json.dump(
+                {
+                    "actions": recursive_cast(actions),
+                    "rewards": recursive_cast(rewards),
+                },
+                fp,
+            )
+        manifest["chunks"].append({"start": manifest["length"], "file": filename})
+        manifest["length"] += max(len(actions), len(rewards))
+
+    def write_chunk(self, world=(), states=(), actions=(), rewards=()):
+        """Append a chunk of timesteps to the log.
+
+        Args:
+            world (list): World map entries, one per timestep (see the "world" key
+                of the dense log). Entries are either {} or {map_name: map}.
+            states (list): Agent state entries, one per timestep, each formatted as
+                {agent_idx: agent_state}.
+            actions (list): Agent action entries, one per timestep.
+            rewards (list): Agent reward entries, one per timestep.
+        """
+        assert not self._manifest["closed"]
+        chunk = self._n_chunks
+        self._write_world(chunk, list(world))
+        self._write_states(chunk, list(states))
+        self._write_steps(chunk, list(actions), list(rewards))
+        self._n_chunks += 1
+        self._write_manifest()
+
+    def close(self, extras=None):
+        """Finalize the log, writing any additional (component) logs to extras.json."""
+        with open(self._file("extras.json"), "w") as fp:
+            json.dump(recursive_cast(dict(extras or {})), fp)
+        self._manifest["closed"] = True
+        self._write_manifest()
+
+    def _write_manifest(self):
+        with open(self._file(MANIFEST_FILENAME), "w") as fp:
+            json.dump(self._manifest, fp)
+
+
+def write_columnar_episode_log(dense_log, dirpath):
+    """Write a dense log (in its nested list/dict format) to dirpath in the columnar
+    format."""
+    writer = ColumnarEpisodeLogWriter(dirpath)
+    writer.write_chunk(
+        world=dense_log.get("world", []),
+        states=dense_log.get("states", []),
+        actions=dense_log.get("actions", []),
+        rewards=dense_log.get("rewards", []),
+    )
+    writer.close(
+        extras={
+            k: v
+            for k, v in dense_log.items()
+            if k not in ["world", "states", "actions", "rewards"]
+        }
+    )
+
+
+class StreamingDenseLog:
+    """Dense log that streams an episode to disk, in the columnar format, while it
+    is being logged.
+
+    It offers the logging interface of DenseLog, but only keeps the last (at most
+    chunk_length) timesteps in memory: each time chunk_length full timesteps have
+    been logged, they are appended to the on-disk log as a new chunk. The log is
+    completed when the episode ends (see close) and can then be read back with
+    ColumnarEpisodeLog.
+
+    Args:
+        dirpath (str): Directory to write the log to.
+        chunk_length (int): Number of timesteps to buffer in memory before they are
+            written to disk.
+    """
+
+    def __init__(self, dirpath, chunk_length=100):
+        self.dirpath = dirpath
+        self.chunk_length = int(chunk_length)
+        assert self.chunk_length >= 1
+        self._writer = ColumnarEpisodeLogWriter(dirpath)
+        self._buffer = {"world": [], "states": [], "actions": [], "rewards": []}
+        self.component_logs = {}
+        self.closed = False
+
+    # Logging
+    # -------
+
+    def log_world(self, state_dict, snapshot=True):
+        """Log a snapshot of the world maps (or an empty entry if snapshot=False)."""
+        self._buffer["world"].append(deepcopy(state_dict) if snapshot else {})
+
+    def log_states(self, agent_states):
+        """Log the states of all the agents, given as {agent_key: state_dict}."""
+        self._buffer["states"].append(deepcopy(agent_states))
+
+    def log_actions(self, actions):
+        """Log the (non-NO-OP) actions of all the agents."""
+        self._buffer["actions"].append(actions)
+
+    def log_rewards(self, rewards):
+        """Log the rewards of all the agents. Completes the timestep, so that the
+        buffer is flushed to disk once it holds chunk_length timesteps."""
+        self._buffer["rewards"].append(rewards)
+        if len(self._buffer["rewards"]) >= self.chunk_length:
+            self.flush()
+
+    def add_component_log(self, key, log):
+        """Add the dense log of a component under key."""
+        self.component_logs[key] = log
+
+    def flush(self):
+        """Write the buffered timesteps to disk."""
+        if not any(self._buffer.values()):
+            return
+        self._writer.write_chunk(**self._buffer)
+        self._buffer = {k: [] for k in self._buffer}
+
+    def close(self):
+        """Write the remaining timesteps and the component logs to disk."""
+        if self.closed:
+            return
+        self.flush()
+        self._writer.close(extras=self.component_logs)
+        self.closed = True
+
+    def delete(self):
+        """Remove the log (written so far) from disk."""
+        self.closed = True
+        shutil.rmtree(self.dirpath, ignore_errors=True)
+
+    # Reading
+    # -------
+
+    def to_dict(self):
+        """Return the dense log in its nested list/dict format.
+
+        The timesteps that were already written are read back from disk, so this
+        loads the whole log into memory.
+        """
+        dense_log = ColumnarEpisodeLog(self.dirpath).to_dict()
+        if not self.closed:
+            for k, v in self._buffer.items():
+                dense_log[k] = list(dense_log[k]) + recursive_cast(deepcopy(v))
+            dense_log.update(recursive_cast(deepcopy(self.component_logs)))
+        return dense_log
+
+
+class _ChunkedSequence:
+    """Read-only sequence over a stream of the log, built from chunks."""
+
+    def __init__(self, length, get_item):
+        self._length = length
+        self._get_item = get_item
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, t):
+        if isinstance(t, slice):
+            return [self[i] for i in range(*t.indices(self._length))]
+        t = int(t)
+        if t < 0:
+            t += self._length
+        if not 0 <= t < self._length:
+            raise IndexError("Index {} is out of range".format(t))
+        return self._get_item(t)
+
+    def __iter__(self):
+        for t in range(self._length):
+            yield self._get_item(t)
+
+
+class ColumnarEpisodeLog:
+    """Memory-mapped reader for an episode log saved in the columnar format.
+
+    Behaves like the (read-only) dense log dictionary: log["world"][t],
+    log["states"][t], log["actions"], log["rewards"] and the component logs (such as
+    log["Build"]) are available as in the nested list/dict format. World maps are
+    returned as read-only views of memory-mapped arrays.
+
+    In addition, get_world_map and get_state_trajectory give direct access to one
+    map, or to the trajectory of one agent-state field, without building the
+    per-timestep dictionaries.
+
+    Args:
+        dirpath (str): Directory holding the log.
+    """
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+        with open(os.path.join(dirpath, MANIFEST_FILENAME), "r") as fp:
+            self.manifest = json.load(fp)
+        assert self.manifest["format"] == FORMAT_NAME
+        assert self.manifest["version"] <= FORMAT_VERSION
+
+        world = self.manifest["world"]
+        self._world_timesteps = {t: s for s, t in enumerate(world["timesteps"])}
+        self._world_keys = [tuple(k) for k in world["keys"] or []]
+        self._world_starts = [c["start"] for c in world["chunks"]]
+
+        states = self.manifest["states"]
+        self._fields = [
+            (tuple(f["path"]), {a: j for j, a in enumerate(f["agents"])})
+            for f in states["fields"] or []
+        ]
+        self._state_starts = [c["start"] for c in states["chunks"]]
+
+        self._arrays = {}
+        self._json = {}
+        self._steps = None
+        self._extras = None
+
+    # Loading helpers
+    # ---------------
+
+    def _load_array(self, sub_dir, filename):
+        key = (sub_dir, filename)
+        if key not in self._arrays:
+            self._arrays[key] = np.load(
+                os.path.join(self.dirpath, sub_dir, filename), mmap_mode="r"
+            )
+        return self._arrays[key]
+
+    def _load_json(self, sub_dir, filename):
+        key = (sub_dir, filename)
+        if key not in self._json:
+            with open(os.path.join(self.dirpath, sub_dir, filename), "r") as fp:
+                self._json[key] = json.load(fp)
+        return self._json[key]
+
+    @staticmethod
+    def _find_chunk(starts, index):
+        return bisect.bisect_right(starts, index) - 1
+
+    # World maps
+    # ----------
+
+    @property
+    def world_timesteps(self):
+        """The timesteps for which a snapshot of the world maps was logged."""
+        return list(self.manifest["world"]["timesteps"])
+
+    def get_world_map(self, t, *key):
+        """Return the (memory-mapped) world map for key (e.g. "Wood", or "House",
+        "owner") logged at timestep t."""
+        s = self._world_timesteps[int(t)]
+        c = self._world_keys.index(tuple(key))
+        chunk = self._find_chunk(self._world_starts, s)
+        chunk_info = self.manifest["world"]["chunks"][chunk]
+        return self._load_array("world", chunk_info["files"][c])[
+            s - chunk_info["start"]
+        ]
+
+    def _get_world(self, t):
+        if t not in self._world_timesteps:
+            return {}
+        return build_nested(
+            self._world_keys,
+            [self.get_world_map(t, *key) for key in self._world_keys],
+        )
+
+    # Agent states
+    # ------------
+
+    def _get_field(self, chunk, t, i, slot):
+        chunk_info = self.manifest["states"]["chunks"][chunk]
+        if str(i) in chunk_info["files"]:
+            array = self._load_array("states", chunk_info["files"][str(i)])
+            value = array[t - chunk_info["start"], slot]
+            types = chunk_info.get("types", {})
+            if str(i) in types:
+                code = self._load_array("states", types[str(i)])[
+                    t - chunk_info["start"], slot
+                ]
+                return _restore(np.ravel(value), code, np.shape(value))
+            return value.tolist()
+        objects = self._load_json("states", chunk_info["objects"])["objects"]
+        return objects[str(i)][t - chunk_info["start"]][slot]
+
+    def _get_states(self, t):
+        chunk = self._find_chunk(self._state_starts, t)
+        chunk_info = self.manifest["states"]["chunks"][chunk]
+        overrides = {}
+        if chunk_info["objects"] is not None:
+            overrides = self._load_json("states", chunk_info["objects"])[
+                "overrides"
+            ].get(str(t), {})
+
+        states = {}
+        for agent_key in self.manifest["states"]["agents"]:
+            if agent_key in overrides:
+                states[agent_key] = overrides[agent_key]
+                continue
+            paths, values = [], []
+            for i, (path, slots) in enumerate(self._fields):
+                if agent_key in slots:
+                    paths.append(path)
+                    values.append(self._get_field(chunk, t, i, slots[agent_key]))
+            states[agent_key] = build_nested(paths, values)
+        return states
+
+    def get_state_trajectory(self, agent_key, *path):
+        """Return the trajectory of one agent-state field (such as
+        ("inventory", "Coin")) as an array with a leading time dimension.
+
+        Only the column of the requested agent is read from disk.
+        """
+        agent_key = str(agent_key)
+        i = [p for p, _ in self._fields].index(tuple(path))
+        slot = self._fields[i][1][agent_key]
+        parts = []
+        for chunk_info in self.manifest["states"]["chunks"]:
+            if str(i) in chunk_info["files"]:
+                array = self._load_array("states", chunk_info["files"][str(i)])
+                parts.append(np.asarray(array[:, slot]))
+            else:
+                objects = self._load_json("states", chunk_info["objects"])
+                parts.append(
+                    np.array([row[slot] for row in objects["objects"][str(i)]])
+                )
+            if chunk_info["objects"] is None:
+                continue
+            # Patch in the values from states that did not match the layout
+            overrides = self._load_json("states", chunk_info["objects"])["overrides"]
+            for t_str, agent_states in overrides.items():
+                value = agent_states.get(agent_key, {})
+                for k in path:
+                    value = value.get(k) if isinstance(value, dict) else None
+                if value is not None:
+                    parts[-1] = np.array(
+                        parts[-1], dtype=np.result_type(parts[-1], value)
+                    )
+                    parts[-1][int(t_str) - chunk_info["start"]] = value
+        return np.concatenate(parts, axis=0)
+
+    # Dictionary interface
+    # --------------------
+
+    def _get_steps(self):
+        if self._steps is None:
+            self._steps = {"actions": [], "rewards": []}
+            for chunk_info in self.manifest["steps"]["chunks"]:
+                steps = self._load_json("steps", chunk_info["file"])
+                self._steps["actions"].extend(steps["actions"])
+                self._steps["rewards"].extend(steps["rewards"])
+        return self._steps
+
+    def _get_extras(self):
+        if self._extras is None:
+            filepath = os.path.join(self.dirpath, "extras.json")
+            if os.path.isfile(filepath):
+                with open(filepath, "r") as fp:
+                    self._extras = json.load(fp)
+            else:
+                self._extras = {}
+        return self._extras
+
+    def keys(self):
+        """Return the keys of the dense log."""
+        return ["world", "states", "actions", "rewards"] + list(
+            self._get_extras().keys()
+        )
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, key):
+        if key == "world":
+            return _ChunkedSequence(self.manifest["world"]["length"], self._get_world)
+        if key == "states":
+            return _ChunkedSequence(self.manifest["states"]["length"], self._get_states)
+        if key in ["actions", "rewards"]:
+            return self._get_steps()[key]
+        return self._get_extras()[key]
+
+    def get(self, key, default=None):
+        """Return log[key] if key is in the log, else default."""
+        if key in self:
+            return self[key]
+        return default
+
+    def to_dict(self):
+        """Load the whole log into the nested list/dict format of the dense log."""
+        dense_log = {}
+        for key in self.keys():
+            value = self[key]
+            if key == "world":
+                value = [recursive_cast(dict(w)) if w else {} for w in value]
+            elif key == "states":
+                value = list(value)
+            dense_log[key] = value
+        return dense_log
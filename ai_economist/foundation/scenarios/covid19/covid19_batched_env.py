@@ -0,0 +1,744 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+The batched (multi-environment) CPU version of the COVID-19 and economy simulation,
+and a runner for (batched) parameter modulation sweeps
+"""
+
+import itertools
+from copy import deepcopy
+
+import numpy as np
+
+from ai_economist.foundation.scenarios.covid19.covid19_env import (
+    CovidAndEconomyEnvironment,
+)
+from ai_economist.foundation.vectorized_env_wrapper import stack_across_env_dimension
+
+
+class BatchedCovidAndEconomyEnvironment:
+    """
+    Pure-NumPy CPU backend that simulates N copies of the COVID-19 and economy
+    simulation at once. The global state arrays carry a leading env dimension
+    (num_envs, episode_length + 1, num_us_states), and the SIR, unemployment and
+    economy dynamics, the rewards and the ControlUSStateOpenCloseStatus,
+    FederalGovernmentSubsidy and VaccinationCampaign components are computed for all
+    the environments at once (using the scenario's own model methods).
+
+    The environments are stepped in lockstep: they share the timestep and are all
+    reset together. The observations and rewards match those of N
+    CovidAndEconomyEnvironment copies receiving the same actions, stacked along a
+    leading env dimension (as returned by VectorizedFoundationEnv). Each environment
+    may use different parameter modulations (see set_parameter_modulations).
+    This supports replaying the real-world policies, but not the real-world data, and
+    it only keeps the health and economic indices of the agent and planner states (not
+    the other per-agent states or the (dense) logs).
+
+    Example:
+        batched_env = BatchedCovidAndEconomyEnvironment(env_config, num_envs=8)
+        obs = batched_env.reset()
+        # obs["a"]["world-agent_state"].shape == (8, 6, 51)
+
+        actions = {"a": np.zeros((8, 51), dtype=np.int32), "p": np.zeros(8)}
+        obs, rew, done, info = batched_env.step(actions)
+        # rew["a"].shape == (8, 51), rew["p"].shape == (8,) and done.shape == (8,)
+
+    Args:
+        env_config (dict): Configuration of the CovidAndEconomyEnvironment (the
+            "scenario_name" key, if present, is ignored).
+        num_envs (int): The number of environments to simulate.
+        auto_reset (bool): Whether to automatically reset the environments at the end
+            of the episode. If True, the observations returned by step() at the end
+            of the episode are the observations after the reset, and the final
+            observations are stored in info[env_id]["terminal_observation"].
+    """
+
+    supported_components = [
+        "ControlUSStateOpenCloseStatus",
+        "FederalGovernmentSubsidy",
+        "VaccinationCampaign",
+    ]
+
+    def __init__(self, env_config, num_envs=1, auto_reset=True):
+        assert isinstance(env_config, dict)
+        env_kwargs = deepcopy(env_config)
+        scenario_name = env_kwargs.pop("scenario_name", CovidAndEconomyEnvironment.name)
+        assert scenario_name == CovidAndEconomyEnvironment.name
+
+        # The environment used for the model constants, fitted parameters and
+        # initial conditions
+        self.env = CovidAndEconomyEnvironment(**env_kwargs)
+        assert not self.env.use_real_world_data, (
+            "The batched environment does not support the real-world data; "
+            "please set 'use_real_world_data' to False."
+        )
+        assert (
+            not self.env._flatten_observations and self.env._flatten_masks
+        ), "The batched environment requires flattened masks and unflattened obs."
+        for component in self.env.components:
+            if component.name not in self.supported_components:
+                raise NotImplementedError(
+                    "The batched environment does not support the {} "
+                    "component.".format(component.name)
+                )
+
+        self.n_envs = int(num_envs)
+        assert self.n_envs >= 1
+        self.n_agents = self.env.n_agents
+        self.episode_length = self.env.episode_length
+        self.auto_reset = bool(auto_reset)
+        self.name = self.env.name
+
+        self.timestep = 0
+        # Global state arrays, with a leading env dimension (see reset)
+        self.global_state = {}
+        # Per-env component and scenario states (see reset)
+        self.stringency_level_history = None
+        self.stringency_level_history_index = 0
+        self.unemployment_filter_responses = None
+        self.action_in_cooldown_until = None
+        self.current_subsidy_level = None
+        self.total_subsidy = None
+        self.vaccines_available = None
+        # Per-env parameter modulations (see set_parameter_modulations)
+        self.beta_intercepts_modulation = None
+        self.beta_slopes_modulation = None
+        self.unemployment_modulation = None
+        # Health and economic indices of the agents and the planner, as
+        # {"a": (num_envs, n_agents) array, "p": (num_envs,) array}
+        self.health_index = None
+        self.economic_index = None
+
+        # The subsidy levels of the real-world policies (see
+        # FederalGovernmentSubsidy.component_step)
+        self._real_world_subsidy_levels = None
+        if (
+            self.env.use_real_world_policies
+            and "FederalGovernmentSubsidy" in self.env._components_dict
+        ):
+            self._real_world_subsidy_levels = self._get_real_world_subsidy_levels(
+                self.env.get_component("FederalGovernmentSubsidy")
+            )
+
+    def _get_real_world_subsidy_levels(self, component):
+        """The subsidy level at each timestep, when replaying the real-world
+        subsidies."""
+        subsidy_amount_per_level = (
+            self.env.world.us_population
+            * component.max_annual_subsidy_per_person
+            / component.num_subsidy_levels
+            * component.subsidy_interval
+            / 365
+        )
+        subsidy_levels = np.zeros(self.episode_length + 1)
+        for t_idx in range(self.episode_length):
+            current_subsidy_amount = self.env.world.real_world_subsidy[t_idx].item()
+            if current_subsidy_amount > 0:
+                subsidy_levels[t_idx : t_idx + component.subsidy_interval] += np.round(
+                    current_subsidy_amount / subsidy_amount_per_level
+                )
+        return subsidy_levels
+
+    def _tile(self, x):
+        """Repeat x along a new leading env dimension."""
+        x = np.asarray(x)
+        return np.tile(x, (self.n_envs,) + (1,) * x.ndim)
+
+    def reset(self):
+        """
+        Reset all the environments to initialize a new episode.
+
+        Returns:
+            obs (dict): The stacked observations of all the environments.
+        """
+        # All the environments start from the same state: the reset state of the
+        # single environment
+        obs = self.env.reset()
+        self.timestep = 0
+        self.global_state = {
+            k: self._tile(v) for k, v in self.env.world.global_state.items()
+        }
+        self.stringency_level_history = self._tile(self.env.stringency_level_history)
+        self.stringency_level_history_index = self.env.stringency_level_history_index
+        if self.env.use_recursive_unemployment_filter:
+            self.unemployment_filter_responses = self._tile(
+                self.env.unemployment_filter_responses
+            )
+        if "ControlUSStateOpenCloseStatus" in self.env._components_dict:
+            self.action_in_cooldown_until = self._tile(
+                self.env.get_component(
+                    "ControlUSStateOpenCloseStatus"
+                ).action_in_cooldown_until
+            )
+        planner_state = self.env.world.planner.state
+        self.current_subsidy_level = self._tile(
+            planner_state.get("Current Subsidy Level", 0)
+        ).astype(self.env.np_int_dtype)
+        self.total_subsidy = self._tile(planner_state.get("Total Subsidy", 0.0))
+        self.vaccines_available = np.zeros(
+            (self.n_envs, self.n_agents), dtype=self.env.np_int_dtype
+        )
+        self.health_index = {
+            "a": np.zeros((self.n_envs, self.n_agents), dtype=self.env.np_float_dtype),
+            "p": np.zeros(self.n_envs, dtype=self.env.np_float_dtype),
+        }
+        self.economic_index = deepcopy(self.health_index)
+
+        # Reset any manually set parameter modulations
+        # (The beta modulations scale float32 parameters, and the unemployment
+        # modulation float64 filter responses, as in the single environment)
+        self.beta_intercepts_modulation = np.ones(
+            self.n_envs, dtype=self.env.np_float_dtype
+        )
+        self.beta_slopes_modulation = np.ones(
+            self.n_envs, dtype=self.env.np_float_dtype
+        )
+        self.unemployment_modulation = np.ones(self.n_envs)
+        return stack_across_env_dimension([obs] * self.n_envs)
+
+    def set_parameter_modulations(
+        self, beta_intercept=None, beta_slope=None, unemployment=None
+    ):
+        """
+        Apply parameter modulations, which will be in effect until the next reset
+        (see CovidAndEconomyEnvironment.set_parameter_modulations).
+
+        Args:
+             beta_intercept: (float or array of shape (num_envs,), >= 0) Modulation
+             applied to the intercept term of the beta model, in each environment.
+             beta_slope: (float or array of shape (num_envs,), >= 0) Modulation
+             applied to the slope term of the beta model, in each environment.
+             unemployment: (float or array of shape (num_envs,), >= 0) Modulation
+             applied to the weighted sum of unemployment filter responses, in each
+             environment.
+        """
+        assert self.global_state, "Please reset the environments first."
+        if beta_intercept is not None:
+            self.beta_intercepts_modulation = self._get_modulation(
+                beta_intercept, self.env.np_float_dtype
+            )
+        if beta_slope is not None:
+            self.beta_slopes_modulation = self._get_modulation(
+                beta_slope, self.env.np_float_dtype
+            )
+        if unemployment is not None:
+            self.unemployment_modulation = self._get_modulation(
+                unemployment, np.float64
+            )
+
+    def _get_modulation(self, modulation, dtype):
+        modulation = np.asarray(modulation, dtype=np.float64)
+        if modulation.ndim == 0:
+            modulation = np.full(self.n_envs, modulation)
+        assert modulation.shape == (self.n_envs,)
+        assert np.all(modulation >= 0)
+        return modulation.astype(dtype)
+
+    # Components
+    # ----------
+
+    def _open_close_status_step(self, component, actions):
+        if component.n_stringency_levels != self.env.world.n_stringency_levels:
+            raise ValueError(
+                "The environment was not configured correctly. For the given "
+                "model fit, you need to set the number of stringency levels to "
+                "be {}".format(self.env.world.n_stringency_levels)
+            )
+        actions = np.asarray(actions, dtype=self.env.np_int_dtype)
+        assert actions.shape == (self.n_envs, self.n_agents)
+        assert np.all((0 <= actions) & (actions <= component.n_stringency_levels))
+
+        # We only update the stringency level if the action is not a NO-OP.
+        stringency_level = self.global_state["Stringency Level"]
+        stringency_level[:, self.timestep] = (
+            stringency_level[:, self.timestep - 1] * (actions == 0) + actions
+        )
+
+        # Set the next time until action cooldown (see
+        # ControlUSStateOpenCloseStatus.component_step)
+        cooldown_ended = self.timestep == self.action_in_cooldown_until + 1
+        self.action_in_cooldown_until[cooldown_ended] += np.where(
+            actions[cooldown_ended] == 0,  # NO-OP
+            1,
+            component.action_cooldown_period,
+        )
+
+    def _subsidy_step(self, component, actions):
+        if self._real_world_subsidy_levels is not None:
+            subsidy_level = np.full(
+                self.n_envs, self._real_world_subsidy_levels[self.timestep - 1]
+            )
+        # Update the subsidy level only every subsidy_interval, since the other
+        # actions are masked out.
+        elif (self.timestep - 1) % component.subsidy_interval == 0:
+            subsidy_level = np.asarray(actions, dtype=self.env.np_int_dtype)
+            assert subsidy_level.shape == (self.n_envs,)
+        else:
+            subsidy_level = self.current_subsidy_level
+        assert np.all(
+            (0 <= subsidy_level) & (subsidy_level <= component.num_subsidy_levels)
+        )
+        self.current_subsidy_level = subsidy_level.astype(self.env.np_int_dtype)
+
+        subsidy_level_frac = subsidy_level / component.num_subsidy_levels
+        daily_statewise_subsidy = (
+            subsidy_level_frac[:, None] * component.max_daily_subsidy_per_state
+        )
+        self.global_state["Subsidy"][:, self.timestep] = daily_statewise_subsidy
+        self.total_subsidy = self.total_subsidy + np.sum(
+            daily_statewise_subsidy, axis=-1
+        )
+
+    def _vaccination_step(self, component):
+        if self.timestep < component.time_when_vaccine_delivery_begins:
+            return
+        if (self.timestep % component.delivery_interval) != 0:
+            return
+        self.vaccines_available += component.num_vaccines_per_delivery
+
+    # Scenario
+    # --------
+
+    def _scenario_step(self):
+        env = self.env
+        prev_t = self.timestep - 1
+        curr_t = self.timestep
+
+        # SIR
+        # ---
+        if curr_t - env.beta_delay < 0:
+            if env.start_date_index + curr_t - env.beta_delay < 0:
+                stringency_level_tmk = np.ones(env.num_us_states)
+            else:
+                stringency_level_tmk = env._real_world_data["policy"][
+                    env.start_date_index + curr_t - env.beta_delay, :
+                ]
+        else:
+            stringency_level_tmk = self.global_state["Stringency Level"][
+                :, curr_t - env.beta_delay
+            ]
+        stringency_level_tmk = stringency_level_tmk.astype(env.np_int_dtype)
+
+        _S_tm1 = self.global_state["Susceptible"][:, prev_t]
+        _I_tm1 = self.global_state["Infected"][:, prev_t]
+        _R_tm1 = self.global_state["Recovered"][:, prev_t]
+        _V_tm1 = self.global_state["Vaccinated"][:, prev_t]
+
+        # Agents always use whatever vaccines they can
+        num_vaccines_available_t = self.vaccines_available
+        self.vaccines_available = np.zeros_like(num_vaccines_available_t)
+
+        _dS, _dI, _dR, _dV = env.sir_step(
+            _S_tm1,
+            _I_tm1,
+            stringency_level_tmk,
+            num_vaccines_available_t,
+            record_r0=False,
+            beta_intercepts_modulation=self.beta_intercepts_modulation,
+            beta_slopes_modulation=self.beta_slopes_modulation,
+        )
+        _S_t = np.maximum(_S_tm1 + _dS, 0)
+        _I_t = np.maximum(_I_tm1 + _dI, 0)
+        _R_t = np.maximum(_R_tm1 + _dR, 0)
+        _V_t = np.maximum(_V_tm1 + _dV, 0)
+
+        num_recovered_but_not_vaccinated_t = _R_t - _V_t
+        _D_t = env.death_rate * num_recovered_but_not_vaccinated_t
+
+        self.global_state["Susceptible"][:, curr_t] = _S_t
+        self.global_state["Infected"][:, curr_t] = _I_t
+        self.global_state["Recovered"][:, curr_t] = _R_t
+        self.global_state["Deaths"][:, curr_t] = _D_t
+        self.global_state["Vaccinated"][:, curr_t] = _V_t
+
+        # Unemployment
+        # ------------
+        history = self.stringency_level_history
+        if env.use_recursive_unemployment_filter:
+            self.unemployment_filter_responses = (
+                env.update_unemployment_filter_responses(
+                    self.unemployment_filter_responses,
+                    history,
+                    self.stringency_level_history_index,
+                    self.global_state["Stringency Level"][:, curr_t],
+                )
+            )
+            self.stringency_level_history_index = (
+                self.stringency_level_history_index + 1
+            ) % history.shape[1]
+            num_unemployed_t = env.get_unemployment_from_filter_responses(
+                self.unemployment_filter_responses, self.unemployment_modulation
+            )
+        else:
+            history[:, :-1] = history[:, 1:]
+            history[:, -1] = self.global_state["Stringency Level"][:, curr_t]
+            num_unemployed_t = env.get_unemployment_from_stringency_changes(
+                history[:, 1:] - history[:, :-1], self.unemployment_modulation
+            )
+        self.global_state["Unemployed"][:, curr_t] = num_unemployed_t
+
+        # Productivity
+        # ------------
+        productivity_t = env.economy_step(
+            env.us_state_population,
+            infected=_I_t,
+            deaths=_D_t,
+            unemployed=num_unemployed_t,
+            infection_too_sick_to_work_rate=env.infection_too_sick_to_work_rate,
+            population_between_age_18_65=env.pop_between_age_18_65,
+        )
+
+        # Subsidies
+        # ---------
+        daily_statewise_subsidy_t = self.global_state["Subsidy"][:, curr_t]
+        self.global_state["Postsubsidy Productivity"][:, curr_t] = (
+            productivity_t + daily_statewise_subsidy_t
+        )
+
+    # Observations and rewards
+    # ------------------------
+
+    def _generate_observations(self):
+        env = self.env
+        t = self.timestep
+        n_envs, n_agents = self.n_envs, self.n_agents
+        time_scale = env.episode_length if env._allow_observation_scaling else 1.0
+
+        scenario_obs = env.get_observations_from_global_state(self.global_state, t)
+        obs = {
+            "a": {
+                "world-agent_index": self._tile(
+                    np.eye(n_agents, dtype=env.np_int_dtype)
+                ),
+                **{"world-" + k: v for k, v in scenario_obs["a"].items()},
+                "time": np.full((n_envs, n_agents), t / time_scale),
+            },
+            "p": {
+                **{"world-" + k: v for k, v in scenario_obs["p"].items()},
+                "time": np.full((n_envs, 1), t / time_scale),
+            },
+        }
+        masks = {
+            "a": [np.ones((n_envs, 1, n_agents))],
+            "p": [np.ones((n_envs, 1))],
+        }
+
+        for component in env.components:
+            prefix = component.name + "-"
+            if component.name == "ControlUSStateOpenCloseStatus":
+                agent_policy_indicators = (
+                    self.global_state["Stringency Level"][:, t]
+                    / component.n_stringency_levels
+                )
+                obs["a"][prefix + "agent_policy_indicators"] = agent_policy_indicators
+                obs["p"][prefix + "agent_policy_indicators"] = agent_policy_indicators
+
+                if env.use_real_world_policies:
+                    in_cooldown = np.zeros((n_envs, n_agents), dtype=bool)
+                else:
+                    in_cooldown = t < self.action_in_cooldown_until
+                masks["a"].append(
+                    np.where(
+                        in_cooldown[:, None],
+                        np.array(component.no_op_agent_action_mask)[:, None],
+                        np.array(component.default_agent_action_mask)[:, None],
+                    )
+                )
+
+            elif component.name == "FederalGovernmentSubsidy":
+                t_until_next_subsidy = component.subsidy_interval - (
+                    t % component.subsidy_interval
+                )
+                obs["a"][prefix + "t_until_next_subsidy"] = np.full(
+                    (n_envs, n_agents),
+                    t_until_next_subsidy / component.subsidy_interval,
+                )
+                obs["a"][prefix + "current_subsidy_level"] = np.repeat(
+                    self.current_subsidy_level[:, None] / component.num_subsidy_levels,
+                    n_agents,
+                    axis=-1,
+                )
+                obs["p"][prefix + "t_until_next_subsidy"] = np.full(
+                    n_envs, t_until_next_subsidy / component.subsidy_interval
+                )
+                obs["p"][prefix + "current_subsidy_level"] = (
+                    self.current_subsidy_level / component.num_subsidy_levels
+                )
+
+                if env.use_real_world_policies or t % component.subsidy_interval == 0:
+                    planner_mask = component.default_planner_action_mask
+                else:
+                    planner_mask = component.no_op_planner_action_mask
+                masks["p"].append(self._tile(planner_mask))
+
+            elif component.name == "VaccinationCampaign":
+                # (See VaccinationCampaign.generate_observations)
+                t_first_delivery = int(component.time_when_vaccine_delivery_begins)
+                while (t_first_delivery % component.delivery_interval) != 0:
+                    t_first_delivery += 1
+                next_t = t + 1
+                if next_t <= t_first_delivery:
+                    t_until_next_vac = np.minimum(
+                        1, (t_first_delivery - next_t) / component.delivery_interval
+                    )
+                    next_vax_rate = 0.0
+                else:
+                    t_until_next_vac = component.delivery_interval - (
+                        next_t % component.delivery_interval
+                    )
+                    next_vax_rate = component.daily_vaccines_per_million_people / 1e6
+
+                obs["a"][prefix + "t_until_next_vaccines"] = np.full(
+                    (n_envs, n_agents), t_until_next_vac / component.delivery_interval
+                )
+                obs["p"][prefix + "t_until_next_vaccines"] = np.full(
+                    n_envs, t_until_next_vac / component.delivery_interval
+                )
+                if component.observe_rate:
+                    obs["a"][prefix + "next_vaccination_rate"] = np.full(
+                        (n_envs, n_agents), next_vax_rate
+                    )
+                    obs["p"][prefix + "next_vaccination_rate"] = np.full(
+                        n_envs, next_vax_rate
+                    )
+
+        obs["a"]["action_mask"] = np.concatenate(masks["a"], axis=1).astype(np.float32)
+        obs["p"]["action_mask"] = np.concatenate(masks["p"], axis=1).astype(np.float32)
+        return obs
+
+    def _generate_rewards(self):
+        (
+            marginal_agent_health_index,
+            marginal_agent_economic_index,
+            marginal_planner_health_index,
+            marginal_planner_economic_index,
+        ) = self.env.get_marginal_indices(
+            self.global_state["Deaths"][:, self.timestep]
+            - self.global_state["Deaths"][:, self.timestep - 1],
+            self.global_state["Subsidy"][:, self.timestep],
+            self.global_state["Postsubsidy Productivity"][:, self.timestep],
+        )
+        agent_rewards, planner_rewards = self.env.get_rewards_from_marginal_indices(
+            marginal_agent_health_index,
+            marginal_agent_economic_index,
+            marginal_planner_health_index,
+            marginal_planner_economic_index,
+        )
+
+        # Update the health and economic indices (see
+        # CovidAndEconomyEnvironment.compute_reward)
+        self.health_index["a"] += marginal_agent_health_index
+        self.economic_index["a"] += marginal_agent_economic_index
+        self.health_index["p"] += marginal_planner_health_index
+        self.economic_index["p"] += marginal_planner_economic_index
+
+        return {"a": agent_rewards, "p": planner_rewards}
+
+    def _step_dynamics(self, agent_actions, planner_actions):
+        """Step the components and the scenario, and return the rewards."""
+        self.timestep += 1
+
+        if self.env.use_real_world_policies:
+            # Use the actions taken in the previous timestep
+            agent_actions = self._tile(
+                self.env.world.real_world_stringency_policy[self.timestep - 1]
+            )
+
+        for component in self.env.components:
+            if component.name == "ControlUSStateOpenCloseStatus":
+                self._open_close_status_step(component, agent_actions)
+            elif component.name == "FederalGovernmentSubsidy":
+                self._subsidy_step(component, planner_actions)
+            elif component.name == "VaccinationCampaign":
+                self._vaccination_step(component)
+
+        self._scenario_step()
+
+        return self._generate_rewards()
+
+    def step(self, actions=None):
+        """
+        Step through all the environments.
+
+        Args:
+            actions (dict): A dictionary with the agent actions "a", an array of shape
+                (num_envs, n_agents), and the planner actions "p", an array of shape
+                (num_envs,). Missing actions are NO-OPs. The actions are ignored when
+                using the real-world policies.
+
+        Returns:
+            obs (dict): The stacked observations of all the environments.
+            rew (dict): The agent rewards "a", of shape (num_envs, n_agents), and the
+                planner rewards "p", of shape (num_envs,).
+            done (np.ndarray): Boolean array of shape (num_envs,).
+            info (list): The info dictionaries of each of the environments.
+        """
+        assert self.global_state, "Please reset the environments first."
+        if actions is None:
+            actions = {}
+        assert isinstance(actions, dict)
+        agent_actions = actions.get(
+            "a", np.zeros((self.n_envs, self.n_agents), dtype=self.env.np_int_dtype)
+        )
+        planner_actions = actions.get(
+            "p", np.zeros(self.n_envs, dtype=self.env.np_int_dtype)
+        )
+
+        rew = self._step_dynamics(agent_actions, planner_actions)
+        obs = self._generate_observations()
+        done = np.full(self.n_envs, self.timestep >= self.episode_length)
+        info = [{"a": {}, "p": {}} for _ in range(self.n_envs)]
+
+        if self.auto_reset and done.all():
+            for env_id in range(self.n_envs):
+                info[env_id]["terminal_observation"] = deepcopy(
+                    {
+                        idx: {k: v[env_id] for k, v in o.items()}
+                        for idx, o in obs.items()
+                    }
+                )
+            obs = self.reset()
+
+        return obs, rew, done, info
+
+
+def run_parameter_sweep(
+    env_config,
+    beta_intercept=(1.0,),
+    beta_slope=(1.0,),
+    unemployment=(1.0,),
+    agent_actions=None,
+    planner_actions=None,
+    max_num_envs=128,
+):
+    """
+    Simulate an episode for each setting in a grid of parameter modulations (see
+    CovidAndEconomyEnvironment.set_parameter_modulations), under fixed policy
+    schedules, in batched simulations (with one environment per setting).
+
+    Example:
+        # Replay the real-world policies with a 3 x 3 grid of beta modulations
+        results = run_parameter_sweep(
+            dict(env_config, use_real_world_policies=True),
+            beta_intercept=[0.9, 1.0, 1.1],
+            beta_slope=[0.9, 1.0, 1.1],
+        )
+        # results["planner_reward"].shape == (9,)
+
+    Args:
+        env_config (dict): Configuration of the CovidAndEconomyEnvironment. Set
+            "use_real_world_policies" to True to replay the real-world policies.
+            Setting "use_recursive_unemployment_filter" to True is recommended for
+            large sweeps: with it, the memory use of each setting does not grow
+            with filter_len.
+        beta_intercept (float or list): The beta intercept modulations to sweep.
+        beta_slope (float or list): The beta slope modulations to sweep.
+        unemployment (float or list): The unemployment modulations to sweep.
+            The settings are all the combinations of the above modulations.
+        agent_actions (np.ndarray): The agent actions (stringency levels, or 0 for
+            NO-OPs) at each timestep, of shape (episode_length, n_agents), or of shape
+            (num_settings, episode_length, n_agents) for a schedule per setting.
+            Defaults to NO-OPs. Ignored when using the real-world policies.
+        planner_actions (np.ndarray): The planner actions (subsidy levels) at each
+            timestep, of shape (episode_length,), or of shape
+            (num_settings, episode_length). Defaults to NO-OPs. Ignored when using the
+            real-world policies.
+        max_num_envs (int): The maximum number of settings simulated at once (the
+            memory use of each batched simulation grows with it, as the global state
+            of the whole episode is kept).
+
+    Returns:
+        results (dict): The results of each setting (in the rows of the arrays):
+            "beta_intercept", "beta_slope", "unemployment": The modulations, of shape
+                (num_settings,).
+            "agent_health_index", "agent_economic_index": The health and economic
+                indices of the agents at the end of the episode, of shape
+                (num_settings, n_agents).
+            "planner_health_index", "planner_economic_index": The health and economic
+                indices of the planner at the end of the episode, of shape
+                (num_settings,).
+            "agent_reward", "planner_reward": The episode rewards of the agents and
+                the planner, of shape (num_settings, n_agents) and (num_settings,).
+    """
+    settings = np.array(
+        list(
+            itertools.product(
+                np.atleast_1d(beta_intercept),
+                np.atleast_1d(beta_slope),
+                np.atleast_1d(unemployment),
+            )
+        ),
+        dtype=np.float64,
+    )
+    num_settings = len(settings)
+    episode_length = env_config["episode_length"]
+    n_agents = env_config["n_agents"]
+
+    if agent_actions is None:
+        agent_actions = np.zeros((episode_length, n_agents), dtype=np.int32)
+    agent_actions = np.asarray(agent_actions)
+    if agent_actions.ndim == 2:
+        agent_actions = np.broadcast_to(
+            agent_actions, (num_settings,) + agent_actions.shape
+        )
+    assert agent_actions.shape == (num_settings, episode_length, n_agents)
+
+    if planner_actions is None:
+        planner_actions = np.zeros(episode_length, dtype=np.int32)
+    planner_actions = np.asarray(planner_actions)
+    if planner_actions.ndim == 1:
+        planner_actions = np.broadcast_to(
+            planner_actions, (num_settings,) + planner_actions.shape
+        )
+    assert planner_actions.shape == (num_settings, episode_length)
+
+    results = {
+        "agent_health_index": [],
+        "agent_economic_index": [],
+        "planner_health_index": [],
+        "planner_economic_index": [],
+        "agent_reward": [],
+        "planner_reward": [],
+    }
+    batched_env = None
+    for start in range(0, num_settings, max_num_envs):
+        batch = slice(start, min(start + max_num_envs, num_settings))
+        num_envs = batch.stop - batch.start
+        if batched_env is None or batched_env.n_envs != num_envs:
+            batched_env = BatchedCovidAndEconomyEnvironment(
+                env_config, num_envs=num_envs, auto_reset=False
+            )
+        batched_env.reset()
+        batched_env.set_parameter_modulations(
+            beta_intercept=settings[batch, 0],
+            beta_slope=settings[batch, 1],
+            unemployment=settings[batch, 2],
+        )
+
+        # The observations are not needed, so only the dynamics are stepped through
+        agent_reward = np.zeros((num_envs, n_agents))
+        planner_reward = np.zeros(num_envs)
+        for t in range(episode_length):
+            rew = batched_env._step_dynamics(
+                agent_actions[batch, t], planner_actions[batch, t]
+            )
+            agent_reward += rew["a"]
+            planner_reward += rew["p"]
+
+        results["agent_health_index"].append(batched_env.health_index["a"])
+        results["agent_economic_index"].append(batched_env.economic_index["a"])
+        results["planner_health_index"].append(batched_env.health_index["p"])
+        results["planner_economic_index"].append(batched_env.economic_index["p"])
+        results["agent_reward"].append(agent_reward)
+        results["planner_reward"].append(planner_reward)
+
+    return {
+        "beta_intercept": settings[:, 0],
+        "beta_slope": settings[:, 1],
+        "unemployment": settings[:, 2],
+        **{k: np.concatenate(v) for k, v in results.items()},
+    }
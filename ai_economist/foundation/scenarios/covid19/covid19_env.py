@@ -6,6 +6,8 @@
 
 import json
 import os
+import struct
+import zipfile
 from datetime import datetime, timedelta
 
 import GPUtil
@@ -35,6 +37,122 @@ except ModuleNotFoundError:
 except ValueError:
     print("No GPUs found! Running the simulation on a CPU.")
 
+# Real-world data, model constants and fitted parameters, as
+# {path_to_data_and_fitted_params: (real_world_data, model_constants, fitted_params)}
+# (see load_data_and_fitted_params)
+_data_and_fitted_params = {}
+
+
+def _load_npz_read_only(path_to_npz):
+    """Load the arrays in an .npz file as {key: read-only array}.
+
+    Arrays stored without compression (as np.savez does) are memory-mapped in place,
+    so that their pages are only read in when used, and are shared by all the
+    processes using the same file. Compressed arrays are read into memory.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path_to_npz) as npz, open(path_to_npz, "rb") as fp:
+        for info in npz.infolist():
+            key = info.filename[: -len(".npy")]
+            array = None
+            if info.compress_type == zipfile.ZIP_STORED:
+                # Skip the zip local file header to get to the .npy file
+                fp.seek(info.header_offset)
+                local_file_header = fp.read(30)
+                filename_len, extra_field_len = struct.unpack(
+                    "<HH", local_file_header[26:30]
+                )
+                fp.seek(info.header_offset + 30 + filename_len + extra_field_len)
+                version = np.lib.format.read_magic(fp)
+                if version in [(1, 0), (2, 0)]:
+                    if version == (1, 0):
+                        header = np.lib.format.read_array_header_1_0(fp)
+                    else:
+                        header = np.lib.format.read_array_header_2_0(fp)
+                    shape, fortran_order, dtype = header
+                    if not dtype.hasobject:
+                        array = np.memmap(
+                            path_to_npz,
+                            dtype=dtype,
+                            mode="r",
+                            offset=fp.tell(),
+                            shape=shape,
+                            order="F" if fortran_order else "C",
+                        ).view(np.ndarray)
+            if array is None:
+                with npz.open(info) as npy:
+                    array = np.lib.format.read_array(npy)
+                array.flags.writeable = False
+            arrays[key] = array
+    return arrays
+
+
+def load_data_and_fitted_params(path_to_data_and_fitted_params=""):
+    """Load the real-world data, model constants and fitted parameters.
+
+    These are loaded once per process (and data directory), and shared by all the
+    environment instances. The real-world data arrays are read-only, and
+    memory-mapped from "real_world_data.npz" where possible.
+
+    Args:
+        path_to_data_and_fitted_params (dirpath): Full path to the directory
+            containing "real_world_data.npz", "model_constants.json" and
+            "fitted_params.json". Defaults to the covid19 dataset shipped with the
+            package.
+
+    Returns:
+        real_world_data (dict): The (read-only) real-world data arrays, as
+            {key: array}.
+        model_constants (dict): The model constants, as parsed from
+            "model_constants.json".
+        fitted_params (dict): The fitted parameters, as parsed from
+            "fitted_params.json".
+    """
+    if path_to_data_and_fitted_params == "":
+        current_dir = os.path.dirname(__file__)
+        path_to_data_and_fitted_params = os.path.join(
+            current_dir, "../../../datasets/covid19_datasets/data_and_fitted_params"
+        )
+    path_to_data_and_fitted_params = os.path.abspath(path_to_data_and_fitted_params)
+
+    if path_to_data_and_fitted_params not in _data_and_fitted_params:
+        # Load real-world data
+        print("Loading real-world data from {}".format(path_to_data_and_fitted_params))
+        real_world_data = _load_npz_read_only(
+            os.path.join(path_to_data_and_fitted_params, "real_world_data.npz")
+        )
+
+        # Load model constants and fitted parameters
+        print("Loading fit parameters from {}".format(path_to_data_and_fitted_params))
+        filename = "model_constants.json"
+        assert filename in os.listdir(path_to_data_and_fitted_params), (
+            "Unable to locate '{}' in '{}'.\nPlease run the "
+            "'gather_real_world_data.ipynb' notebook first".format(
+                filename, path_to_data_and_fitted_params
+            )
+        )
+        with open(os.path.join(path_to_data_and_fitted_params, filename), "r") as fp:
+            model_constants = json.load(fp)
+
+        filename = "fitted_params.json"
+        assert filename in os.listdir(path_to_data_and_fitted_params), (
+            "Unable to locate '{}' in '{}'.\nIf you ran the "
+            "'gather_real_world_data.ipynb' notebook to download the latest "
+            "real-world data, please also run the "
+            "'fit_parameters.ipynb' notebook.".format(
+                filename, path_to_data_and_fitted_params
+            )
+        )
+        with open(os.path.join(path_to_data_and_fitted_params, filename), "r") as fp:
+            fitted_params = json.load(fp)
+
+        _data_and_fitted_params[path_to_data_and_fitted_params] = (
+            real_world_data,
+            model_constants,
+            fitted_params,
+        )
+    return _data_and_fitted_params[path_to_data_and_fitted_params]
+
 
 @scenario_registry.add
 class CovidAndEconomyEnvironment(BaseEnvironment):
@@ -93,6 +211,11 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         health_priority_scaling_planner (float): same as above,
             but for the federal government.
             Range: 0 <= health_priority_scaling_planner
+        use_recursive_unemployment_filter (bool): Compute the unemployment filter
+            responses recursively (updating them with the latest stringency change
+            at each timestep) instead of convolving the filters with the full
+            stringency history. This is much faster for long filters, and matches the
+            convolution up to floating point rounding. (Only used on the CPU.)
     """
 
     def __init__(
@@ -109,6 +232,7 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         health_priority_scaling_agents=1,
         health_priority_scaling_planner=1,
         reward_normalization_factor=1,
+        use_recursive_unemployment_filter=False,
         **base_env_kwargs,
     ):
         verify_activation_code()
@@ -139,7 +263,8 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
                 "and using the fitted models to step through the env."
             )
 
-        # Load real-world date
+        # Load real-world data and fitted parameters (shared by all the environment
+        # instances in this process)
         if path_to_data_and_fitted_params == "":
             current_dir = os.path.dirname(__file__)
             self.path_to_data_and_fitted_params = os.path.join(
@@ -147,25 +272,13 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             )
         else:
             self.path_to_data_and_fitted_params = path_to_data_and_fitted_params
-
-        print(
-            "Loading real-world data from {}".format(
-                self.path_to_data_and_fitted_params
-            )
-        )
-        real_world_data_npz = np.load(
-            os.path.join(self.path_to_data_and_fitted_params, "real_world_data.npz")
-        )
-        self._real_world_data = {}
-        for key in list(real_world_data_npz):
-            self._real_world_data[key] = real_world_data_npz[key]
-
-        # Load fitted parameters
-        print(
-            "Loading fit parameters from {}".format(self.path_to_data_and_fitted_params)
-        )
-        self.load_model_constants(self.path_to_data_and_fitted_params)
-        self.load_fitted_params(self.path_to_data_and_fitted_params)
+        (
+            self._real_world_data,
+            model_constants_dict,
+            fitted_params_dict,
+        ) = load_data_and_fitted_params(self.path_to_data_and_fitted_params)
+        self.load_model_constants(model_constants_dict)
+        self.load_fitted_params(fitted_params_dict)
 
         try:
             self.start_date = datetime.strptime(start_date, self.date_format)
@@ -212,8 +325,42 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         assert base_env_kwargs[
             "collate_agent_step_and_reset_data"
         ], "The env. config 'collate_agent_step_and_reset_data' should be set to True."
+        # The per-state fields are always kept in the agent state table (built below,
+        # once they have been added to the agent states)
+        base_env_kwargs.pop("use_agent_state_table", None)
         super().__init__(*base_env_args, **base_env_kwargs)
 
+        # Per-state fields of the agent states. These are stored as columns of the
+        # agent state table (with the dtypes of the values below), so that on the
+        # CPU, the scenario and components update all the US states at once.
+        for agent in self.world.agents:
+            for field in [
+                "Total Susceptible",
+                "New Infections",
+                "Total Infected",
+                "Total Recovered",
+                "Total Deaths",
+                "Total Vaccinated",
+                "Vaccines Available",
+                "Total Unemployed",
+            ]:
+                agent.state[field] = self.np_int_dtype(0)
+            for field in [
+                "New Subsidy Received",
+                "Postsubsidy Productivity",
+                "Current Open Close Stringency Level",
+            ]:
+                agent.state[field] = self.np_float_dtype(0)
+            if not self.use_real_world_data:
+                # (Recorded by sir_step)
+                agent.state["R0"] = self.np_float_dtype(0)
+            # (The new deaths are not rounded in scenario_step)
+            agent.state["New Deaths"] = 0.0
+            agent.state["Health Index"] = np.zeros(1, dtype=self.np_float_dtype)
+            agent.state["Economic Index"] = np.zeros(1, dtype=self.np_float_dtype)
+            agent.state["Date"] = ""
+        self.world.build_agent_state_table()
+
         # Add attributes to self.world for use in components
         self.world.us_state_population = self.us_state_population
         self.world.us_population = self.us_population
@@ -246,12 +393,29 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         ).astype(self.np_float_dtype)
         self.unemp_conv_filters = np.exp(-self.f_ts / self.conv_lambdas[None, :, None])
         # Each state weights these filters differently.
-        self.repeated_conv_weights = np.repeat(
+        # (A read-only broadcast view, rather than filter_len copies of the weights)
+        self.repeated_conv_weights = np.broadcast_to(
             self.grouped_convolutional_filter_weights.reshape(
                 self.num_us_states, self.num_filters
             )[:, :, np.newaxis],
-            self.filter_len,
-            axis=-1,
+            (self.num_us_states, self.num_filters, self.filter_len),
+        )
+        # With the recursive unemployment filter, the filter responses to the
+        # stringency changes over the last filter_len timesteps are stored (in
+        # self.unemployment_filter_responses) and updated at each timestep: each
+        # response decays by a factor exp(-1 / lambda), the latest stringency change
+        # is added, and the change that drops out of the filter window (which now
+        # has a weight exp(-filter_len / lambda)) is removed.
+        # The stringency level history is then used as a ring buffer, whose oldest
+        # entry is at self.stringency_level_history_index.
+        self.use_recursive_unemployment_filter = bool(use_recursive_unemployment_filter)
+        self.unemployment_filter_responses = None
+        self.stringency_level_history_index = 0
+        conv_lambdas = self.conv_lambdas.astype(np.float64)
+        self.unemp_filter_decays = np.exp(-1 / conv_lambdas)
+        self.unemp_filter_dropped_weights = np.exp(-self.filter_len / conv_lambdas)
+        self.unemp_filter_weights = self.grouped_convolutional_filter_weights.reshape(
+            self.num_us_states, self.num_filters
         )
 
         # For manually modulating SIR/Unemployment parameters
@@ -776,15 +940,19 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
 
                 # Vaccination
                 # -----------
-                num_vaccines_available_t = np.zeros(
-                    self.n_agents, dtype=self.np_int_dtype
+                # "Load" the vaccines in the inventory into this vector.
+                num_vaccines_available_t = self.world.get_agent_state_column(
+                    "Vaccines Available"
+                ).astype(self.np_int_dtype)
+                # Agents always use whatever vaccines they can, so this becomes 0:
+                self.world.set_agent_state_column(
+                    "Total Vaccinated",
+                    self.world.get_agent_state_column("Total Vaccinated")
+                    + num_vaccines_available_t,
+                )
+                self.world.set_agent_state_column(
+                    "Vaccines Available", np.zeros_like(num_vaccines_available_t)
                 )
-                for aidx, agent in enumerate(self.world.agents):
-                    # "Load" the vaccines in the inventory into this vector.
-                    num_vaccines_available_t[aidx] = agent.state["Vaccines Available"]
-                    # Agents always use whatever vaccines they can, so this becomes 0:
-                    agent.state["Total Vaccinated"] += agent.state["Vaccines Available"]
-                    agent.state["Vaccines Available"] = 0
 
                 # SIR step
                 # --------
@@ -850,37 +1018,25 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             current_date_string = datetime.strftime(
                 self.current_date, format=self.date_format
             )
-            for agent in self.world.agents:
-                agent.state["Total Susceptible"] = _S_t[agent.idx].astype(
-                    self.np_int_dtype
-                )
-                agent.state["New Infections"] = (
-                    _I_t[agent.idx] - agent.state["Total Infected"]
-                ).astype(self.np_int_dtype)
-                agent.state["Total Infected"] = _I_t[agent.idx].astype(
-                    self.np_int_dtype
-                )
-                agent.state["Total Recovered"] = _R_t[agent.idx].astype(
-                    self.np_int_dtype
-                )
-                agent.state["New Deaths"] = _D_t[agent.idx] - agent.state[
-                    "Total Deaths"
-                ].astype(self.np_int_dtype)
-                agent.state["Total Deaths"] = _D_t[agent.idx].astype(self.np_int_dtype)
-                agent.state["Total Vaccinated"] = _V_t[agent.idx].astype(
-                    self.np_int_dtype
-                )
-
-                agent.state["Total Unemployed"] = num_unemployed_t[agent.idx].astype(
-                    self.np_int_dtype
-                )
-                agent.state["New Subsidy Received"] = daily_statewise_subsidy_t[
-                    agent.idx
-                ]
-                agent.state["Postsubsidy Productivity"] = postsubsidy_productivity_t[
-                    agent.idx
-                ]
-                agent.state["Date"] = current_date_string
+            # (The new infections and deaths are computed from the previous totals,
+            # so all the values are computed before updating the columns)
+            agent_state_columns = {
+                "Total Susceptible": _S_t.astype(self.np_int_dtype),
+                "New Infections": (
+                    _I_t - self.world.get_agent_state_column("Total Infected")
+                ).astype(self.np_int_dtype),
+                "Total Infected": _I_t.astype(self.np_int_dtype),
+                "Total Recovered": _R_t.astype(self.np_int_dtype),
+                "New Deaths": _D_t - self.world.get_agent_state_column("Total Deaths"),
+                "Total Deaths": _D_t.astype(self.np_int_dtype),
+                "Total Vaccinated": _V_t.astype(self.np_int_dtype),
+                "Total Unemployed": num_unemployed_t.astype(self.np_int_dtype),
+                "New Subsidy Received": daily_statewise_subsidy_t,
+                "Postsubsidy Productivity": postsubsidy_productivity_t,
+                "Date": [current_date_string] * self.n_agents,
+            }
+            for field, values in agent_state_columns.items():
+                self.world.set_agent_state_column(field, values)
 
             # Update planner state
             # --------------------
@@ -922,61 +1078,67 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         - Observations contain only the relevant features for that actor.
         :return: a dictionary of observations for each agent and planner
         """
-        redux_agent_global_state = None
-        for feature in [
-            "Susceptible",
-            "Infected",
-            "Recovered",
-            "Deaths",
-            "Vaccinated",
-            "Unemployed",
-        ]:
-            if redux_agent_global_state is None:
-                redux_agent_global_state = self.world.global_state[feature][
-                    self.world.timestep
+        obs_dict = self.get_observations_from_global_state(
+            self.world.global_state, self.world.timestep
+        )
+
+        # To condition policy on agent id
+        obs_dict["a"] = dict(
+            agent_index=np.eye(self.n_agents, dtype=self.np_int_dtype), **obs_dict["a"]
+        )
+        return obs_dict
+
+    def get_observations_from_global_state(self, global_state, timestep):
+        """
+        Compute the (normalized) scenario observations of the agents and the planner
+        at the given timestep. The global state arrays may have leading dimensions
+        (e.g., an environment dimension, see BatchedCovidAndEconomyEnvironment), in
+        which case the observations have the same leading dimensions.
+        """
+        redux_agent_global_state = np.stack(
+            [
+                global_state[feature][..., timestep, :]
+                for feature in [
+                    "Susceptible",
+                    "Infected",
+                    "Recovered",
+                    "Deaths",
+                    "Vaccinated",
+                    "Unemployed",
                 ]
-            else:
-                redux_agent_global_state = np.vstack(
-                    (
-                        redux_agent_global_state,
-                        self.world.global_state[feature][self.world.timestep],
-                    )
-                )
+            ],
+            axis=-2,
+        )
         normalized_redux_agent_state = (
             redux_agent_global_state / self.us_state_population[None]
         )
 
         # Productivity
-        postsubsidy_productivity_t = self.world.global_state[
-            "Postsubsidy Productivity"
-        ][self.world.timestep]
+        postsubsidy_productivity_t = global_state["Postsubsidy Productivity"][
+            ..., timestep, :
+        ]
         normalized_postsubsidy_productivity_t = (
             postsubsidy_productivity_t / self.maximum_productivity_t
         )
 
         # Let agents know about the policy about to affect SIR infection-rate beta
-        t_beta = self.world.timestep - self.beta_delay + 1
+        t_beta = timestep - self.beta_delay + 1
         if t_beta < 0:
-            lagged_stringency_level = self._real_world_data["policy"][
-                self.start_date_index + t_beta
-            ]
+            lagged_stringency_level = np.broadcast_to(
+                self._real_world_data["policy"][self.start_date_index + t_beta],
+                postsubsidy_productivity_t.shape,
+            )
         else:
-            lagged_stringency_level = self.world.global_state["Stringency Level"][
-                t_beta
-            ]
+            lagged_stringency_level = global_state["Stringency Level"][..., t_beta, :]
 
         normalized_lagged_stringency_level = (
             lagged_stringency_level / self.num_stringency_levels
         )
 
-        # To condition policy on agent id
-        agent_index = np.eye(self.n_agents, dtype=self.np_int_dtype)
-
         # Observation dict - Agents
         # -------------------------
         obs_dict = dict()
         obs_dict["a"] = {
-            "agent_index": agent_index,
             "agent_state": normalized_redux_agent_state,
             "agent_postsubsidy_productivity": normalized_postsubsidy_productivity_t,
             "lagged_stringency_level": normalized_lagged_stringency_level,
@@ -1046,6 +1208,69 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             return {}  # Return empty dict. Reward arrays are updated in-place
         rew = {"a": 0, "p": 0}
 
+        # Changes this last timestep:
+        marginal_deaths = (
+            self.world.global_state["Deaths"][self.world.timestep]
+            - self.world.global_state["Deaths"][self.world.timestep - 1]
+        )
+        (
+            marginal_agent_health_index,
+            marginal_agent_economic_index,
+            marginal_planner_health_index,
+            marginal_planner_economic_index,
+        ) = self.get_marginal_indices(
+            marginal_deaths,
+            self.world.global_state["Subsidy"][self.world.timestep],
+            self.world.global_state["Postsubsidy Productivity"][self.world.timestep],
+        )
+        agent_rewards, planner_rewards = self.get_rewards_from_marginal_indices(
+            marginal_agent_health_index,
+            marginal_agent_economic_index,
+            marginal_planner_health_index,
+            marginal_planner_economic_index,
+        )
+
+        # Agent Rewards
+        # -------------
+        rew["a"] = agent_rewards
+
+        # Update agent states
+        # -------------------
+        self.world.set_agent_state_column(
+            "Health Index",
+            self.world.get_agent_state_column("Health Index")
+            + marginal_agent_health_index[:, None],
+        )
+        self.world.set_agent_state_column(
+            "Economic Index",
+            self.world.get_agent_state_column("Economic Index")
+            + marginal_agent_economic_index[:, None],
+        )
+
+        # Update planner states
+        # -------------------
+        self.world.planner.state["Health Index"] += marginal_planner_health_index
+        self.world.planner.state["Economic Index"] += marginal_planner_economic_index
+
+        # Planner Reward
+        # --------------
+        rew[self.world.planner.idx] = planner_rewards
+
+        return rew
+
+    def get_marginal_indices(
+        self, marginal_deaths, subsidy_t, postsubsidy_productivity_t
+    ):
+        """
+        Compute the (normalized) marginal health and economic indices of the agents
+        and the planner, given the deaths, subsidies and postsubsidy productivities of
+        the US states during the last timestep. The inputs may have leading dimensions
+        (e.g., an environment dimension), in which case the indices have the same
+        leading dimensions.
+        :return: the marginal agent health and economic indices, and the marginal
+        planner health and economic indices
+        """
+
         def crra_nonlinearity(x, eta):
             # Reference: https://en.wikipedia.org/wiki/Isoelastic_utility
             # To be applied to (marginal) economic indices
@@ -1059,28 +1284,6 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             eps = 1e-10
             return (x - min_x) / (max_x - min_x + eps)
 
-        def get_weighted_average(
-            health_index_weightage,
-            health_index,
-            economic_index_weightage,
-            economic_index,
-        ):
-            return (
-                health_index_weightage * health_index
-                + economic_index_weightage * economic_index
-            ) / (health_index_weightage + economic_index_weightage)
-
-        # Changes this last timestep:
-        marginal_deaths = (
-            self.world.global_state["Deaths"][self.world.timestep]
-            - self.world.global_state["Deaths"][self.world.timestep - 1]
-        )
-
-        subsidy_t = self.world.global_state["Subsidy"][self.world.timestep]
-        postsubsidy_productivity_t = self.world.global_state[
-            "Postsubsidy Productivity"
-        ][self.world.timestep]
-
         # Health index -- the cost equivalent (annual GDP) of covid deaths
         # Note: casting deaths to float to prevent overflow issues
         marginal_agent_health_index = (
@@ -1108,37 +1311,23 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             self.max_marginal_agent_economic_index,
         ).astype(self.np_float_dtype)
 
-        # Agent Rewards
-        # -------------
-        agent_rewards = get_weighted_average(
-            self.weightage_on_marginal_agent_health_index,
-            marginal_agent_health_index,
-            self.weightage_on_marginal_agent_economic_index,
-            marginal_agent_economic_index,
-        )
-        rew["a"] = agent_rewards / self.reward_normalization_factor
-
-        # Update agent states
-        # -------------------
-        for agent in self.world.agents:
-            agent.state["Health Index"] += marginal_agent_health_index[agent.idx]
-            agent.state["Economic Index"] += marginal_agent_economic_index[agent.idx]
-
         # National level
         # --------------
         # Health index -- the cost equivalent (annual GDP) of covid deaths
         # Note: casting deaths to float to prevent overflow issues
         marginal_planner_health_index = (
-            -np.sum(marginal_deaths).astype(self.np_float_dtype)
+            -np.sum(marginal_deaths, axis=-1).astype(self.np_float_dtype)
             * self.value_of_life
             / self.planner_health_norm
         )
 
         # Economic index -- fraction of annual GDP achieved (minus subsidy cost)
-        cost_of_subsidy_t = (1 + self.risk_free_interest_rate) * np.sum(subsidy_t)
+        cost_of_subsidy_t = (1 + self.risk_free_interest_rate) * np.sum(
+            subsidy_t, axis=-1
+        )
         # Use a "crra" nonlinearity on the planner economic reward
         marginal_planner_economic_index = crra_nonlinearity(
-            (np.sum(postsubsidy_productivity_t) - cost_of_subsidy_t)
+            (np.sum(postsubsidy_productivity_t, axis=-1) - cost_of_subsidy_t)
             / self.planner_economic_norm,
             self.economic_reward_crra_eta,
         )
@@ -1155,22 +1344,53 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             self.max_marginal_planner_economic_index,
         )
 
-        # Update planner states
-        # -------------------
-        self.world.planner.state["Health Index"] += marginal_planner_health_index
-        self.world.planner.state["Economic Index"] += marginal_planner_economic_index
+        return (
+            marginal_agent_health_index,
+            marginal_agent_economic_index,
+            marginal_planner_health_index,
+            marginal_planner_economic_index,
+        )
 
-        # Planner Reward
-        # --------------
+    def get_rewards_from_marginal_indices(
+        self,
+        marginal_agent_health_index,
+        marginal_agent_economic_index,
+        marginal_planner_health_index,
+        marginal_planner_economic_index,
+    ):
+        """
+        Compute the agent and planner rewards as the weighted averages of their
+        marginal health and economic indices (see get_marginal_indices).
+        :return: the agent rewards and the planner rewards
+        """
+
+        def get_weighted_average(
+            health_index_weightage,
+            health_index,
+            economic_index_weightage,
+            economic_index,
+        ):
+            return (
+                health_index_weightage * health_index
+                + economic_index_weightage * economic_index
+            ) / (health_index_weightage + economic_index_weightage)
+
+        agent_rewards = get_weighted_average(
+            self.weightage_on_marginal_agent_health_index,
+            marginal_agent_health_index,
+            self.weightage_on_marginal_agent_economic_index,
+            marginal_agent_economic_index,
+        )
         planner_rewards = get_weighted_average(
             self.weightage_on_marginal_planner_health_index,
             marginal_planner_health_index,
             self.weightage_on_marginal_planner_economic_index,
             marginal_planner_economic_index,
         )
-        rew[self.world.planner.idx] = planner_rewards / self.reward_normalization_factor
-
-        return rew
+        return (
+            agent_rewards / self.reward_normalization_factor,
+            planner_rewards / self.reward_normalization_factor,
+        )
 
     def additional_reset_steps(self):
         assert self.world.timestep == 0
@@ -1216,6 +1436,11 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             [(self.filter_len, 0), (0, 0)],
             constant_values=1,
         )[-(self.filter_len + 1) :]
+        self.stringency_level_history_index = 0
+        if self.use_recursive_unemployment_filter:
+            self.unemployment_filter_responses = self.get_unemployment_filter_responses(
+                self.stringency_level_history[1:] - self.stringency_level_history[:-1]
+            )
 
         # Set the stringency level based to the real-world policy
         self.set_global_state(
@@ -1235,46 +1460,32 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             self.current_date, format=self.date_format
         )
 
-        for agent in self.world.agents:
-            agent.state["Total Susceptible"] = susceptible_0[agent.idx].astype(
-                self.np_int_dtype
-            )
-            agent.state["New Infections"] = newly_infected_0[agent.idx].astype(
-                self.np_int_dtype
-            )
-            agent.state["Total Infected"] = infected_0[agent.idx].astype(
-                self.np_int_dtype
-            )
-            agent.state["Total Recovered"] = recovered_0[agent.idx].astype(
-                self.np_int_dtype
-            )
-            agent.state["New Deaths"] = new_deaths_0[agent.idx].astype(
-                self.np_int_dtype
-            )
-            agent.state["Total Deaths"] = deaths_0[agent.idx].astype(self.np_int_dtype)
-            agent.state["Health Index"] = np.array([0]).astype(self.np_float_dtype)
-            agent.state["Economic Index"] = np.array([0]).astype(self.np_float_dtype)
-            agent.state["Date"] = current_date_string
+        agent_state_columns = {
+            "Total Susceptible": susceptible_0.astype(self.np_int_dtype),
+            "New Infections": newly_infected_0.astype(self.np_int_dtype),
+            "Total Infected": infected_0.astype(self.np_int_dtype),
+            "Total Recovered": recovered_0.astype(self.np_int_dtype),
+            "New Deaths": new_deaths_0.astype(self.np_int_dtype),
+            "Total Deaths": deaths_0.astype(self.np_int_dtype),
+            "Health Index": np.zeros((self.n_agents, 1), dtype=self.np_float_dtype),
+            "Economic Index": np.zeros((self.n_agents, 1), dtype=self.np_float_dtype),
+            "Date": [current_date_string] * self.n_agents,
+        }
+        for field, values in agent_state_columns.items():
+            self.world.set_agent_state_column(field, values)
 
         # Planner state fields
-        self.world.planner.state["Total Susceptible"] = np.sum(
-            [agent.state["Total Susceptible"] for agent in self.world.agents]
-        ).astype(self.np_int_dtype)
-        self.world.planner.state["New Infections"] = np.sum(
-            [agent.state["New Infections"] for agent in self.world.agents]
-        ).astype(self.np_int_dtype)
-        self.world.planner.state["Total Infected"] = np.sum(
-            [agent.state["Total Infected"] for agent in self.world.agents]
-        ).astype(self.np_int_dtype)
-        self.world.planner.state["Total Recovered"] = np.sum(
-            [agent.state["Total Recovered"] for agent in self.world.agents]
-        ).astype(self.np_int_dtype)
-        self.world.planner.state["New Deaths"] = np.sum(
-            [agent.state["New Deaths"] for agent in self.world.agents]
-        ).astype(self.np_int_dtype)
-        self.world.planner.state["Total Deaths"] = np.sum(
-            [agent.state["Total Deaths"] for agent in self.world.agents]
-        ).astype(self.np_int_dtype)
+        for field in [
+            "Total Susceptible",
+            "New Infections",
+            "Total Infected",
+            "Total Recovered",
+            "New Deaths",
+            "Total Deaths",
+        ]:
+            self.world.planner.state[field] = np.sum(agent_state_columns[field]).astype(
+                self.np_int_dtype
+            )
         self.world.planner.state["Total Vaccinated"] = np.sum(vaccinated_0).astype(
             self.np_int_dtype
         )
@@ -1389,22 +1600,30 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         Note: Internally, unemployment is computed somewhat differently for speed.
             In particular, no convolution is used. Instead the "filter response" at
             time t is just a temporally discounted sum of past stringency changes,
-            with the discounting given by the filter decay rate.
+            with the discounting given by the filter decay rate. With
+            use_recursive_unemployment_filter=True, this sum is updated recursively,
+            in O(num_us_states * num_filters) time per timestep.
         """
 
-        def softplus(x, beta=1, threshold=20):
-            """
-            Numpy implementation of softplus. For reference, see
-            https://pytorch.org/docs/stable/generated/torch.nn.Softplus.html
-            """
-            return 1 / beta * np.log(1 + np.exp(beta * x)) * (
-                beta * x <= threshold
-            ) + x * (beta * x > threshold)
-
         if (
             self.world.timestep == 0
         ):  # computing unemployment at closure policy "all ones"
             delta_stringency_level = np.zeros((self.filter_len, self.num_us_states))
+        elif self.use_recursive_unemployment_filter:
+            self.unemployment_filter_responses = (
+                self.update_unemployment_filter_responses(
+                    self.unemployment_filter_responses,
+                    self.stringency_level_history,
+                    self.stringency_level_history_index,
+                    current_stringency_level,
+                )
+            )
+            self.stringency_level_history_index = (
+                self.stringency_level_history_index + 1
+            ) % len(self.stringency_level_history)
+            return self.get_unemployment_from_filter_responses(
+                self.unemployment_filter_responses
+            )
         else:
             self.stringency_level_history = np.concatenate(
                 (
@@ -1415,13 +1634,31 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             delta_stringency_level = (
                 self.stringency_level_history[1:] - self.stringency_level_history[:-1]
             )
+        return self.get_unemployment_from_stringency_changes(delta_stringency_level)
+
+    def get_unemployment_from_stringency_changes(
+        self, delta_stringency_level, unemployment_modulation=None
+    ):
+        """
+        Computes unemployment given the [time, state] history of stringency level
+        changes (see unemployment_step). The history may have leading dimensions
+        (e.g., an environment dimension), in which case the unemployment has the same
+        leading dimensions. An unemployment_modulation with these leading dimensions
+        may be passed instead of the one set with set_parameter_modulations.
+        """
 
         # Rather than modulating the unemployment params,
         # modulate the deltas (same effect)
-        delta_stringency_level = delta_stringency_level * self._unemployment_modulation
+        if unemployment_modulation is None:
+            unemployment_modulation = self._unemployment_modulation
+        else:
+            unemployment_modulation = np.asarray(unemployment_modulation)[
+                ..., None, None
+            ]
+        delta_stringency_level = delta_stringency_level * unemployment_modulation
 
         # Expand the [time, state] delta history to have a dimension for filter channel
-        x_data = delta_stringency_level[None].transpose(2, 0, 1)
+        x_data = np.swapaxes(delta_stringency_level, -1, -2)[..., None, :]
 
         # Apply the state-specific filter weights to each channel
         weighted_x_data = x_data * self.repeated_conv_weights
@@ -1429,8 +1666,84 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         # Compute the discounted sum of the weighted deltas, with each channel using
         # a discounting rate reflecting the time constant of the filter channel. Also
         # sum over channels and use a softplus to get excess unemployment.
-        excess_unemployment = softplus(
-            np.sum(weighted_x_data * self.unemp_conv_filters, axis=(1, 2)), beta=1
+        excess_unemployment = self.softplus(
+            np.sum(weighted_x_data * self.unemp_conv_filters, axis=(-2, -1)), beta=1
+        )
+
+        # Add excess unemployment to baseline unemployment
+        unemployment_rate = excess_unemployment + self.unemployment_bias
+
+        # Convert the rate (which is a percent) to raw numbers for output
+        num_unemployed_t = unemployment_rate * self.us_state_population / 100
+        return num_unemployed_t
+
+    def get_unemployment_filter_responses(self, delta_stringency_level):
+        """
+        Computes the response of each unemployment filter to the [time, state]
+        history of stringency level changes, i.e., the discounted sum of the changes
+        (without the state-specific filter weights or the unemployment modulation).
+        The history may have leading dimensions (e.g., an environment dimension).
+        :return: the [state, filter] filter responses
+        """
+        time_to_present = np.arange(self.filter_len - 1, -1, -1)
+        filters = self.unemp_filter_decays[:, None] ** time_to_present
+        return np.swapaxes(delta_stringency_level, -1, -2) @ filters.T
+
+    def update_unemployment_filter_responses(
+        self,
+        unemployment_filter_responses,
+        stringency_level_history,
+        stringency_level_history_index,
+        current_stringency_level,
+    ):
+        """
+        Recursively updates the unemployment filter responses (see
+        get_unemployment_filter_responses) with the current stringency level.
+        The stringency level history is a [time, state] ring buffer, whose oldest
+        entry is at stringency_level_history_index. It is updated in place (the
+        current stringency level replaces the oldest entry). The inputs may have
+        leading dimensions (e.g., an environment dimension).
+        :return: the updated [state, filter] filter responses
+        """
+        history_len = stringency_level_history.shape[-2]
+        oldest = stringency_level_history[..., stringency_level_history_index, :]
+        second_oldest = stringency_level_history[
+            ..., (stringency_level_history_index + 1) % history_len, :
+        ]
+        newest = stringency_level_history[
+            ..., (stringency_level_history_index - 1) % history_len, :
+        ]
+        new_delta = current_stringency_level - newest
+        dropped_delta = second_oldest - oldest
+        stringency_level_history[..., stringency_level_history_index, :] = (
+            current_stringency_level
+        )
+        return (
+            unemployment_filter_responses * self.unemp_filter_decays
+            + new_delta[..., None]
+            - dropped_delta[..., None] * self.unemp_filter_dropped_weights
+        )
+
+    def get_unemployment_from_filter_responses(
+        self, unemployment_filter_responses, unemployment_modulation=None
+    ):
+        """
+        Computes unemployment given the [state, filter] unemployment filter responses
+        (see get_unemployment_filter_responses). The responses may have leading
+        dimensions (e.g., an environment dimension), and so may the
+        unemployment_modulation (see get_unemployment_from_stringency_changes).
+        """
+        if unemployment_modulation is None:
+            unemployment_modulation = self._unemployment_modulation
+        else:
+            unemployment_modulation = np.asarray(unemployment_modulation)[..., None]
+
+        # Weight the filter responses, modulate them, and use a softplus to get excess
+        # unemployment.
+        weighted_responses = unemployment_filter_responses * self.unemp_filter_weights
+        excess_unemployment = self.softplus(
+            unemployment_modulation * np.sum(weighted_responses, axis=-1),
+            beta=1,
         )
 
         # Add excess unemployment to baseline unemployment
@@ -1440,6 +1753,16 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         num_unemployed_t = unemployment_rate * self.us_state_population / 100
         return num_unemployed_t
 
+    @staticmethod
+    def softplus(x, beta=1, threshold=20):
+        """
+        Numpy implementation of softplus. For reference, see
+        https://pytorch.org/docs/stable/generated/torch.nn.Softplus.html
+        """
+        return 1 / beta * np.log(1 + np.exp(beta * x)) * (
+            beta * x <= threshold
+        ) + x * (beta * x > threshold)
+
     # --- Scenario-specific ---
     def economy_step(
         self,
@@ -1474,12 +1797,37 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
 
         return productivity
 
-    def sir_step(self, S_tm1, I_tm1, stringency_level_tmk, num_vaccines_available_t):
+    def sir_step(
+        self,
+        S_tm1,
+        I_tm1,
+        stringency_level_tmk,
+        num_vaccines_available_t,
+        record_r0=True,
+        beta_intercepts_modulation=None,
+        beta_slopes_modulation=None,
+    ):
         """
         Simulates SIR infection model in the US.
+
+        The inputs may have leading dimensions (e.g., an environment dimension), in
+        which case the outputs have the same leading dimensions. Beta modulations with
+        these leading dimensions may be passed instead of the ones set with
+        set_parameter_modulations. Set record_r0=False to not record the R0 of the
+        states in the agent states.
         """
-        intercepts = self.beta_intercepts * self._beta_intercepts_modulation
-        slopes = self.beta_slopes * self._beta_slopes_modulation
+        if beta_intercepts_modulation is None:
+            beta_intercepts_modulation = self._beta_intercepts_modulation
+        else:
+            beta_intercepts_modulation = np.asarray(beta_intercepts_modulation)[
+                ..., None
+            ]
+        if beta_slopes_modulation is None:
+            beta_slopes_modulation = self._beta_slopes_modulation
+        else:
+            beta_slopes_modulation = np.asarray(beta_slopes_modulation)[..., None]
+        intercepts = self.beta_intercepts * beta_intercepts_modulation
+        slopes = self.beta_slopes * beta_slopes_modulation
         beta_i = (intercepts + slopes * stringency_level_tmk).astype(
             self.np_float_dtype
         )
@@ -1492,9 +1840,8 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
         vaccinated_t = np.minimum(num_vaccines_available_t, S_tm1)
 
         # Record R0
-        R0 = beta_i / self.gamma
-        for agent in self.world.agents:
-            agent.state["R0"] = R0[agent.idx]
+        if record_r0:
+            self.world.set_agent_state_column("R0", beta_i / self.gamma)
 
         # S -> I; dS
         neighborhood_SI_over_N = (S_tm1 / self.us_state_population) * I_tm1
@@ -1514,18 +1861,7 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
 
         return dS_t, dI_t, dR_t, dV_t
 
-    def load_model_constants(self, path_to_model_constants):
-        filename = "model_constants.json"
-        assert filename in os.listdir(path_to_model_constants), (
-            "Unable to locate '{}' in '{}'.\nPlease run the "
-            "'gather_real_world_data.ipynb' notebook first".format(
-                filename, path_to_model_constants
-            )
-        )
-        with open(os.path.join(path_to_model_constants, filename), "r") as fp:
-            model_constants_dict = json.load(fp)
-        fp.close()
-
+    def load_model_constants(self, model_constants_dict):
         self.date_format = model_constants_dict["DATE_FORMAT"]
         self.us_state_idx_to_state_name = model_constants_dict[
             "US_STATE_IDX_TO_STATE_NAME"
@@ -1541,17 +1877,7 @@ class CovidAndEconomyEnvironment(BaseEnvironment):
             model_constants_dict["GDP_PER_CAPITA"]
         )
 
-    def load_fitted_params(self, path_to_fitted_params):
-        filename = "fitted_params.json"
-        assert filename in os.listdir(path_to_fitted_params), (
-            "Unable to locate '{}' in '{}'.\nIf you ran the "
-            "'gather_real_world_data.ipynb' notebook to download the latest "
-            "real-world data, please also run the "
-            "'fit_parameters.ipynb' notebook.".format(filename, path_to_fitted_params)
-        )
-        with open(os.path.join(path_to_fitted_params, filename), "r") as fp:
-            fitted_params_dict = json.load(fp)
-        fp.close()
+    def load_fitted_params(self, fitted_params_dict):
         self.policy_start_date = datetime.strptime(
             fitted_params_dict["POLICY_START_DATE"], self.date_format
         )
@@ -4,14 +4,61 @@
 # For full license text, see the LICENSE file in the repo root
 # or https://opensource.org/licenses/BSD-3-Clause
 
-import numpy as np
-import pandas as pd
-import random
 import os
 
+import numpy as np
+
 from ai_economist.foundation.base.base_env import BaseEnvironment, scenario_registry
 from ai_economist.foundation.scenarios.utils import rewards, social_metrics
 
+# Country and miner score tables, as {path_to_data: (countries, reliability_scores)}
+# (see load_filecoin_tables)
+_filecoin_tables = {}
+
+
+def load_filecoin_tables(path_to_data=""):
+    """Load the country and miner score tables used to initialize the miners.
+
+    The tables are parsed once per process (and data directory), and shared by all
+    the environment instances.
+
+    Args:
+        path_to_data (dirpath): Full path to the directory containing
+            "country_probs.csv" and "miner_scores_dist.csv". Defaults to the
+            filecoin dataset shipped with the package.
+
+    Returns:
+        countries (dict): The (read-only) columns of the country table, as
+            {column name: array}.
+        reliability_scores (dict): The (read-only) columns of the miner score
+            table, as {column name: array}.
+    """
+    if path_to_data == "":
+        current_dir = os.path.dirname(__file__)
+        path_to_data = os.path.join(current_dir, "../../../datasets/filecoin_datasets")
+    path_to_data = os.path.abspath(path_to_data)
+
+    if path_to_data not in _filecoin_tables:
+        tables = []
+        for filename, delimiter in [
+            ("country_probs.csv", ";"),
+            ("miner_scores_dist.csv", ","),
+        ]:
+            table = np.genfromtxt(
+                os.path.join(path_to_data, filename),
+                delimiter=delimiter,
+                names=True,
+                dtype=None,
+                encoding="utf-8",
+            )
+            columns = {}
+            for name in table.dtype.names:
+                columns[name] = np.ascontiguousarray(table[name])
+                columns[name].flags.writeable = False
+            tables.append(columns)
+        _filecoin_tables[path_to_data] = tuple(tables)
+    return _filecoin_tables[path_to_data]
+
 
 @scenario_registry.add
 class FilecoinEnergy(BaseEnvironment):
@@ -19,20 +66,46 @@ class FilecoinEnergy(BaseEnvironment):
     agent_subclasses = ["BasicMobileAgent", "BasicPlanner"]
     required_entities = ["NewData", "TotalData"]
 
+    # Length (in timesteps) of the consumed energy and green score histories
+    history_length = 24
+
     def __init__(
-        self,
-        *base_env_args,
-        static = False,
-        **base_env_kwargs
+        self, *base_env_args, static=False, path_to_data="", **base_env_kwargs
     ):
+        # The miner states are always kept in the agent state table (built below,
+        # once the history windows have been added to the agent states)
+        base_env_kwargs.pop("use_agent_state_table", None)
         super().__init__(*base_env_args, **base_env_kwargs)
         self.num_agents = len(self.world.agents)
-        self.countries = pd.read_csv('utils/country_probs.csv', sep=";")
-        self.rel_scores = pd.read_csv('utils/miner_scores_dist.csv')
+        self.countries, self.rel_scores = load_filecoin_tables(path_to_data)
         self.static = static
         self.curr_optimization_metrics = {str(a.idx): 0.0 for a in self.all_agents}
 
-
+        # Scalar miner quantities (NewData, TotalData, scores, prices) are stored as
+        # (n_agents,) columns, and the 24-step ConsumedEnergy and GreenScoresLastDay
+        # histories as (n_agents, 24) columns (oldest step first), so that the
+        # scenario and components can update all the miners at once. (The scalar
+        # quantities are floats, so that they get float64 columns.) The scores and
+        # prices used by the scenario are added here, as not every component
+        # configuration registers them.
+        for agent in self.world.agents:
+            for k in agent.state["endogenous"]:
+                agent.state["endogenous"][k] = 0.0
+            for k in [
+                "ReliabilityScore",
+                "TotalScore",
+                "GreenScore",
+                "EnergyPrice",
+                "InitialGreenScore",
+            ]:
+                agent.state["endogenous"][k] = 0.0
+            for k in ["ConsumedEnergy", "GreenScoresLastDay"]:
+                agent.state["endogenous"][k] = np.zeros(self.history_length)
+        self.world.build_agent_state_table()
+
+    def endogenous_column(self, name):
+        """Return the (writable) column of endogenous quantity name for all miners."""
+        return self.world.agent_state_table["endogenous", name]
 
     # The following methods must be implemented for each scenario
     # -----------------------------------------------------------
@@ -54,32 +127,43 @@ class FilecoinEnergy(BaseEnvironment):
         in random accesible locations to start.
         """
         self.world.clear_agent_locs()
-        
-        # set seed for reproducability
-        np.random.seed(0)
-        
-        for agent in self.world.agents:
 
-            # This will set consumed energy, RECs costs, etc. to 0
-            agent.state["endogenous"] = {k: 0.0 for k in agent.state["endogenous"].keys()}
-
-            # This will set TotalData and NewData to 0 
-            #agent.state["inventory"] = {k: 0 for k in agent.state["inventory"].keys()}
-
-            # Draw Reliability score from distribution
-            agent.state["endogenous"]["ReliabilityScore"] = np.random.choice(self.rel_scores['score'], p=self.rel_scores['prob']) / 100
-            agent.state["endogenous"]["TotalScore"] = agent.state["endogenous"]["ReliabilityScore"]
+        # set seed for reproducability (of the initial miner states only: the
+        # storage providers of each episode are drawn from the global numpy RNG)
+        rng = np.random.RandomState(0)
+
+        # This will set consumed energy, RECs costs, etc. to 0
+        for key in self.world.agent_state_table.keys():
+            if key[0] == "endogenous":
+                self.world.agent_state_table[key][:] = 0.0
+
+        # Draw Reliability scores from distribution
+        reliability_scores = (
+            rng.choice(
+                self.rel_scores["score"],
+                size=self.num_agents,
+                p=self.rel_scores["prob"],
+            )
+            / 100
+        )
+        self.endogenous_column("ReliabilityScore")[:] = reliability_scores
+        self.endogenous_column("TotalScore")[:] = reliability_scores
 
-            # Decide agent location to start with, which determines energy costs per kWh and initial green score
-            country = np.random.choice(self.countries.index, p=self.countries['prob'])
-            agent.state["endogenous"]['EnergyPrice'] = self.countries['energy_price_per_kWh'][country]
-            agent.state["endogenous"]['GreenScoresLastDay'] = np.full((24,), self.countries['renewables_percentage'][country])
-            agent.state["endogenous"]["GreenScore"] = np.mean(agent.state["endogenous"]["GreenScoresLastDay"])
-            agent.state["endogenous"]["InitialGreenScore"] = self.countries['renewables_percentage'][country]
-            
-            # Consumed Energy for the past 24h, 0 in the beginning
-            agent.state["endogenous"]['ConsumedEnergy'] = np.full((24,), 0.0)
+        # Decide agent locations to start with, which determine energy costs per kWh
+        # and initial green scores
+        countries = rng.choice(
+            len(self.countries["prob"]), size=self.num_agents, p=self.countries["prob"]
+        )
+        renewables = self.countries["renewables_percentage"][countries]
+        self.endogenous_column("EnergyPrice")[:] = self.countries[
+            "energy_price_per_kWh"
+        ][countries]
+        green_scores = self.endogenous_column("GreenScoresLastDay")
+        green_scores[:] = renewables[:, None]
+        self.endogenous_column("GreenScore")[:] = green_scores.mean(axis=1)
+        self.endogenous_column("InitialGreenScore")[:] = renewables
 
+        # Consumed Energy for the past 24h is 0 in the beginning (reset above)
 
     def scenario_step(self):
         """
@@ -97,26 +181,28 @@ class FilecoinEnergy(BaseEnvironment):
         # ensure at least one agent is chosen
         num_sp = max(1, num_sp)
 
-        # chose which agents get to store new data, based on their total score
-        agent_ids = list(map(lambda agent: agent.idx, self.world.agents))
-        agent_weights = list(map(lambda agent: agent.state["endogenous"]["TotalScore"], self.world.agents))
-        chosen_agents = random.choices(agent_ids, weights=agent_weights, k=num_sp)
-        for agent in self.world.agents:
-            # calculate new storage added
-            if agent.idx in chosen_agents:
-                agent.state["endogenous"]["NewData"] = 1024.0
-            else:
-                agent.state["endogenous"]["NewData"] = 0.0
-
-            # update total storage
-            agent.state["endogenous"]["TotalData"] += agent.state["endogenous"]["NewData"]
+        # chose which agents get to store new data (with replacement), based on
+        # their total score
+        total_scores = self.endogenous_column("TotalScore")
+        chosen_agents = np.random.choice(
+            self.num_agents, size=num_sp, p=total_scores / np.sum(total_scores)
+        )
 
-            # calculate energy consumed this step
-            energy_consumption = rewards.calculateEnergyConsumption(agent.state["endogenous"]["NewData"], agent.state["endogenous"]["TotalData"])
-            agent.state["endogenous"]["ConsumedEnergy"] = agent.state["endogenous"]["ConsumedEnergy"][1:]
-            agent.state["endogenous"]["ConsumedEnergy"] = np.append(agent.state["endogenous"]["ConsumedEnergy"], energy_consumption)
+        # calculate new storage added
+        new_data = self.endogenous_column("NewData")
+        new_data[:] = 0.0
+        new_data[chosen_agents] = 1024.0
 
+        # update total storage
+        total_data = self.endogenous_column("TotalData")
+        total_data += new_data
 
+        # calculate energy consumed this step and add it to the 24h history
+        consumed_energy = self.endogenous_column("ConsumedEnergy")
+        consumed_energy[:, :-1] = consumed_energy[:, 1:]
+        consumed_energy[:, -1] = rewards.calculateEnergyConsumption(
+            new_data, total_data
+        )
 
     def generate_observations(self):
         """
@@ -139,23 +225,22 @@ class FilecoinEnergy(BaseEnvironment):
         The planner also receives spatial observations (again, depending on the env
         config) as well as the inventory of each of the mobile agents.
         """
-        obs_dict = dict()
-        for agent in self.world.agents:
-            obs_dict[str(agent.idx)] = {
-                "endogenous-" + k: v for k, v in agent.endogenous.items()
-            }
+        keys = list(self.world.agents[0].endogenous.keys())
+        # (copied, since the columns are updated in place)
+        columns = [list(self.endogenous_column(k).copy()) for k in keys]
+        obs_keys = ["endogenous-" + k for k in keys]
+        obs_dict = {
+            str(agent.idx): dict(zip(obs_keys, agent_values))
+            for agent, agent_values in zip(self.world.agents, zip(*columns))
+        }
 
-        agent_green_scores = np.array(
-            [agent.state["endogenous"]["GreenScore"] for agent in self.world.agents]
-        )
-        agent_reliability_scores = np.array(
-            [agent.state["endogenous"]["ReliabilityScore"] for agent in self.world.agents]
-        )
-        agent_storage = np.array(
-            [agent.state["endogenous"]["NewData"] for agent in self.world.agents]
-        )
+        agent_green_scores = self.endogenous_column("GreenScore")
+        agent_reliability_scores = self.endogenous_column("ReliabilityScore")
+        agent_storage = self.endogenous_column("NewData")
         if not self.static:
-            reliability = rewards.reliability_scores(agent_reliability_scores, agent_storage)
+            reliability = rewards.reliability_scores(
+                agent_reliability_scores, agent_storage
+            )
             renewables = rewards.green_scores(agent_green_scores, agent_storage)
             obs_dict[self.world.planner.idx] = {
                 "reliability": reliability,
@@ -183,10 +268,7 @@ class FilecoinEnergy(BaseEnvironment):
         curr_optimization_metrics = self.get_current_optimization_metrics(
             self.world.agents
         )
-        planner_agents_rew = {
-            k: v
-            for k, v in curr_optimization_metrics.items()
-        }
+        planner_agents_rew = {k: v for k, v in curr_optimization_metrics.items()}
         self.curr_optimization_metrics = curr_optimization_metrics
         return planner_agents_rew
 
@@ -222,16 +304,12 @@ class FilecoinEnergy(BaseEnvironment):
         metrics = dict()
 
         # Log social/economic indicators
-        agent_green_scores = np.array(
-            [agent.state["endogenous"]["GreenScore"] for agent in self.world.agents]
-        )
-        agent_reliability_scores = np.array(
-            [agent.state["endogenous"]["ReliabilityScore"] for agent in self.world.agents]
+        agent_green_scores = self.endogenous_column("GreenScore")
+        agent_reliability_scores = self.endogenous_column("ReliabilityScore")
+        agent_storage = self.endogenous_column("NewData")
+        reliability = rewards.reliability_scores(
+            agent_reliability_scores, agent_storage
         )
-        agent_storage = np.array(
-            [agent.state["endogenous"]["NewData"] for agent in self.world.agents]
-        )
-        reliability = rewards.reliability_scores(agent_reliability_scores, agent_storage)
         renewables = rewards.green_scores(agent_green_scores, agent_storage)
 
         if not self.static:
@@ -241,9 +319,7 @@ class FilecoinEnergy(BaseEnvironment):
 
         return metrics
 
-    def get_current_optimization_metrics(
-        self, agents
-    ):
+    def get_current_optimization_metrics(self, agents):
         """
         Compute optimization metrics based on the current state. Used to compute reward.
 
@@ -252,47 +328,31 @@ class FilecoinEnergy(BaseEnvironment):
                 with an entry for each agent (including the planner) in the env.
         """
         curr_optimization_metric = {}
-        agent_green_scores = np.array(
-            [agent.state["endogenous"]["GreenScore"] for agent in agents]
-        )
-        agent_reliability_scores = np.array(
-            [agent.state["endogenous"]["ReliabilityScore"] for agent in agents]
-        )
-        agent_storage = np.array(
-            [agent.state["endogenous"]["NewData"] for agent in agents]
+        agent_indices = [agent.idx for agent in agents]
+        agent_green_scores = self.endogenous_column("GreenScore")[agent_indices]
+        agent_reliability_scores = self.endogenous_column("ReliabilityScore")[
+            agent_indices
+        ]
+        agent_storage = self.endogenous_column("NewData")[agent_indices]
+        # Optimization metric for agents (computed for all agents at once):
+        agent_rewards = rewards.filecoin_minus_energy_costs(
+            agent_storage,
+            self.endogenous_column("TotalData")[agent_indices],
+            self.endogenous_column("EnergyPrice")[agent_indices],
+            self.endogenous_column("RECsPrice")[agent_indices],
         )
-        max_reward = 0
-        for agent in agents:
-            curr_reward = rewards.filecoin_minus_energy_costs(
-                agent.state["endogenous"]["NewData"],
-                agent.state["endogenous"]["TotalData"],
-                agent.state["endogenous"]["EnergyPrice"],
-                agent.state["endogenous"]["RECsPrice"]
-            )
-            if curr_reward > max_reward:
-                max_reward = curr_reward
-        # Optimization metric for agents:
-        for agent in agents:
-            reward = rewards.filecoin_minus_energy_costs(
-                agent.state["endogenous"]["NewData"],
-                agent.state["endogenous"]["TotalData"],
-                agent.state["endogenous"]["EnergyPrice"],
-                agent.state["endogenous"]["RECsPrice"]
-            )
-            # scale rewards from 0 to 1, otherwise planner doesn't learn
-            if max_reward > 0:
-                reward /= (max_reward * self.num_agents)
-            curr_optimization_metric[
-                agent.idx
-            ] = reward
+        max_reward = max(0, np.max(agent_rewards))
+        # scale rewards from 0 to 1, otherwise planner doesn't learn
+        if max_reward > 0:
+            agent_rewards = agent_rewards / (max_reward * self.num_agents)
+        for agent, reward in zip(agents, agent_rewards.tolist()):
+            curr_optimization_metric[agent.idx] = reward
         # Optimization metric for the planner:
         curr_optimization_metric[self.world.planner.idx] = 1.0
-        if not self.static: 
-            curr_optimization_metric[
-                self.world.planner.idx
-            ] = rewards.reliability_plus_green_scores(
-                    agent_green_scores,
-                    agent_reliability_scores,
-                    agent_storage
+        if not self.static:
+            curr_optimization_metric[self.world.planner.idx] = (
+                rewards.reliability_plus_green_scores(
+                    agent_green_scores, agent_reliability_scores, agent_storage
                 )
+            )
         return curr_optimization_metric
@@ -11,7 +11,11 @@ import numpy as np
 from scipy import signal
 
 from ai_economist.foundation.base.base_env import BaseEnvironment, scenario_registry
-from ai_economist.foundation.scenarios.utils import rewards, social_metrics
+from ai_economist.foundation.scenarios.utils import (
+    observations,
+    rewards,
+    social_metrics,
+)
 
 
 @scenario_registry.add
@@ -274,47 +278,27 @@ class LayoutFromFile(BaseEnvironment):
             curr_optimization_metric (dict): A dictionary of {agent.idx: metric}
                 with an entry for each agent (including the planner) in the env.
         """
-        curr_optimization_metric = {}
+        coin_endowments = self.world.get_agent_total_endowments("Coin")
         # (for agents)
-        for agent in self.world.agents:
-            curr_optimization_metric[agent.idx] = rewards.isoelastic_coin_minus_labor(
-                coin_endowment=agent.total_endowment("Coin"),
-                total_labor=agent.state["endogenous"]["Labor"],
-                isoelastic_eta=self.isoelastic_eta,
-                labor_coefficient=self.energy_weight * self.energy_cost,
-            )
+        utilities = rewards.isoelastic_coin_minus_labor(
+            coin_endowment=coin_endowments,
+            total_labor=self.world.get_agent_state_column(("endogenous", "Labor")),
+            isoelastic_eta=self.isoelastic_eta,
+            labor_coefficient=self.energy_weight * self.energy_cost,
+        )
+        curr_optimization_metric = {
+            agent.idx: utility
+            for agent, utility in zip(self.world.agents, utilities.tolist())
+        }
         # (for the planner)
-        if self.planner_reward_type == "coin_eq_times_productivity":
-            curr_optimization_metric[
-                self.world.planner.idx
-            ] = rewards.coin_eq_times_productivity(
-                coin_endowments=np.array(
-                    [agent.total_endowment("Coin") for agent in self.world.agents]
-                ),
-                equality_weight=1 - self.mixing_weight_gini_vs_coin,
-            )
-        elif self.planner_reward_type == "inv_income_weighted_coin_endowments":
-            curr_optimization_metric[
-                self.world.planner.idx
-            ] = rewards.inv_income_weighted_coin_endowments(
-                coin_endowments=np.array(
-                    [agent.total_endowment("Coin") for agent in self.world.agents]
-                )
-            )
-        elif self.planner_reward_type == "inv_income_weighted_utility":
-            curr_optimization_metric[
-                self.world.planner.idx
-            ] = rewards.inv_income_weighted_utility(
-                coin_endowments=np.array(
-                    [agent.total_endowment("Coin") for agent in self.world.agents]
-                ),
-                utilities=np.array(
-                    [curr_optimization_metric[agent.idx] for agent in self.world.agents]
-                ),
-            )
-        else:
-            print("No valid planner reward selected!")
-            raise NotImplementedError
+        curr_optimization_metric[
+            self.world.planner.idx
+        ] = rewards.planner_social_welfare(
+            self.planner_reward_type,
+            coin_endowments=coin_endowments,
+            utilities=utilities,
+            equality_weight=1 - self.mixing_weight_gini_vs_coin,
+        )
         return curr_optimization_metric
 
     # The following methods must be implemented for each scenario
@@ -432,6 +416,10 @@ class LayoutFromFile(BaseEnvironment):
         """
         obs = {}
         curr_map = self.world.maps.state
+        # curr_map is a read-only view of the live world maps. Observations of the
+        # full map get a copy, so that they are not modified by later steps.
+        if self._planner_gets_spatial_info or self._full_observability:
+            full_map = np.array(curr_map)
 
         owner_map = self.world.maps.owner_state
         loc_map = self.world.loc_map
@@ -459,7 +447,7 @@ class LayoutFromFile(BaseEnvironment):
         }
         if self._planner_gets_spatial_info:
             obs[self.world.planner.idx].update(
-                dict(map=curr_map, idx_map=agent_idx_maps)
+                dict(map=full_map, idx_map=agent_idx_maps)
             )
 
         # Mobile agents see the full map. Convey location info via one-hot map channels.
@@ -468,7 +456,7 @@ class LayoutFromFile(BaseEnvironment):
                 my_map = np.array(agent_idx_maps)
                 my_map[my_map == int(agent.idx) + 2] = 1
                 sidx = str(agent.idx)
-                obs[sidx] = {"map": curr_map, "idx_map": my_map}
+                obs[sidx] = {"map": full_map, "idx_map": my_map}
                 obs[sidx].update(agent_invs[sidx])
 
         # Mobile agents only see within a window around their position
@@ -491,20 +479,18 @@ class LayoutFromFile(BaseEnvironment):
                 constant_values=[(0, 0), (0, 0), (0, 0)],
             )
 
-            for agent in self.world.agents:
-                r, c = [c + w for c in agent.loc]
-                visible_map = padded_map[
-                    :, (r - w) : (r + w + 1), (c - w) : (c + w + 1)
-                ]
-                visible_idx = np.array(
-                    padded_idx[:, (r - w) : (r + w + 1), (c - w) : (c + w + 1)]
-                )
-
-                visible_idx[visible_idx == int(agent.idx) + 2] = 1
+            # Extract the windows of all the agents at once: (n_agents, C, k, k)
+            agent_locs_array = self.world.maps.agent_locs
+            visible_maps = observations.agent_windows(padded_map, agent_locs_array, w)
+            visible_idxs = observations.agent_windows(padded_idx, agent_locs_array, w)
+            observations.mark_self_in_idx_maps(
+                visible_idxs, [agent.idx for agent in self.world.agents]
+            )
 
+            for i, agent in enumerate(self.world.agents):
                 sidx = str(agent.idx)
 
-                obs[sidx] = {"map": visible_map, "idx_map": visible_idx}
+                obs[sidx] = {"map": visible_maps[i], "idx_map": visible_idxs[i]}
                 obs[sidx].update(agent_locs[sidx])
                 obs[sidx].update(agent_invs[sidx])
 
@@ -535,7 +521,7 @@ class LayoutFromFile(BaseEnvironment):
 
         # "curr_optimization_metric" hasn't been updated yet, so it gives us the
         # utility from the last step.
-        utility_at_end_of_last_time_step = deepcopy(self.curr_optimization_metric)
+        utility_at_end_of_last_time_step = dict(self.curr_optimization_metric)
 
         # compute current objectives and store the values
         self.curr_optimization_metric = self.get_current_optimization_metrics()
@@ -604,9 +590,7 @@ class LayoutFromFile(BaseEnvironment):
         """
         metrics = dict()
 
-        coin_endowments = np.array(
-            [agent.total_endowment("Coin") for agent in self.world.agents]
-        )
+        coin_endowments = self.world.get_agent_total_endowments("Coin")
         metrics["social/productivity"] = social_metrics.get_productivity(
             coin_endowments
         )
@@ -0,0 +1,53 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def agent_windows(padded_maps, locs, halfwidth):
+    """Extract the local view of each agent from a stack of padded maps.
+
+    Args:
+        padded_maps (ndarray): Maps of shape (C, H + 2w, W + 2w), i.e. padded with
+            halfwidth (w) cells on each side of the two spatial dimensions.
+        locs (ndarray): (N, 2) array of agent locations, in the coordinates of the
+            unpadded maps.
+        halfwidth (int): Halfwidth (w) of the view window.
+
+    Returns:
+        windows (ndarray): Array of shape (N, C, 2w + 1, 2w + 1), where windows[i] is
+            the view of the agent at locs[i]. It is a new array (not a view of
+            padded_maps).
+    """
+    k = 2 * halfwidth + 1
+    # (C, H, W, k, k) view: the window centered on each (unpadded) location
+    all_windows = sliding_window_view(padded_maps, (k, k), axis=(1, 2))
+    locs = np.asarray(locs)
+    return np.moveaxis(all_windows[:, locs[:, 0], locs[:, 1]], 1, 0)
+
+
+def mark_self_in_idx_maps(idx_maps, agent_indices, self_value=1, offset=2):
+    """Relabel each agent's own index in its (batched) idx_map observation.
+
+    In the idx_map observations, agent index i is encoded as i + offset. For each
+    agent, the cells holding its own (encoded) index are set to self_value, in
+    place.
+
+    Args:
+        idx_maps (ndarray): Array of shape (N, ...) where idx_maps[i] is the idx_map
+            observation of the agent with index agent_indices[i].
+        agent_indices (ndarray): The (N,) agent indices.
+        self_value (int): Value marking the agent itself.
+        offset (int): Offset of the encoded agent indices.
+
+    Returns:
+        idx_maps (ndarray): The (modified) input array.
+    """
+    encoded = np.asarray(agent_indices) + offset
+    encoded = encoded.reshape((-1,) + (1,) * (idx_maps.ndim - 1))
+    idx_maps[idx_maps == encoded] = self_value
+    return idx_maps
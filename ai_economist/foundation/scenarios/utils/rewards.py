@@ -35,7 +35,7 @@ def isoelastic_coin_minus_labor(
 
     # Utility from coin endowment
     if isoelastic_eta == 1.0:  # dangerous
-        util_c = np.log(np.max(1, coin_endowment))
+        util_c = np.log(np.maximum(1, coin_endowment))
     else:  # isoelastic_eta >= 0
         util_c = (coin_endowment ** (1 - isoelastic_eta) - 1) / (1 - isoelastic_eta)
 
@@ -133,15 +133,45 @@ def inv_income_weighted_utility(coin_endowments, utilities):
     return np.sum(utilities * pareto_weights)
 
 
+def planner_social_welfare(
+    planner_reward_type, coin_endowments, utilities, equality_weight=1.0
+):
+    """Social welfare of the given type, computed for all the agents at once.
+
+    Args:
+        planner_reward_type (str): One of "coin_eq_times_productivity",
+            "inv_income_weighted_coin_endowments" or "inv_income_weighted_utility".
+        coin_endowments (ndarray): The array of coin endowments for each of the
+            agents in the simulated economy.
+        utilities (ndarray): The array of utilities for each of the agents in the
+            simulated economy.
+        equality_weight (float): Constant that determines how productivity is scaled
+            by coin equality (only used by "coin_eq_times_productivity").
+
+    Returns:
+        Social welfare (float).
+    """
+    if planner_reward_type == "coin_eq_times_productivity":
+        return coin_eq_times_productivity(
+            coin_endowments=coin_endowments, equality_weight=equality_weight
+        )
+    if planner_reward_type == "inv_income_weighted_coin_endowments":
+        return inv_income_weighted_coin_endowments(coin_endowments=coin_endowments)
+    if planner_reward_type == "inv_income_weighted_utility":
+        return inv_income_weighted_utility(
+            coin_endowments=coin_endowments, utilities=utilities
+        )
+    print("No valid planner reward selected!")
+    raise NotImplementedError
+
+
 def filecoin_minus_energy_costs(new_data, total_data, energy_price, rec_costs):
-    # calculate the reward of individual miners
+    # calculate the reward of individual miners (scalars or (n_agents,) arrays)
     storage_fees = 3.057e-10
-    block_rewards = 0
-    
+
     # a block reward is granted only if new data is added
-    if new_data > 0:
-        block_rewards = 183.5
-        
+    block_rewards = np.where(np.asarray(new_data) > 0, 183.5, 0.0)
+
     # substract costs from total rewards to get final profit
     total_rewards = block_rewards + total_data * storage_fees
     total_energy = calculateEnergyConsumption(new_data, total_data)
@@ -13,6 +13,11 @@ import lz4.frame
 from Crypto.PublicKey import RSA
 
 from ai_economist.foundation.base.base_env import BaseEnvironment
+from ai_economist.foundation.episode_log import (
+    ColumnarEpisodeLog,
+    is_columnar_episode_log,
+    write_columnar_episode_log,
+)
 
 
 def save_episode_log(game_object, filepath, compression_level=16):
@@ -37,12 +42,58 @@ def save_episode_log(game_object, filepath, compression_level=16):
 
 
 def load_episode_log(filepath):
-    """Load the dense log saved at provided filepath"""
+    """Load the dense log saved at provided filepath.
+
+    If filepath is a directory holding a columnar episode log (see
+    save_columnar_episode_log), return a memory-mapped ColumnarEpisodeLog reader."""
+    if is_columnar_episode_log(filepath):
+        return ColumnarEpisodeLog(filepath)
     with lz4.frame.open(filepath, mode="rb") as log_file:
         log_bytes = log_file.read()
     return json.loads(log_bytes)
 
 
+def save_columnar_episode_log(game_object, dirpath):
+    """Save the dense log stored in the provided game object to the directory
+    dirpath, in the binary columnar format (see episode_log.py)"""
+    assert isinstance(game_object, BaseEnvironment)
+    write_columnar_episode_log(game_object.previous_episode_dense_log, dirpath)
+
+
+def convert_episode_log(filepath, dirpath):
+    """Convert the lz4 compressed dense log saved at filepath into the binary
+    columnar format, saved to the directory dirpath"""
+    write_columnar_episode_log(load_episode_log(filepath), dirpath)
+
+
+def replay_episode(game_object, replay_log, force_dense_logging=True):
+    """Re-run an episode from its replay log and return the resulting dense log.
+
+    Works with both the full-RNG-state replay logs and the compact (episode seed)
+    replay logs; see BaseEnvironment.previous_episode_replay_log.
+
+    Args:
+        game_object (BaseEnvironment): The environment to replay the episode with.
+            Must be constructed with the same configuration as the environment that
+            generated replay_log.
+        replay_log (dict): The replay log of the episode to reproduce.
+        force_dense_logging (bool): Whether to create a dense log of the replay.
+
+    Returns:
+        The dense log of the replayed episode (None if dense logging was off).
+        Metrics are available afterwards through game_object.previous_episode_metrics.
+    """
+    assert isinstance(game_object, BaseEnvironment)
+    _ = game_object.reset(
+        force_dense_logging=force_dense_logging, **replay_log["reset"]
+    )
+    for replay_step in replay_log["step"]:
+        _ = game_object.step(**replay_step)
+    if not force_dense_logging:
+        return None
+    return game_object.previous_episode_dense_log
+
+
 def verify_activation_code():
     """
     Validate the user's activation code.
@@ -0,0 +1,221 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+The batched (multi-environment) CPU env wrapper class
+"""
+
+from copy import deepcopy
+
+import numpy as np
+
+from ai_economist.foundation.base.base_env import BaseEnvironment
+from ai_economist.foundation.scenarios import scenario_registry
+
+
+def stack_across_env_dimension(list_of_dicts):
+    """Recursively stack a list of (nested) dictionaries, one per environment,
+    into a single dictionary whose leaves carry a leading env dimension.
+
+    Args:
+        list_of_dicts (list): A list of dictionaries sharing the same (nested) keys,
+            such as the observation dictionaries returned by N environments.
+
+    Returns:
+        dict: A dictionary with the same (nested) keys, where each leaf is a numpy
+            array of shape (N, ...) stacking the corresponding leaves.
+    """
+    assert len(list_of_dicts) > 0
+    stacked = {}
+    for k, v in list_of_dicts[0].items():
+        if isinstance(v, dict):
+            stacked[k] = stack_across_env_dimension([d[k] for d in list_of_dicts])
+        else:
+            stacked[k] = np.stack([np.asarray(d[k]) for d in list_of_dicts], axis=0)
+    return stacked
+
+
+class VectorizedFoundationEnv:
+    """
+    Holds N independent copies of a Foundation scenario and steps them all in one
+    call. Observations, rewards and dones are returned as stacked numpy arrays with a
+    leading env dimension, so that CPU rollout workers do not need to handle one
+    dictionary per environment.
+
+    Each environment copy keeps the regular BaseEnvironment reset/step semantics.
+    Note that all copies draw from the (global) numpy and built-in RNGs, so seeding
+    this object and then stepping it is equivalent to stepping the N environments
+    sequentially, in index order.
+
+    Example:
+        vec_env = VectorizedFoundationEnv(env_config=env_config, num_envs=8)
+        obs = vec_env.reset()
+        # obs["0"]["flat"].shape == (8, ...)
+
+        actions = {"0": np.zeros(8, dtype=np.int32), ...}
+        obs, rew, done, info = vec_env.step(actions)
+        # rew["0"].shape == (8,) and done.shape == (8,)
+
+    Args:
+        env_config (dict): Environment configuration, including the "scenario_name"
+            key, used to instantiate each of the environment copies (see
+            foundation.make_env_instance).
+        env_objs (list): Alternatively, a list of already constructed environment
+            objects. Only one of env_config and env_objs may be provided.
+        num_envs (int): The number of environment copies to instantiate from
+            env_config. Ignored if env_objs is provided.
+        auto_reset (bool): Whether to automatically reset the environments that are
+            done at the end of a step. If True, the observations returned by step()
+            for those environments are the observations after the reset, and the
+            final observations are stored in info[env_id]["terminal_observation"].
+    """
+
+    def __init__(self, env_config=None, env_objs=None, num_envs=1, auto_reset=True):
+        assert (env_config is None) != (
+            env_objs is None
+        ), "Provide either an env_config or a list of env_objs (but not both)."
+        if env_objs is not None:
+            assert isinstance(env_objs, (tuple, list))
+            self.envs = list(env_objs)
+        else:
+            assert isinstance(env_config, dict)
+            assert "scenario_name" in env_config
+            num_envs = int(num_envs)
+            assert num_envs >= 1
+            env_kwargs = deepcopy(env_config)
+            scenario_class = scenario_registry.get(env_kwargs.pop("scenario_name"))
+            self.envs = [
+                scenario_class(**deepcopy(env_kwargs)) for _ in range(num_envs)
+            ]
+
+        assert len(self.envs) > 0
+        for env in self.envs:
+            assert isinstance(env, BaseEnvironment)
+        assert len({env.name for env in self.envs}) == 1
+        self.name = self.envs[0].name
+
+        self.n_envs = len(self.envs)
+        self.n_agents = self.envs[0].num_agents
+        self.episode_length = self.envs[0].episode_length
+        self.auto_reset = bool(auto_reset)
+
+        # The most recent (unstacked) observations and done flags of each env
+        self._last_obs = [None for _ in range(self.n_envs)]
+        self._dones = np.zeros(self.n_envs, dtype=bool)
+
+    @property
+    def dones(self):
+        """Boolean array with the done flag of each environment."""
+        return self._dones
+
+    @staticmethod
+    def seed(seed):
+        """Sets the numpy and built-in random number generator seed, which is shared
+        by all the environment copies (see BaseEnvironment.seed)."""
+        BaseEnvironment.seed(seed)
+
+    def get_env(self, env_id):
+        """Return the environment object with index env_id."""
+        return self.envs[env_id]
+
+    def _split_actions(self, actions):
+        """Convert batched actions into a list of per-environment action dicts.
+
+        Actions may be given as a list of N action dictionaries (one per env) or as
+        a single dictionary of {agent_idx: batched_action}, where batched_action
+        has a leading env dimension.
+        """
+        if actions is None:
+            return [None for _ in range(self.n_envs)]
+        if isinstance(actions, (tuple, list)):
+            assert len(actions) == self.n_envs
+            return list(actions)
+        assert isinstance(actions, dict)
+        env_actions = [{} for _ in range(self.n_envs)]
+        for agent_idx, batched_action in actions.items():
+            batched_action = np.asarray(batched_action)
+            assert batched_action.shape[0] == self.n_envs
+            for env_id in range(self.n_envs):
+                action = batched_action[env_id]
+                env_actions[env_id][agent_idx] = (
+                    action.tolist() if action.ndim > 0 else int(action)
+                )
+        return env_actions
+
+    def reset_all_envs(self):
+        """
+        Reset every environment to initialize a new episode.
+
+        Returns:
+            obs (dict): The stacked observations of all the environments.
+        """
+        self._last_obs = [env.reset() for env in self.envs]
+        self._dones[:] = False
+        return stack_across_env_dimension(self._last_obs)
+
+    def reset_only_done_envs(self):
+        """
+        Reset only the environments whose done flag is True. The remaining
+        environments are left untouched.
+
+        Returns:
+            obs (dict): The stacked observations of all the environments, where the
+                environments that were reset contribute their reset observations.
+        """
+        for env_id in np.flatnonzero(self._dones):
+            self._last_obs[env_id] = self.envs[env_id].reset()
+            self._dones[env_id] = False
+        return stack_across_env_dimension(self._last_obs)
+
+    def step_all_envs(self, actions=None):
+        """
+        Step through all the environments.
+
+        Args:
+            actions (dict or list): Either a dictionary of {agent_idx: actions}, where
+                the actions array has a leading env dimension, or a list with one
+                action dictionary per environment.
+
+        Returns:
+            obs (dict): The stacked observations of all the environments.
+            rew (dict): A dictionary of {agent_idx: rewards}, where rewards is an
+                array with a leading env dimension.
+            done (np.ndarray): Boolean array of shape (num_envs,).
+            info (list): The info dictionaries of each of the environments.
+        """
+        assert self._last_obs[0] is not None, "Please reset the environments first."
+        env_actions = self._split_actions(actions)
+
+        rews = []
+        infos = []
+        for env_id, env in enumerate(self.envs):
+            obs, rew, done, info = env.step(env_actions[env_id])
+            self._last_obs[env_id] = obs
+            self._dones[env_id] = done["__all__"]
+            rews.append(rew)
+            infos.append(info)
+
+        dones = self._dones.copy()
+        if self.auto_reset and dones.any():
+            for env_id in np.flatnonzero(dones):
+                infos[env_id]["terminal_observation"] = deepcopy(self._last_obs[env_id])
+            obs = self.reset_only_done_envs()
+        else:
+            obs = stack_across_env_dimension(self._last_obs)
+
+        return obs, stack_across_env_dimension(rews), dones, infos
+
+    def reset(self):
+        """
+        Alias for reset_all_envs() (conforms to gym-style)
+        """
+        return self.reset_all_envs()
+
+    def step(self, actions=None):
+        """
+        Alias for step_all_envs() (conforms to gym-style)
+        """
+        return self.step_all_envs(actions)
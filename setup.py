@@ -22,7 +22,8 @@ setuptools.setup(
             "foundation/scenarios/covid19/*.cu",
             "foundation/scenarios/covid19/key_to_check_activation_code_against",
             "foundation/components/*.cu",
-            "datasets/covid19_datasets/data_and_fitted_params/*"
+            "datasets/covid19_datasets/data_and_fitted_params/*",
+            "datasets/filecoin_datasets/*.csv",
         ],
     },
     include_package_data=True,
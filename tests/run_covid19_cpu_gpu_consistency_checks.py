@@ -5,41 +5,24 @@
 # or https://opensource.org/licenses/BSD-3-Clause
 
 """
-Consistency tests for comparing the cuda (gpu) / no cuda (cpu) version
+Consistency tests for comparing the cuda (gpu) / no cuda (cpu) version, and the
+batched (multi-env) cpu version (and parameter sweeps) / single-env cpu version
 """
 
-import GPUtil
-
-try:
-    num_gpus_available = len(GPUtil.getAvailable())
-    assert num_gpus_available > 0, "The env consistency checker needs a GPU to run!"
-    print(
-        f"Inside env_cpu_gpu_consistency_checker.py: "
-        f"{num_gpus_available} GPUs are available."
-    )
-    from warp_drive.utils.env_registrar import EnvironmentRegistrar
-    from warp_drive.env_cpu_gpu_consistency_checker import EnvironmentCPUvsGPU
-except ModuleNotFoundError:
-    raise ModuleNotFoundError(
-        "The env consistency checker requires the 'WarpDrive' package, please run "
-        "'pip install rl-warp-drive' first."
-    ) from None
-except ValueError:
-    raise ValueError("The env consistency checker needs a GPU to run!") from None
-
 import os
 
-from ai_economist.foundation.env_wrapper import FoundationEnvWrapper
+import GPUtil
+import numpy as np
+
+from ai_economist.foundation.scenarios.covid19.covid19_batched_env import (
+    BatchedCovidAndEconomyEnvironment,
+    run_parameter_sweep,
+)
 from ai_economist.foundation.scenarios.covid19.covid19_env import (
     CovidAndEconomyEnvironment,
 )
+from ai_economist.foundation.vectorized_env_wrapper import VectorizedFoundationEnv
 
-env_registrar = EnvironmentRegistrar()
-this_file_dir = os.path.dirname(os.path.abspath(__file__))
-env_registrar.add_cuda_env_src_path(
-    CovidAndEconomyEnvironment.name,
-    os.path.join(this_file_dir, "../ai_economist/foundation/scenarios/covid19/covid19_build.cu")
-)
 env_configs = {
     "test1": {
         "collate_agent_step_and_reset_data": True,
@@ -80,22 +63,261 @@ env_configs = {
     }
 }
 
-num_agents = env_configs["test1"]["n_agents"]
-policy_to_agent_ids_mapping = {
-    "a": [str(agent_id) for agent_id in range(num_agents)],
-    "p": ["p"],
-}
 
-testing_class = EnvironmentCPUvsGPU(
-    dual_mode_env_class=CovidAndEconomyEnvironment,
-    env_configs=env_configs,
-    num_envs=3,
-    num_episodes=2,
-    env_wrapper=FoundationEnvWrapper,
-    env_registrar=env_registrar,
-    policy_tag_to_agent_id_map=policy_to_agent_ids_mapping,
-    create_separate_placeholders_for_each_policy=True,
-    obs_dim_corresponding_to_num_agents="last"
-)
+def assert_all_close(x, y, path=""):
+    """Recursively check that the (nested) dictionaries x and y match (up to floating
+    point rounding: e.g., NumPy may evaluate batched operations to within an ulp of
+    the unbatched ones)."""
+    if isinstance(x, dict):
+        assert sorted(x.keys()) == sorted(y.keys()), path
+        for k in x:
+            assert_all_close(x[k], y[k], path + "/" + str(k))
+    else:
+        np.testing.assert_allclose(
+            np.asarray(x, dtype=np.float64),
+            np.asarray(y, dtype=np.float64),
+            rtol=1e-5,
+            atol=1e-6,
+            err_msg=path,
+        )
+
+
+def sample_actions(obs, rng):
+    """Sample random agent and planner actions (for each env) that are allowed by
+    the action masks."""
+    agent_mask = obs["a"]["action_mask"]
+    num_envs, _, n_agents = agent_mask.shape
+    agent_actions = rng.randint(agent_mask.shape[1], size=(num_envs, n_agents))
+    agent_actions *= np.take_along_axis(agent_mask, agent_actions[:, None], axis=1)[
+        :, 0
+    ].astype(agent_actions.dtype)
+    planner_mask = obs["p"]["action_mask"]
+    planner_actions = rng.randint(planner_mask.shape[1], size=num_envs)
+    planner_actions *= planner_mask[np.arange(num_envs), planner_actions].astype(
+        planner_actions.dtype
+    )
+    return {"a": agent_actions, "p": planner_actions}
+
+
+def step_env(env, actions):
+    """Step a batched (BatchedCovidAndEconomyEnvironment) or vectorized
+    (VectorizedFoundationEnv) environment."""
+    if isinstance(env, VectorizedFoundationEnv):
+        agent_actions, planner_actions = actions["a"], actions["p"]
+        actions = {
+            str(agent_id): agent_actions[:, agent_id]
+            for agent_id in range(agent_actions.shape[1])
+        }
+        actions["p"] = planner_actions
+    return env.step(actions)
+
+
+def run_cpu_consistency_checks(env, reference_env, num_episodes=2, seed=0):
+    """
+    Step two (batched or vectorized) cpu environments with the same (random, masked)
+    actions, and check that their observations and rewards match.
+    """
+    rng = np.random.RandomState(seed)
+    obs = env.reset()
+    assert_all_close(obs, reference_env.reset(), "reset")
+    for episode in range(num_episodes):
+        for t in range(env.episode_length):
+            actions = sample_actions(obs, rng)
+            obs, rew, done, info = step_env(env, actions)
+            ref_obs, ref_rew, ref_done, ref_info = step_env(reference_env, actions)
+
+            step = "episode {} step {}".format(episode, t + 1)
+            assert_all_close(obs, ref_obs, step + " obs")
+            assert_all_close(rew, ref_rew, step + " rew")
+            np.testing.assert_array_equal(done, ref_done)
+            if done.all():
+                for env_id in range(len(done)):
+                    assert_all_close(
+                        info[env_id]["terminal_observation"],
+                        ref_info[env_id]["terminal_observation"],
+                        step + " terminal obs",
+                    )
+
+
+def run_cpu_batched_vs_cpu_consistency_checks(env_config, num_envs=3):
+    """
+    Check the batched cpu environment against num_envs single-env cpu environments.
+    """
+    run_cpu_consistency_checks(
+        BatchedCovidAndEconomyEnvironment(env_config, num_envs=num_envs),
+        VectorizedFoundationEnv(
+            env_config=dict(env_config, scenario_name=CovidAndEconomyEnvironment.name),
+            num_envs=num_envs,
+        ),
+    )
+    print("The batched cpu and single-env cpu versions are consistent.")
+
+
+def run_recursive_vs_convolution_unemployment_checks(env_config, num_envs=3):
+    """
+    Check the single-env cpu environments using the recursive unemployment filter
+    against the ones convolving the unemployment filters over full episodes.
+    """
+    env_config = dict(env_config, scenario_name=CovidAndEconomyEnvironment.name)
+    run_cpu_consistency_checks(
+        VectorizedFoundationEnv(
+            env_config=dict(env_config, use_recursive_unemployment_filter=True),
+            num_envs=num_envs,
+        ),
+        VectorizedFoundationEnv(
+            env_config=dict(env_config, use_recursive_unemployment_filter=False),
+            num_envs=num_envs,
+        ),
+    )
+    print("The recursive and convolution unemployment filters are consistent.")
+
+
+def run_parameter_sweep_checks(env_config, seed=0):
+    """
+    Check a (batched) parameter sweep against single-env cpu environments, each
+    with one of the parameter modulation settings, receiving the same actions.
+    """
+    env_kwargs = dict(env_config)
+    env_kwargs.pop("scenario_name", None)
+    rng = np.random.RandomState(seed)
+    episode_length = env_kwargs["episode_length"]
+    n_agents = env_kwargs["n_agents"]
+    agent_actions = rng.randint(11, size=(episode_length, n_agents))
+    planner_actions = rng.randint(21, size=episode_length)
+
+    results = run_parameter_sweep(
+        env_kwargs,
+        beta_intercept=[0.9, 1.1],
+        beta_slope=1.15,
+        unemployment=[0.8, 1.0],
+        agent_actions=agent_actions,
+        planner_actions=planner_actions,
+        max_num_envs=3,
+    )
+
+    for setting in range(len(results["planner_reward"])):
+        env = CovidAndEconomyEnvironment(**env_kwargs)
+        env.reset()
+        env.set_parameter_modulations(
+            beta_intercept=results["beta_intercept"][setting],
+            beta_slope=results["beta_slope"][setting],
+            unemployment=results["unemployment"][setting],
+        )
+        agent_reward = np.zeros(n_agents)
+        planner_reward = 0.0
+        for t in range(episode_length):
+            actions = {
+                str(agent_id): agent_actions[t, agent_id]
+                for agent_id in range(n_agents)
+            }
+            actions["p"] = planner_actions[t]
+            _, rew, _, _ = env.step(actions)
+            agent_reward += rew["a"]
+            planner_reward += rew["p"]
+
+        planner_state = env.world.planner.state
+        assert_all_close(
+            {
+                "agent_health_index": env.world.get_agent_state_column("Health Index")[
+                    :, 0
+                ],
+                "agent_economic_index": env.world.get_agent_state_column(
+                    "Economic Index"
+                )[:, 0],
+                "planner_health_index": planner_state["Health Index"][0],
+                "planner_economic_index": planner_state["Economic Index"][0],
+                "agent_reward": agent_reward,
+                "planner_reward": planner_reward,
+            },
+            {
+                k: v[setting]
+                for k, v in results.items()
+                if k not in ["beta_intercept", "beta_slope", "unemployment"]
+            },
+            "setting {}".format(setting),
+        )
+    print("The parameter sweep and single-env cpu versions are consistent.")
+
+
+def run_cpu_vs_gpu_consistency_checks(env_configs, num_envs=3, num_episodes=2):
+    """
+    Compare the cuda (gpu) and no cuda (cpu) versions using WarpDrive.
+    """
+    from warp_drive.env_cpu_gpu_consistency_checker import EnvironmentCPUvsGPU
+    from warp_drive.utils.env_registrar import EnvironmentRegistrar
+
+    from ai_economist.foundation.env_wrapper import FoundationEnvWrapper
+
+    env_registrar = EnvironmentRegistrar()
+    this_file_dir = os.path.dirname(os.path.abspath(__file__))
+    env_registrar.add_cuda_env_src_path(
+        CovidAndEconomyEnvironment.name,
+        os.path.join(
+            this_file_dir,
+            "../ai_economist/foundation/scenarios/covid19/covid19_build.cu",
+        ),
+    )
+
+    num_agents = env_configs["test1"]["n_agents"]
+    policy_to_agent_ids_mapping = {
+        "a": [str(agent_id) for agent_id in range(num_agents)],
+        "p": ["p"],
+    }
+
+    testing_class = EnvironmentCPUvsGPU(
+        dual_mode_env_class=CovidAndEconomyEnvironment,
+        env_configs=env_configs,
+        num_envs=num_envs,
+        num_episodes=num_episodes,
+        env_wrapper=FoundationEnvWrapper,
+        env_registrar=env_registrar,
+        policy_tag_to_agent_id_map=policy_to_agent_ids_mapping,
+        create_separate_placeholders_for_each_policy=True,
+        obs_dim_corresponding_to_num_agents="last",
+    )
+
+    testing_class.test_env_reset_and_step()
+
+
+if __name__ == "__main__":
+    # The batched cpu version is checked against the single-env cpu version
+    # (this does not need a GPU)
+    for env_config in env_configs.values():
+        run_cpu_batched_vs_cpu_consistency_checks(env_config)
+        run_recursive_vs_convolution_unemployment_checks(env_config)
+        run_cpu_batched_vs_cpu_consistency_checks(
+            dict(env_config, use_recursive_unemployment_filter=True)
+        )
+        for use_recursive_unemployment_filter in [False, True]:
+            run_parameter_sweep_checks(
+                dict(
+                    env_config,
+                    use_recursive_unemployment_filter=use_recursive_unemployment_filter,
+                )
+            )
+        # (The real-world policies are only available for 437 days from the start
+        # date)
+        real_world_policies_env_config = dict(
+            env_config, use_real_world_policies=True, episode_length=360
+        )
+        run_cpu_batched_vs_cpu_consistency_checks(real_world_policies_env_config)
+        run_parameter_sweep_checks(real_world_policies_env_config)
 
-testing_class.test_env_reset_and_step()
+    try:
+        num_gpus_available = len(GPUtil.getAvailable())
+    except ValueError:
+        num_gpus_available = 0
+    if num_gpus_available == 0:
+        print("No GPUs found! Skipping the cpu vs gpu consistency checks.")
+    else:
+        print(
+            f"Inside env_cpu_gpu_consistency_checker.py: "
+            f"{num_gpus_available} GPUs are available."
+        )
+        try:
+            run_cpu_vs_gpu_consistency_checks(env_configs)
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError(
+                "The cpu vs gpu consistency checker requires the 'WarpDrive' "
+                "package, please run 'pip install rl-warp-drive' first."
+            ) from None
@@ -0,0 +1,442 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Micro-benchmarks for the CPU simulation code paths.
+
+Usage:
+    python tests/run_cpu_benchmarks.py
+"""
+
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+
+import ai_economist
+from ai_economist import foundation
+from ai_economist.foundation.components.utils import RingBuffer
+from ai_economist.foundation.scenarios.covid19.covid19_batched_env import (
+    BatchedCovidAndEconomyEnvironment,
+    run_parameter_sweep,
+)
+from ai_economist.foundation.scenarios.utils import rewards
+from ai_economist.foundation.vectorized_env_wrapper import VectorizedFoundationEnv
+
+
+def report(name, seconds, num_calls):
+    """Print the average time per call."""
+    print(f"{name:<60s} {1e3 * seconds / num_calls:10.4f} ms / call")
+
+
+def benchmark_vectorized_env(num_envs=16, num_steps=50):
+    """Compare the batched env against N sequential env.step calls."""
+    env_config = {
+        "scenario_name": "uniform/simple_wood_and_stone",
+        "components": [
+            {"Build": {}},
+            {"ContinuousDoubleAuction": {"max_num_orders": 5}},
+            {"Gather": {}},
+        ],
+        "n_agents": 4,
+        "world_size": [25, 25],
+        "episode_length": 1000,
+        "flatten_observations": True,
+        "flatten_masks": True,
+    }
+    print(f"\n[VectorizedFoundationEnv] num_envs={num_envs}")
+
+    vec_env = VectorizedFoundationEnv(
+        env_config=env_config, num_envs=num_envs, auto_reset=True
+    )
+    agents = vec_env.get_env(0).all_agents
+    actions = {
+        agent.idx: np.zeros(
+            (
+                (num_envs,) + np.shape(agent.action_spaces)
+                if agent.multi_action_mode
+                else num_envs
+            ),
+            dtype=np.int32,
+        )
+        for agent in agents
+    }
+
+    vec_env.reset()
+    seconds = timeit.timeit(lambda: vec_env.step(actions), number=num_steps)
+    report("batched step (stacked outputs)", seconds, num_steps)
+
+    seq_envs = [vec_env.get_env(env_id) for env_id in range(num_envs)]
+    seq_actions = [
+        {k: v[env_id].tolist() for k, v in actions.items()}
+        for env_id in range(num_envs)
+    ]
+    for env in seq_envs:
+        env.reset()
+
+    def sequential_step():
+        return [env.step(seq_actions[env_id]) for env_id, env in enumerate(seq_envs)]
+
+    seconds = timeit.timeit(sequential_step, number=num_steps)
+    report("N sequential env.step calls", seconds, num_steps)
+
+
+def benchmark_dense_logging(n_agents=20, episode_length=500):
+    """Time an episode with and without dense logging, and the conversion of the
+    dense log into its nested list/dict format."""
+    env = foundation.make_env_instance(
+        scenario_name="uniform/simple_wood_and_stone",
+        components=[
+            {"Build": {}},
+            {"ContinuousDoubleAuction": {"max_num_orders": 5}},
+            {"Gather": {}},
+        ],
+        n_agents=n_agents,
+        world_size=[40, 40],
+        episode_length=episode_length,
+        world_dense_log_frequency=1,
+    )
+    print(f"\n[Dense logging] n_agents={n_agents}")
+    for force_dense_logging in [False, True]:
+        env.reset(force_dense_logging=force_dense_logging)
+        seconds = timeit.timeit(lambda: env.step({}), number=episode_length)
+        report(f"step (dense logging={force_dense_logging})", seconds, episode_length)
+    seconds = timeit.timeit(lambda: env.previous_episode_dense_log, number=1)
+    report("previous_episode_dense_log (first access)", seconds, 1)
+
+
+def benchmark_maps(world_size=(100, 100), n_agents=100, num_calls=1000):
+    """Time the map queries used during observation generation and resets."""
+    env = foundation.make_env_instance(
+        scenario_name="uniform/simple_wood_and_stone",
+        components=[{"Build": {}}, {"Gather": {}}],
+        n_agents=n_agents,
+        world_size=list(world_size),
+        episode_length=1000,
+    )
+    env.reset()
+    maps = env.world.maps
+    print(f"\n[Maps] world_size={world_size}, n_agents={n_agents}")
+    for name in ["state", "empty", "accessibility"]:
+        seconds = timeit.timeit(lambda: getattr(maps, name), number=num_calls)
+        report(f"maps.{name}", seconds, num_calls)
+    seconds = timeit.timeit(lambda: env.world.loc_map, number=num_calls)
+    report("world.loc_map", seconds, num_calls)
+    gather = env.get_component("Gather")
+    seconds = timeit.timeit(gather.generate_masks, number=num_calls)
+    report("Gather.generate_masks", seconds, num_calls)
+
+    def build_and_remove():
+        maps.set_point("House", 0, 0, 1, owner=0)
+        _ = maps.accessibility, maps.empty
+        maps.set_point("House", 0, 0, 0, owner=0)
+        _ = maps.accessibility, maps.empty
+
+    seconds = timeit.timeit(build_and_remove, number=num_calls)
+    report("set_point(House) + accessibility + empty (x2)", seconds, num_calls)
+
+
+def benchmark_observations(world_size=(100, 100), n_agents=100, num_calls=200):
+    """Time the observation generation of the Uniform scenario."""
+    env = foundation.make_env_instance(
+        scenario_name="uniform/simple_wood_and_stone",
+        components=[{"Build": {}}, {"Gather": {}}],
+        n_agents=n_agents,
+        world_size=list(world_size),
+        episode_length=1000,
+        full_observability=False,
+        mobile_agent_observation_range=5,
+    )
+    env.reset()
+    print(f"\n[Observations] world_size={world_size}, n_agents={n_agents}")
+    seconds = timeit.timeit(env.generate_observations, number=num_calls)
+    report("Uniform.generate_observations (partial observability)", seconds, num_calls)
+
+
+def benchmark_market(n_agents=100, num_steps=200):
+    """Time the ContinuousDoubleAuction step, observations and masks with many agents
+    and open orders."""
+    env = foundation.make_env_instance(
+        scenario_name="uniform/simple_wood_and_stone",
+        components=[{"Gather": {}}, {"ContinuousDoubleAuction": {}}],
+        n_agents=n_agents,
+        world_size=[25, 25],
+        episode_length=num_steps,
+        starting_agent_coin=10000,
+        multi_action_mode_agents=True,
+    )
+    env.reset()
+    cda = env.get_component("ContinuousDoubleAuction")
+    for agent in env.world.agents:
+        for resource in cda.commodities:
+            agent.state["inventory"][resource] = 10000
+
+    # Random prices, with more asks than bids at high prices (so that many orders
+    # stay open)
+    rng = np.random.RandomState(0)
+    actions = [
+        {
+            agent.idx: {
+                "{}_{}".format(side, resource): rng.randint(low, high)
+                for resource in cda.commodities
+                for side, low, high in [("Buy", 0, 7), ("Sell", 4, 12)]
+            }
+            for agent in env.world.agents
+        }
+        for _ in range(num_steps)
+    ]
+
+    timesteps = itertools.cycle(range(num_steps))
+
+    def market_step():
+        t = next(timesteps)
+        for agent in env.world.agents:
+            for k, v in actions[t][agent.idx].items():
+                agent.action[cda.name + "." + k] = v
+        cda.component_step()
+
+    print(f"\n[ContinuousDoubleAuction] n_agents={n_agents}, max_num_orders=None")
+    seconds = timeit.timeit(market_step, number=num_steps)
+    report("ContinuousDoubleAuction.component_step", seconds, num_steps)
+    seconds = timeit.timeit(cda.generate_observations, number=num_steps)
+    report("ContinuousDoubleAuction.generate_observations", seconds, num_steps)
+    seconds = timeit.timeit(cda.generate_masks, number=num_steps)
+    report("ContinuousDoubleAuction.generate_masks", seconds, num_steps)
+
+
+def benchmark_saez(buffer_sizes=(500, 50000, 500000), n_bins=(100, 1000), number=5):
+    """Time the Saez tax schedule computation for several buffer sizes and numbers
+    of income bins."""
+    env = foundation.make_env_instance(
+        scenario_name="uniform/simple_wood_and_stone",
+        components=[{"Gather": {}}, {"PeriodicBracketTax": {"tax_model": "saez"}}],
+        n_agents=4,
+        world_size=[10, 10],
+        episode_length=10,
+    )
+    tax = env.get_component("PeriodicBracketTax")
+    rng = np.random.RandomState(0)
+
+    print("\n[PeriodicBracketTax] Saez schedule")
+    for n_bin in n_bins:
+        tax._saez_income_bin_edges = np.linspace(
+            0, tax._saez_top_rate_cutoff, n_bin + 1
+        )
+        tax._saez_income_bin_sizes = np.concatenate(
+            [np.diff(tax._saez_income_bin_edges), [np.inf]]
+        )
+        for buffer_size in buffer_sizes:
+            incomes = rng.exponential(tax._saez_top_rate_cutoff / 4, buffer_size)
+            rates = rng.uniform(0, 0.5, buffer_size)
+            tax._local_saez_buffer = RingBuffer(buffer_size, 2)
+            tax._local_saez_buffer.append(np.stack([incomes, rates], axis=1))
+            tax._reached_min_samples = True
+            seconds = timeit.timeit(
+                tax.compute_and_set_new_period_rates_from_saez_formula, number=number
+            )
+            report(
+                f"saez schedule, buffer={buffer_size}, bins={n_bin}", seconds, number
+            )
+
+
+def benchmark_rewards(n_agents=(10, 100, 1000), num_calls=200):
+    """Time the scenario rewards (with and without the agent state table), and the
+    batched Filecoin miner rewards against a per-agent loop."""
+    for n in n_agents:
+        print(f"\n[Rewards] n_agents={n}")
+        for use_agent_state_table in [False, True]:
+            env = foundation.make_env_instance(
+                scenario_name="uniform/simple_wood_and_stone",
+                components=[{"Build": {}}, {"Gather": {}}],
+                n_agents=n,
+                world_size=[100, 100],
+                episode_length=1000,
+                planner_reward_type="inv_income_weighted_utility",
+                use_agent_state_table=use_agent_state_table,
+            )
+            env.reset()
+            seconds = timeit.timeit(env.compute_reward, number=num_calls)
+            report(
+                f"Uniform.compute_reward (table={use_agent_state_table})",
+                seconds,
+                num_calls,
+            )
+
+        rng = np.random.RandomState(0)
+        new_data = 1024.0 * (rng.rand(n) < 0.1)
+        total_data = 1024.0 * rng.randint(100, size=n)
+        energy_price = rng.uniform(0.05, 0.3, n)
+        rec_costs = rng.uniform(0, 1, n)
+        columns = [new_data, total_data, energy_price, rec_costs]
+        rows = list(zip(*[c.tolist() for c in columns]))
+
+        seconds = timeit.timeit(
+            lambda: [rewards.filecoin_minus_energy_costs(*row) for row in rows],
+            number=num_calls,
+        )
+        report("filecoin_minus_energy_costs (per agent)", seconds, num_calls)
+        seconds = timeit.timeit(
+            lambda: rewards.filecoin_minus_energy_costs(*columns), number=num_calls
+        )
+        report("filecoin_minus_energy_costs (batched)", seconds, num_calls)
+
+
+def benchmark_filecoin(n_agents=(100, 1000, 10000), num_steps=20):
+    """Time the FilecoinEnergy scenario step, REC purchases, observations and rewards
+    with many miners."""
+    for n in n_agents:
+        env = foundation.make_env_instance(
+            scenario_name="filecoin-energy",
+            components=[
+                ("ChangeMinerSelectionPolicy", {}),
+                ("BuyRECFromVirtualStore", {}),
+            ],
+            n_agents=n,
+            world_size=[1, 1],
+            episode_length=1000,
+            multi_action_mode_agents=False,
+            multi_action_mode_planner=False,
+            flatten_observations=False,
+        )
+        print(f"\n[FilecoinEnergy] n_agents={n}")
+        seconds = timeit.timeit(env.reset, number=num_steps)
+        report("FilecoinEnergy.reset", seconds, num_steps)
+        seconds = timeit.timeit(env.scenario_step, number=num_steps)
+        report("FilecoinEnergy.scenario_step", seconds, num_steps)
+        rec_purchase = env.get_component("BuyRecFromVirtualStore")
+        seconds = timeit.timeit(rec_purchase.component_step, number=num_steps)
+        report("BuyRECFromVirtualStore.component_step", seconds, num_steps)
+        seconds = timeit.timeit(env.generate_observations, number=num_steps)
+        report("FilecoinEnergy.generate_observations", seconds, num_steps)
+        seconds = timeit.timeit(env.compute_reward, number=num_steps)
+        report("FilecoinEnergy.compute_reward", seconds, num_steps)
+
+
+def benchmark_covid19(
+    filter_lens=(600, 6000), num_envs=16, num_steps=50, sweep_grid_size=10
+):
+    """Time the construction of COVID-19 envs (which share the loaded data), compare
+    the recursive unemployment filter against the convolution at increasing filter
+    lengths, the batched COVID-19 env against N env.step calls, and a parameter
+    sweep (replaying the real-world policies) against one env per setting."""
+    env_config = {
+        "scenario_name": "CovidAndEconomySimulation",
+        "collate_agent_step_and_reset_data": True,
+        "components": [
+            {"ControlUSStateOpenCloseStatus": {"action_cooldown_period": 28}},
+            {"FederalGovernmentSubsidy": {}},
+            {"VaccinationCampaign": {}},
+        ],
+        "episode_length": 540,
+        "flatten_masks": True,
+        "flatten_observations": False,
+        "multi_action_mode_agents": False,
+        "multi_action_mode_planner": False,
+        "n_agents": 51,
+        "world_size": [1, 1],
+    }
+    path_to_data_and_fitted_params = os.path.join(
+        os.path.dirname(ai_economist.__file__),
+        "datasets/covid19_datasets/data_and_fitted_params",
+    )
+
+    print(f"\n[CovidAndEconomySimulation] num_envs={num_envs}")
+    seconds = timeit.timeit(
+        lambda: foundation.make_env_instance(**env_config), number=num_envs
+    )
+    report("make_env_instance", seconds, num_envs)
+
+    for filter_len in filter_lens:
+        print(f"\n[CovidAndEconomySimulation] filter_len={filter_len}")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Copy the data and fitted parameters, with a different filter length
+            for filename in os.listdir(path_to_data_and_fitted_params):
+                shutil.copy(
+                    os.path.join(path_to_data_and_fitted_params, filename), tmp_dir
+                )
+            with open(os.path.join(tmp_dir, "fitted_params.json"), "r") as fp:
+                fitted_params = json.load(fp)
+            fitted_params["FILTER_LEN"] = filter_len
+            with open(os.path.join(tmp_dir, "fitted_params.json"), "w") as fp:
+                json.dump(fitted_params, fp)
+
+            for recursive in [False, True]:
+                env = foundation.make_env_instance(
+                    **env_config,
+                    path_to_data_and_fitted_params=tmp_dir,
+                    use_recursive_unemployment_filter=recursive,
+                )
+                env.reset()
+                seconds = timeit.timeit(lambda: env.step({}), number=num_steps)
+                report(
+                    "env.step ({} unemployment filter)".format(
+                        "recursive" if recursive else "convolution"
+                    ),
+                    seconds,
+                    num_steps,
+                )
+
+    print(f"\n[BatchedCovidAndEconomyEnvironment] num_envs={num_envs}")
+    env_config["use_recursive_unemployment_filter"] = True
+    batched_env = BatchedCovidAndEconomyEnvironment(env_config, num_envs=num_envs)
+    batched_env.reset()
+    actions = {
+        "a": np.zeros((num_envs, batched_env.n_agents), dtype=np.int32),
+        "p": np.zeros(num_envs, dtype=np.int32),
+    }
+    seconds = timeit.timeit(lambda: batched_env.step(actions), number=num_steps)
+    report("batched step (stacked outputs)", seconds, num_steps)
+
+    vec_env = VectorizedFoundationEnv(env_config=env_config, num_envs=num_envs)
+    vec_env.reset()
+    vec_actions = {
+        str(agent_id): actions["a"][:, agent_id]
+        for agent_id in range(batched_env.n_agents)
+    }
+    vec_actions["p"] = actions["p"]
+    seconds = timeit.timeit(lambda: vec_env.step(vec_actions), number=num_steps)
+    report("N env.step calls (VectorizedFoundationEnv)", seconds, num_steps)
+
+    num_settings = sweep_grid_size**3
+    print(f"\n[run_parameter_sweep] num_settings={num_settings}")
+    env_config = dict(env_config, use_real_world_policies=True, episode_length=360)
+    modulations = np.linspace(0.8, 1.2, sweep_grid_size)
+    seconds = timeit.timeit(
+        lambda: run_parameter_sweep(
+            env_config,
+            beta_intercept=modulations,
+            beta_slope=modulations,
+            unemployment=modulations,
+        ),
+        number=1,
+    )
+    report("run_parameter_sweep (per setting)", seconds, num_settings)
+
+    def run_setting():
+        env = foundation.make_env_instance(**env_config)
+        env.reset()
+        env.set_parameter_modulations(beta_intercept=0.9, beta_slope=1.1)
+        for _ in range(env.episode_length):
+            env.step({})
+
+    seconds = timeit.timeit(run_setting, number=num_envs)
+    report("one env per setting", seconds, num_envs)
+
+
+if __name__ == "__main__":
+    benchmark_vectorized_env()
+    benchmark_dense_logging()
+    benchmark_maps()
+    benchmark_observations()
+    benchmark_market()
+    benchmark_saez()
+    benchmark_rewards()
+    benchmark_filecoin()
+    benchmark_covid19()
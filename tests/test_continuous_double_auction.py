@@ -0,0 +1,239 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the ContinuousDoubleAuction component
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist import foundation
+
+
+class ReferenceOrderMatching:
+    """Sort-and-scan implementation of the order matching and expiration, used as
+    a reference for the order books of the component."""
+
+    def __init__(self, commodities, n_agents, order_duration):
+        self.n_agents = n_agents
+        self.order_duration = order_duration
+        self.bids = {c: [] for c in commodities}
+        self.asks = {c: [] for c in commodities}
+
+    def add_bid(self, resource, agent_idx, price):
+        self.bids[resource].append(
+            {"buyer": agent_idx, "bid": int(price), "bid_lifetime": 0}
+        )
+
+    def add_ask(self, resource, agent_idx, price):
+        self.asks[resource].append(
+            {"seller": agent_idx, "ask": int(price), "ask_lifetime": 0}
+        )
+
+    def match(self, resource):
+        trades = []
+        possible_match = [True for _ in range(self.n_agents)]
+        keep_checking = True
+        bids = sorted(
+            self.bids[resource],
+            key=lambda b: (b["bid"], b["bid_lifetime"]),
+            reverse=True,
+        )
+        asks = sorted(self.asks[resource], key=lambda a: (a["ask"], -a["ask_lifetime"]))
+        while any(possible_match) and keep_checking:
+            idx_bid, idx_ask = 0, 0
+            while True:
+                if idx_bid >= len(bids):
+                    keep_checking = False
+                    break
+                if not possible_match[bids[idx_bid]["buyer"]]:
+                    idx_bid += 1
+                elif idx_ask >= len(asks):
+                    possible_match[bids[idx_bid]["buyer"]] = False
+                    break
+                elif asks[idx_ask]["seller"] == bids[idx_bid]["buyer"]:
+                    idx_ask += 1
+                elif bids[idx_bid]["bid"] < asks[idx_ask]["ask"]:
+                    possible_match[bids[idx_bid]["buyer"]] = False
+                    break
+                else:
+                    bid = bids.pop(idx_bid)
+                    ask = asks.pop(idx_ask)
+                    trade = {"commodity": resource}
+                    trade.update(bid)
+                    trade.update(ask)
+                    if bid["bid_lifetime"] <= ask["ask_lifetime"]:
+                        trade["price"] = int(trade["ask"])
+                    else:
+                        trade["price"] = int(trade["bid"])
+                    trade["cost"] = trade["price"]
+                    trade["income"] = trade["price"]
+                    trades.append(trade)
+                    break
+        self.bids[resource] = bids
+        self.asks[resource] = asks
+        return trades
+
+    def expire(self):
+        for resource in self.bids:
+            for order in self.bids[resource]:
+                order["bid_lifetime"] += 1
+            for order in self.asks[resource]:
+                order["ask_lifetime"] += 1
+            self.bids[resource] = [
+                b
+                for b in self.bids[resource]
+                if b["bid_lifetime"] <= self.order_duration
+            ]
+            self.asks[resource] = [
+                a
+                for a in self.asks[resource]
+                if a["ask_lifetime"] <= self.order_duration
+            ]
+
+
+class TestContinuousDoubleAuction(unittest.TestCase):
+    """Unit test to check the order books against a reference implementation"""
+
+    def run_market(self, n_agents, max_num_orders, seed, n_steps=150):
+        env = foundation.make_env_instance(
+            scenario_name="uniform/simple_wood_and_stone",
+            components=[
+                {"Gather": {}},
+                {
+                    "ContinuousDoubleAuction": {
+                        "max_num_orders": max_num_orders,
+                        "order_duration": 15,
+                    }
+                }
+            ],
+            n_agents=n_agents,
+            world_size=[10, 10],
+            episode_length=n_steps,
+            starting_agent_coin=1000,
+        )
+        env.reset()
+        cda = env.get_component("ContinuousDoubleAuction")
+        for agent in env.world.agents:
+            for resource in cda.commodities:
+                agent.state["inventory"][resource] = 1000
+        reference = ReferenceOrderMatching(
+            cda.commodities, n_agents, cda.order_duration
+        )
+
+        rng = np.random.RandomState(seed)
+        n_trades = 0
+        for _ in range(n_steps):
+            for resource in cda.commodities:
+                for agent in env.world.agents:
+                    n_orders = cda.n_orders[resource][agent.idx]
+                    if rng.rand() < 0.3:
+                        price = rng.randint(cda.max_bid_ask + 1)
+                        cda.create_bid(resource, agent, price)
+                        if cda.n_orders[resource][agent.idx] > n_orders:
+                            reference.add_bid(resource, agent.idx, price)
+                    n_orders = cda.n_orders[resource][agent.idx]
+                    if rng.rand() < 0.3:
+                        price = rng.randint(cda.max_bid_ask + 1)
+                        cda.create_ask(resource, agent, price)
+                        if cda.n_orders[resource][agent.idx] > n_orders:
+                            reference.add_ask(resource, agent.idx, price)
+
+            cda.match_orders()
+            reference_trades = []
+            for resource in cda.commodities:
+                reference_trades += reference.match(resource)
+            self.assertEqual(cda.executed_trades[-1], reference_trades)
+            n_trades += len(reference_trades)
+
+            cda.remove_expired_orders()
+            reference.expire()
+            for resource in cda.commodities:
+                self.assertEqual(len(cda.bids[resource]), len(reference.bids[resource]))
+                self.assertEqual(len(cda.asks[resource]), len(reference.asks[resource]))
+        self.assertGreater(n_trades, 0)
+
+        # The histograms and their running totals are consistent with the open orders
+        for resource in cda.commodities:
+            for agent in env.world.agents:
+                bid_hist = np.zeros_like(cda.bid_hists[resource][agent.idx])
+                for o in reference.bids[resource]:
+                    if o["buyer"] == agent.idx:
+                        bid_hist[o["bid"] - cda.price_floor] += 1
+                ask_hist = np.zeros_like(cda.ask_hists[resource][agent.idx])
+                for o in reference.asks[resource]:
+                    if o["seller"] == agent.idx:
+                        ask_hist[o["ask"] - cda.price_floor] += 1
+                np.testing.assert_array_equal(
+                    cda.bid_hists[resource][agent.idx], bid_hist
+                )
+                np.testing.assert_array_equal(
+                    cda.ask_hists[resource][agent.idx], ask_hist
+                )
+                np.testing.assert_array_equal(
+                    cda.available_bids(resource, agent),
+                    sum(
+                        h
+                        for i, h in enumerate(cda.bid_hists[resource])
+                        if i != agent.idx
+                    ),
+                )
+                np.testing.assert_array_equal(
+                    cda.available_asks(resource, agent),
+                    sum(
+                        h
+                        for i, h in enumerate(cda.ask_hists[resource])
+                        if i != agent.idx
+                    ),
+                )
+
+        # The masks match the per-agent order limits and coin
+        masks = cda.generate_masks()
+        for agent in env.world.agents:
+            for resource in cda.commodities:
+                can_bid = cda.can_bid(resource, agent)
+                np.testing.assert_array_equal(
+                    masks[agent.idx]["Buy_{}".format(resource)],
+                    [
+                        int(can_bid and p <= agent.inventory["Coin"])
+                        for p in range(cda.max_bid_ask + 1)
+                    ],
+                )
+                np.testing.assert_array_equal(
+                    masks[agent.idx]["Sell_{}".format(resource)],
+                    np.ones(cda.max_bid_ask + 1) * cda.can_ask(resource, agent),
+                )
+
+        # All the escrow is accounted for by the open orders
+        for agent in env.world.agents:
+            for resource in cda.commodities:
+                self.assertEqual(
+                    agent.state["escrow"][resource],
+                    sum(o["seller"] == agent.idx for o in reference.asks[resource]),
+                )
+            self.assertEqual(
+                agent.state["escrow"]["Coin"],
+                sum(
+                    o["bid"]
+                    for resource in cda.commodities
+                    for o in reference.bids[resource]
+                    if o["buyer"] == agent.idx
+                ),
+            )
+
+    def test_matches_reference_with_order_limit(self):
+        """Trades match the reference with a limit on the number of open orders."""
+        self.run_market(n_agents=10, max_num_orders=3, seed=0)
+
+    def test_matches_reference_without_order_limit(self):
+        """Trades match the reference with many agents and open orders."""
+        self.run_market(n_agents=40, max_num_orders=None, seed=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,6 +10,8 @@ Unit tests for the wood and stone scenario + basic components
 
 import unittest
 
+import numpy as np
+
 from ai_economist import foundation
 
 
@@ -106,6 +108,70 @@ class TestEnv(unittest.TestCase):
         # Assert that __all__ is in done
         assert "__all__" in done
 
+    def test_compact_replay_log(self):
+        """
+        Unit test to check that an episode recorded with a compact (seed-based)
+        replay log is reproduced exactly by replaying it
+        """
+        create_env = CreateEnv()
+        create_env.env_config.update(episode_length=20, compact_replay_log=True)
+        env = foundation.make_env_instance(**create_env.env_config)
+
+        env.reset(force_dense_logging=True)
+        for _ in range(env.episode_length):
+            actions = {
+                agent.idx: np.random.randint(agent.action_spaces)
+                for agent in env.world.agents
+            }
+            env.step(actions)
+        dense_log = env.previous_episode_dense_log
+        replay_log = env.previous_episode_replay_log
+
+        # The replay log only holds the episode seed and the actions
+        self.assertEqual(list(replay_log["reset"].keys()), ["seed"])
+        for replay_step in replay_log["step"]:
+            self.assertEqual(list(replay_step.keys()), ["actions"])
+
+        replayed_dense_log = foundation.utils.replay_episode(env, replay_log)
+        self.assertEqual(dense_log["states"], replayed_dense_log["states"])
+        self.assertEqual(dense_log["rewards"], replayed_dense_log["rewards"])
+        self.assertEqual(dense_log["world"], replayed_dense_log["world"])
+
+    def test_compact_replay_log_with_seed_state(self):
+        """
+        Unit test to check that an environment with a compact replay log replays a
+        full (RNG state) replay log exactly, and records it, and that a seed and a
+        seed_state cannot both be provided
+        """
+        create_env = CreateEnv()
+        create_env.env_config.update(episode_length=20)
+        env = foundation.make_env_instance(**create_env.env_config)
+        env.reset(force_dense_logging=True)
+        for _ in range(env.episode_length):
+            actions = {
+                agent.idx: np.random.randint(agent.action_spaces)
+                for agent in env.world.agents
+            }
+            env.step(actions)
+        dense_log = env.previous_episode_dense_log
+        replay_log = env.previous_episode_replay_log
+
+        create_env.env_config.update(compact_replay_log=True)
+        compact_env = foundation.make_env_instance(**create_env.env_config)
+        replayed_dense_log = foundation.utils.replay_episode(compact_env, replay_log)
+        self.assertEqual(dense_log["states"], replayed_dense_log["states"])
+        self.assertEqual(dense_log["world"], replayed_dense_log["world"])
+        self.assertEqual(
+            list(compact_env.previous_episode_replay_log["reset"].keys()),
+            ["seed_state"],
+        )
+
+        with self.assertRaises(ValueError):
+            compact_env.reset(seed=1, **replay_log["reset"])
+        compact_env.reset(seed=1)
+        with self.assertRaises(ValueError):
+            compact_env.step(**replay_log["step"][0])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,178 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the columnar (memory-mapped) episode log format
+"""
+
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from ai_economist import foundation
+from ai_economist.foundation.episode_log import (
+    ColumnarEpisodeLog,
+    StreamingDenseLog,
+    write_columnar_episode_log,
+)
+
+
+class TestColumnarEpisodeLog(unittest.TestCase):
+    """Unit test to check that the columnar log round-trips the dense log"""
+
+    def setUp(self):
+        self.env = foundation.make_env_instance(
+            scenario_name="uniform/simple_wood_and_stone",
+            components=[
+                {"Build": {}},
+                {"ContinuousDoubleAuction": {"max_num_orders": 5}},
+                {"Gather": {}},
+            ],
+            n_agents=4,
+            world_size=[15, 15],
+            episode_length=50,
+            world_dense_log_frequency=10,
+        )
+        self.env.reset(force_dense_logging=True)
+        for _ in range(self.env.episode_length):
+            self.env.step(
+                {
+                    agent.idx: np.random.randint(agent.action_spaces)
+                    for agent in self.env.world.agents
+                }
+            )
+        self.dense_log = self.env.previous_episode_dense_log
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_equal_with_types(self, x, y, path=""):
+        """Check that x and y are equal and hold values of the same (python) types,
+        so that e.g. an int that is loaded back as a float is caught."""
+        self.assertIs(type(x), type(y), path)
+        if isinstance(x, dict):
+            self.assertEqual(list(x.keys()), list(y.keys()), path)
+            for k in x:
+                self.assert_equal_with_types(x[k], y[k], path + "/" + str(k))
+        elif isinstance(x, list):
+            self.assertEqual(len(x), len(y), path)
+            for i, (x_i, y_i) in enumerate(zip(x, y)):
+                self.assert_equal_with_types(x_i, y_i, path + "/" + str(i))
+        else:
+            self.assertEqual(x, y, path)
+
+    def test_save_and_load(self):
+        """Saving to and loading from the columnar format preserves the log."""
+        dirpath = os.path.join(self.tmp_dir.name, "log")
+        foundation.utils.save_columnar_episode_log(self.env, dirpath)
+        log = foundation.utils.load_episode_log(dirpath)
+        self.assertIsInstance(log, ColumnarEpisodeLog)
+
+        self.assert_equal_with_types(log.to_dict(), self.dense_log)
+        self.assertEqual(log.world_timesteps, [0, 10, 20, 30, 40, 50])
+        np.testing.assert_array_equal(
+            log.get_world_map(20, "House", "owner"),
+            self.dense_log["world"][20]["House"]["owner"],
+        )
+        np.testing.assert_array_equal(
+            log.get_state_trajectory("1", "inventory", "Wood"),
+            [states["1"]["inventory"]["Wood"] for states in self.dense_log["states"]],
+        )
+
+    def test_convert_lz4_log(self):
+        """Converting an lz4 log yields the same log as saving it directly."""
+        filepath = os.path.join(self.tmp_dir.name, "log.lz4")
+        dirpath = os.path.join(self.tmp_dir.name, "log")
+        foundation.utils.save_episode_log(self.env, filepath)
+        foundation.utils.convert_episode_log(filepath, dirpath)
+        log = foundation.utils.load_episode_log(dirpath)
+        self.assertEqual(log["states"][-1], self.dense_log["states"][-1])
+        self.assertEqual(log["Build"], self.dense_log["Build"])
+
+    def test_streaming_dense_log(self):
+        """Streaming the dense log to disk yields the same log as keeping it in
+        memory."""
+        self.env.set_dense_log_directory(self.tmp_dir.name, chunk_length=7)
+        self.env.seed(1)
+        self.env.reset(force_dense_logging=True)
+        for _ in range(self.env.episode_length):
+            self.env.step({})
+        streamed_dirpath = self.env.previous_episode_dense_log_dirpath
+        self.assertTrue(os.path.isdir(streamed_dirpath))
+        streamed_log = self.env.previous_episode_dense_log
+
+        self.env.set_dense_log_directory(None)
+        self.env.seed(1)
+        self.env.reset(force_dense_logging=True)
+        for _ in range(self.env.episode_length):
+            self.env.step({})
+        self.assertIsNone(self.env.previous_episode_dense_log_dirpath)
+        self.assertEqual(streamed_log, self.env.previous_episode_dense_log)
+
+        log = foundation.utils.load_episode_log(streamed_dirpath)
+        self.assertEqual(len(log["states"]), self.env.episode_length + 1)
+        self.assert_equal_with_types(log.to_dict(), self.env.previous_episode_dense_log)
+
+    def test_streamed_logs_are_cleaned_up(self):
+        """Only the streamed logs of the current and last completed episodes are
+        kept on disk."""
+        self.env.set_dense_log_directory(self.tmp_dir.name, chunk_length=7)
+        dirpaths = []
+        for _ in range(3):
+            self.env.reset(force_dense_logging=True)
+            for _ in range(self.env.episode_length):
+                self.env.step({})
+            dirpaths.append(self.env.previous_episode_dense_log_dirpath)
+            self.assertEqual(
+                os.listdir(self.tmp_dir.name), [os.path.basename(dirpaths[-1])]
+            )
+
+        # An unfinished episode is deleted when the env is reset
+        self.env.reset(force_dense_logging=True)
+        self.env.step({})
+        self.env.reset(force_dense_logging=True)
+        self.assertEqual(len(os.listdir(self.tmp_dir.name)), 2)
+        self.assertIn(os.path.basename(dirpaths[-1]), os.listdir(self.tmp_dir.name))
+        self.env.step({})
+        self.env.reset(force_dense_logging=True)
+        self.assertEqual(len(os.listdir(self.tmp_dir.name)), 2)
+        self.assertEqual(
+            len(ColumnarEpisodeLog(self.env._dense_log.dirpath)["states"]), 0
+        )
+        self.assertEqual(
+            len(self.env.previous_episode_dense_log["states"]),
+            self.env.episode_length + 1,
+        )
+
+    def test_reused_directory(self):
+        """Writing a log to a directory that holds the log of a longer episode
+        leaves no stale chunk files behind."""
+        dense_log = self.env.previous_episode_dense_log
+        dirpath = os.path.join(self.tmp_dir.name, "log")
+
+        long_log = StreamingDenseLog(dirpath, chunk_length=7)
+        for t, states in enumerate(dense_log["states"][:-1]):
+            long_log.log_world(dense_log["world"][t])
+            long_log.log_states(states)
+            long_log.log_actions(dense_log["actions"][t])
+            long_log.log_rewards(dense_log["rewards"][t])
+        long_log.log_states(dense_log["states"][-1])
+        long_log.close()
+
+        short_log = {k: v[:3] for k, v in dense_log.items() if k in ["world", "states"]}
+        short_log.update(actions=dense_log["actions"][:2], rewards=[])
+        write_columnar_episode_log(short_log, dirpath)
+        for sub_dir in ["world", "states", "steps"]:
+            for filename in os.listdir(os.path.join(dirpath, sub_dir)):
+                self.assertTrue(filename.startswith("00000"), filename)
+        self.assert_equal_with_types(ColumnarEpisodeLog(dirpath).to_dict(), short_log)
+
+
+if __name__ == "__main__":
+    unittest.main()
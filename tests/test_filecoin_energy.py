@@ -0,0 +1,219 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the FilecoinEnergy scenario
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist import foundation
+from ai_economist.foundation.scenarios.filecoin_energy.filecoin_energy import (
+    load_filecoin_tables,
+)
+from ai_economist.foundation.scenarios.utils import rewards
+
+
+def reference_rec_purchase(endogenous, action, rec_price, green_score_importance):
+    """Per-miner REC purchase update, used as a reference for the batched one."""
+    recs_percentage = (action - 1) * 0.05
+    new_green_score = min([1.0, endogenous["InitialGreenScore"] + recs_percentage])
+    green_scores = np.append(endogenous["GreenScoresLastDay"][1:], new_green_score)
+    consumed_energy = endogenous["ConsumedEnergy"]
+    if np.sum(consumed_energy) > 0.0:
+        green_score = np.sum(green_scores * consumed_energy) / np.sum(consumed_energy)
+    else:
+        green_score = np.mean(green_scores)
+    return {
+        "GreenScoresLastDay": green_scores,
+        "GreenScore": green_score,
+        "RECsPrice": rec_price * consumed_energy[-1] * recs_percentage,
+        "TotalScore": (green_score_importance * green_score)
+        + ((1 - green_score_importance) * endogenous["ReliabilityScore"]),
+    }
+
+
+class TestFilecoinEnergy(unittest.TestCase):
+    """Unit test to check the array-based miner state updates against per-miner
+    updates"""
+
+    n_agents = 50
+
+    def setUp(self):
+        self.env = foundation.make_env_instance(
+            scenario_name="filecoin-energy",
+            components=[
+                ("ChangeMinerSelectionPolicy", {}),
+                ("BuyRECFromVirtualStore", {"green_score_importance": 0}),
+            ],
+            n_agents=self.n_agents,
+            world_size=[1, 1],
+            episode_length=40,
+            multi_action_mode_agents=False,
+            multi_action_mode_planner=False,
+            flatten_observations=False,
+        )
+
+    @staticmethod
+    def endogenous_of(env, name):
+        return np.array([agent.state["endogenous"][name] for agent in env.world.agents])
+
+    def endogenous(self, name):
+        return self.endogenous_of(self.env, name)
+
+    def test_miner_updates(self):
+        """Storage, energy and green score histories match per-miner updates."""
+        env = self.env
+        obs = env.reset()
+        green_scores = self.endogenous("GreenScoresLastDay")
+        self.assertEqual(green_scores.shape, (self.n_agents, env.history_length))
+        np.testing.assert_array_equal(
+            green_scores, self.endogenous("InitialGreenScore")[:, None] * np.ones(24)
+        )
+
+        rng = np.random.RandomState(0)
+        for _ in range(env.episode_length):
+            total_data = self.endogenous("TotalData")
+            consumed_energy = self.endogenous("ConsumedEnergy")
+            green_scores = self.endogenous("GreenScoresLastDay")
+            last_obs = obs
+
+            actions = {
+                agent.idx: rng.randint(agent.action_spaces) for agent in env.all_agents
+            }
+            obs, _, _, _ = env.step(actions)
+
+            new_data = self.endogenous("NewData")
+            self.assertTrue(np.all(np.isin(new_data, [0, 1024])))
+            self.assertTrue(1 <= np.sum(new_data > 0) <= self.n_agents // 10)
+            np.testing.assert_array_equal(
+                self.endogenous("TotalData"), total_data + new_data
+            )
+            for agent in env.world.agents:
+                energy = np.append(
+                    consumed_energy[agent.idx][1:],
+                    rewards.calculateEnergyConsumption(
+                        new_data[agent.idx], total_data[agent.idx] + new_data[agent.idx]
+                    ),
+                )
+                np.testing.assert_array_equal(
+                    agent.state["endogenous"]["ConsumedEnergy"], energy
+                )
+                np.testing.assert_array_equal(
+                    agent.state["endogenous"]["GreenScoresLastDay"][:-1],
+                    green_scores[agent.idx][1:],
+                )
+                np.testing.assert_array_equal(
+                    obs[str(agent.idx)]["world-endogenous-ConsumedEnergy"], energy
+                )
+
+            # Observations are not changed by later steps
+            for agent in env.world.agents:
+                np.testing.assert_array_equal(
+                    last_obs[str(agent.idx)]["world-endogenous-ConsumedEnergy"],
+                    consumed_energy[agent.idx],
+                )
+
+    def test_rec_purchase(self):
+        """The batched REC purchases match per-miner updates."""
+        env = self.env
+        env.reset()
+        rec_purchase = env.get_component("BuyRecFromVirtualStore")
+        env.world.planner.state["GreenScoreImportance"] = 0.35
+
+        rng = np.random.RandomState(1)
+        for _ in range(30):
+            actions = rng.randint(rec_purchase.rec_packages, size=self.n_agents)
+            expected = []
+            for agent in env.world.agents:
+                agent.set_component_action(rec_purchase.name, actions[agent.idx])
+                expected.append(
+                    reference_rec_purchase(
+                        agent.state["endogenous"].to_dict(),
+                        actions[agent.idx],
+                        rec_purchase.rec_price,
+                        0.35,
+                    )
+                )
+
+            rec_purchase.component_step()
+            for agent in env.world.agents:
+                for k, v in expected[agent.idx].items():
+                    np.testing.assert_array_equal(agent.state["endogenous"][k], v)
+
+            # Add to the consumed energy histories
+            env.scenario_step()
+
+        agent = env.world.agents[0]
+        agent.set_component_action(rec_purchase.name, rec_purchase.rec_packages + 1)
+        with self.assertRaises(ValueError):
+            rec_purchase.component_step()
+
+    def test_episodes_differ(self):
+        """The initial miner states are the same in every episode, but the storage
+        providers are drawn anew."""
+        env = self.env
+        new_data = []
+        initial_scores = []
+        for _ in range(3):
+            env.reset()
+            initial_scores.append(self.endogenous("TotalScore"))
+            episode_new_data = []
+            for _ in range(env.episode_length):
+                env.step({})
+                episode_new_data.append(self.endogenous("NewData"))
+            new_data.append(np.array(episode_new_data))
+
+        for episode in range(1, 3):
+            np.testing.assert_array_equal(initial_scores[episode], initial_scores[0])
+            self.assertFalse(np.array_equal(new_data[episode], new_data[episode - 1]))
+
+    def test_without_miner_selection_policy(self):
+        """The scenario runs with the REC purchases only (at a fixed green score
+        importance)."""
+        env = foundation.make_env_instance(
+            scenario_name="filecoin-energy",
+            components=[
+                (
+                    "BuyRECFromVirtualStore",
+                    {"green_score_importance": 0.5, "static": True},
+                )
+            ],
+            n_agents=self.n_agents,
+            world_size=[1, 1],
+            episode_length=10,
+            multi_action_mode_agents=False,
+            multi_action_mode_planner=False,
+            flatten_observations=False,
+        )
+        env.reset()
+        self.assertTrue(np.any(self.endogenous_of(env, "ReliabilityScore") > 0))
+        rng = np.random.RandomState(2)
+        for _ in range(env.episode_length):
+            actions = {
+                agent.idx: rng.randint(agent.action_spaces)
+                for agent in env.world.agents
+            }
+            _, rew, _, _ = env.step(actions)
+            self.assertTrue(np.all(np.isfinite(list(rew.values()))))
+        self.assertGreater(np.sum(self.endogenous_of(env, "TotalData")), 0)
+
+    def test_input_tables(self):
+        """The input tables are loaded once and shared by all the environments."""
+        countries, rel_scores = load_filecoin_tables()
+        self.assertIs(self.env.countries, countries)
+        self.assertIs(self.env.rel_scores, rel_scores)
+        self.assertAlmostEqual(np.sum(countries["prob"]), 1.0)
+        self.assertAlmostEqual(np.sum(rel_scores["prob"]), 1.0)
+        self.assertEqual(len(countries["energy_price_per_kWh"]), len(countries["prob"]))
+        with self.assertRaises(ValueError):
+            countries["prob"][0] = 1.0
+
+
+if __name__ == "__main__":
+    unittest.main()
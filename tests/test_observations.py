@@ -0,0 +1,41 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the batched observation helpers
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist.foundation.scenarios.utils import observations
+
+
+class TestObservationHelpers(unittest.TestCase):
+    """Unit test to check the batched window extraction against per-agent slicing"""
+
+    def test_agent_windows(self):
+        """Batched windows match slicing each agent's window from the padded maps."""
+        rng = np.random.RandomState(0)
+        w = 3
+        maps = rng.randint(5, size=(4, 10, 12)).astype(np.int16)
+        padded = np.pad(maps, [(0, 0), (w, w), (w, w)], constant_values=-1)
+        locs = np.stack([rng.randint(10, size=6), rng.randint(12, size=6)], axis=1)
+        agent_indices = np.arange(6)
+
+        windows = observations.agent_windows(padded, locs, w)
+        observations.mark_self_in_idx_maps(windows, agent_indices)
+        self.assertEqual(windows.shape, (6, 4, 2 * w + 1, 2 * w + 1))
+
+        for i, (r, c) in enumerate(locs + w):
+            window = np.array(padded[:, (r - w) : (r + w + 1), (c - w) : (c + w + 1)])
+            window[window == i + 2] = 1
+            np.testing.assert_array_equal(windows[i], window)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,493 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the PeriodicBracketTax component
+"""
+
+import multiprocessing
+import pickle
+import sys
+import unittest
+
+import numpy as np
+
+from ai_economist import foundation
+from ai_economist.foundation.components.redistribution import PeriodicBracketTax
+from ai_economist.foundation.components.utils import RingBuffer, SharedRingBuffers
+
+
+def append_to_shared_buffer(shared_buffer, slot, rows):
+    """Append rows to a slot of a shared buffer (run in a separate process)."""
+    shared_buffer.append(slot, rows)
+    shared_buffer.close()
+
+
+def reference_interpolate_gaps(taus):
+    """Fill the nan gaps in taus with a per-gap loop (reference implementation)."""
+    taus = np.array(taus)
+    last_real_rate, last_real_tidx = 0.0, -1
+    for i, tau in enumerate(taus):
+        if not np.isnan(tau):
+            if (i - last_real_tidx) > 1:
+                gap = np.arange(last_real_tidx + 1, i)
+                taus[gap] = np.linspace(last_real_rate, tau, len(gap) + 2)[1:-1]
+            last_real_rate, last_real_tidx = float(tau), int(i)
+    return taus
+
+
+def reference_bracketize(tax, bin_marginal_rates, bin_edges, bin_sizes):
+    """Average the binned marginal rates within each bracket with a per-bracket loop
+    (reference implementation)."""
+    last_bracket_total = 0
+    bracket_rates = []
+    for b_idx, income in enumerate(tax.bracket_cutoffs[1:]):
+        bin_income = np.minimum(bin_sizes, np.maximum(0, income - bin_edges))
+        taxes_due = np.maximum(0, np.sum(bin_marginal_rates * bin_income))
+        bracket_rates.append(
+            (taxes_due - last_bracket_total) / tax.bracket_sizes[b_idx]
+        )
+        last_bracket_total = taxes_due
+    return np.array(bracket_rates + [bin_marginal_rates[-1]])
+
+
+def reference_elasticity(tax, observed_incomes_and_marginal_rates):
+    """Estimate the elasticity with a per-sample filtering loop (reference
+    implementation, with the default arguments of
+    estimate_uniform_income_elasticity)."""
+    zs = []
+    taus = []
+    for z_t, tau_t in observed_incomes_and_marginal_rates:
+        if z_t > 0 and tau_t < 1:
+            zs.append(z_t)
+            taus.append(tau_t)
+
+    if len(zs) < 10 or np.std(taus) < 1e-6:
+        return 0.5, 0.5
+
+    x = np.log(np.maximum(1 - np.array(taus), 1e-9))
+    X = np.stack([x, np.ones_like(x)]).T
+    Y = np.log(np.maximum(np.array(zs), 1e-9))
+    elas, log_z0 = np.linalg.inv(X.T.dot(X)).T.dot(X.T.dot(Y))
+    return (1 - 0.98) * np.maximum(elas, 0.0) + 0.98 * 0.5, log_z0
+
+
+def reference_binned_saez_params(tax, incomes):
+    """Compute the binned G(z) and A(z) with per-bin loops (reference
+    implementation)."""
+
+    def pareto(z):
+        if tax.pareto_weight_type == "uniform":
+            return np.ones_like(z)
+        return 1.0 / np.maximum(1, z)
+
+    counts, lefts = np.histogram(incomes, bins=tax._saez_income_bin_edges)
+    incomes_below = incomes[incomes < lefts[0]]
+    incomes_above = incomes[incomes > lefts[-1]]
+    n_total = np.sum(counts) + len(incomes_below) + len(incomes_above)
+
+    pz = [counts[i] / n_total for i in range(len(counts))]
+    pz = np.array(pz + [len(incomes_above) / n_total])
+    cum_pz = [pz[0] + len(incomes_below) / n_total]
+    for p in pz[1:]:
+        cum_pz.append(min(max(0, cum_pz[-1] + p), 1.0))
+    cum_pz = np.array(cum_pz)
+
+    # G(z)
+    if len(incomes_below) > 0:
+        pareto_weight_below = np.sum(pareto(np.maximum(incomes_below, 0)))
+    else:
+        pareto_weight_below = 0
+    if len(incomes_above) > 0:
+        pareto_weight_above = np.sum(pareto(incomes_above))
+    else:
+        pareto_weight_above = 0
+    pareto_weight_per_bin = counts * pareto(0.5 * (lefts[:-1] + lefts[1:]))
+    pareto_norm = pareto_weight_per_bin.sum()
+    pareto_norm += pareto_weight_below
+    pareto_norm += pareto_weight_above
+    pareto_norm += 1e-9
+    pareto_density = (
+        np.concatenate([pareto_weight_per_bin, [pareto_weight_above]]) / pareto_norm
+    )
+    pareto_density_geq_z = np.cumsum(pareto_density[::-1])[::-1]
+    prob_geq_z = np.cumsum(pz[::-1])[::-1]
+    gz = pareto_density_geq_z / (prob_geq_z + 1e-9)
+    gz = np.concatenate([0.5 * (gz[:-1] + gz[1:]), [gz[-1]]])
+
+    # A(z)
+    p_geq_z = 1 - cum_pz + (0.5 * pz)
+    az = []
+    for i in range(len(lefts) - 1):
+        if pz[i] == 0:
+            az.append(np.nan)
+        else:
+            z = 0.5 * (lefts[i] + lefts[i + 1])
+            paz = z * pz[i] / (min(max(0, p_geq_z[i]), 1) + 1e-9)
+            az.append(paz / (lefts[i + 1] - lefts[i]))
+    if len(incomes_above) > 0:
+        avg_income_above_cutoff = np.mean(incomes_above)
+        az.append(
+            avg_income_above_cutoff / (avg_income_above_cutoff - lefts[-1] + 1e-9)
+        )
+    else:
+        az.append(0.0)
+
+    return gz, np.array(az)
+
+
+def reference_enact_taxes(tax, coin, escrow, last_coin):
+    """Collect and redistribute the taxes of one period with a per-agent loop
+    (reference implementation). Returns the coin, last coin, incomes, marginal
+    rates and tax revenue."""
+    coin = [float(c) for c in coin]
+    incomes, marginal_rates = [], []
+    net_tax_revenue = 0
+    for i in range(len(coin)):
+        income = (coin[i] + escrow[i]) - last_coin[i]
+        effective_taxes = np.minimum(coin[i], tax.taxes_due(income))
+        coin[i] -= effective_taxes
+        net_tax_revenue += effective_taxes
+        incomes.append(float(income))
+        marginal_rates.append(float(tax.marginal_rate(income)))
+    lump_sum = net_tax_revenue / len(coin)
+    coin = [c + lump_sum for c in coin]
+    new_last_coin = [float(c + e) for c, e in zip(coin, escrow)]
+    return coin, new_last_coin, incomes, marginal_rates, float(net_tax_revenue)
+
+
+class TestRingBuffer(unittest.TestCase):
+    """Unit test to check the ring buffer against a list with pop(0) eviction"""
+
+    def test_matches_list(self):
+        """The buffer holds the last capacity rows, in insertion order."""
+        rng = np.random.RandomState(0)
+        for capacity in [1, 3, 50]:
+            buffer = RingBuffer(capacity, 2)
+            reference = []
+            for _ in range(300):
+                rows = rng.rand(rng.randint(2 * capacity + 2), 2)
+                buffer.append(rows)
+                reference += rows.tolist()
+                while len(reference) > capacity:
+                    reference.pop(0)
+
+                self.assertEqual(len(buffer), len(reference))
+                np.testing.assert_array_equal(
+                    buffer.view(), np.reshape(reference, (-1, 2))
+                )
+                n = rng.randint(1, capacity + 3)
+                np.testing.assert_array_equal(
+                    buffer.view(n), np.reshape(reference[-n:], (-1, 2))
+                )
+            buffer.clear()
+            self.assertEqual(buffer.view().shape, (0, 2))
+
+
+class TestSaezBuffer(unittest.TestCase):
+    """Unit test to check the local/global Saez buffer bookkeeping"""
+
+    def setUp(self):
+        self.env = foundation.make_env_instance(
+            scenario_name="uniform/simple_wood_and_stone",
+            components=[
+                {"Gather": {}},
+                {
+                    "PeriodicBracketTax": {
+                        "tax_model": "saez",
+                        "period": 5,
+                        "saez_buffer_size": 30,
+                    }
+                },
+            ],
+            n_agents=4,
+            world_size=[10, 10],
+            episode_length=20,
+        )
+        self.tax = self.env.get_component("PeriodicBracketTax")
+
+    def add_samples(self, rng):
+        samples = rng.rand(self.env.n_agents, 2)
+        self.tax._update_saez_buffer(samples[:, 0], samples[:, 1])
+        return samples.tolist()
+
+    def test_local_and_global_buffers(self):
+        """The Saez buffer combines the global buffer with the latest local
+        samples."""
+        rng = np.random.RandomState(0)
+        local = []
+        for _ in range(10):
+            local = (local + self.add_samples(rng))[-30:]
+        np.testing.assert_array_equal(self.tax.saez_buffer, local)
+        np.testing.assert_array_equal(self.tax.get_local_saez_buffer(), local)
+        self.assertFalse(self.tax.saez_buffer.flags.writeable)
+
+        global_buffer = local + rng.rand(20, 2).tolist()
+        self.tax._additions_this_episode = 0
+        self.tax.set_global_saez_buffer(global_buffer)
+        np.testing.assert_array_equal(self.tax.saez_buffer, global_buffer)
+
+        new_samples = self.add_samples(rng) + self.add_samples(rng)
+        np.testing.assert_array_equal(self.tax.saez_buffer, global_buffer + new_samples)
+
+        self.tax.reset_saez_buffers()
+        self.assertEqual(len(self.tax.saez_buffer), 0)
+
+
+@unittest.skipIf(sys.version_info < (3, 8), "multiprocessing.shared_memory is 3.8+")
+class TestSharedSaezBuffer(unittest.TestCase):
+    """Unit test to check the Saez buffer shared between replicas"""
+
+    def setUp(self):
+        self.shared_buffer = SharedRingBuffers(3, 30)
+        self.taxes = []
+        for _ in range(2):
+            env = foundation.make_env_instance(
+                scenario_name="uniform/simple_wood_and_stone",
+                components=[
+                    {"Gather": {}},
+                    {
+                        "PeriodicBracketTax": {
+                            "tax_model": "saez",
+                            "saez_buffer_size": 30,
+                        }
+                    },
+                ],
+                n_agents=4,
+                world_size=[10, 10],
+                episode_length=20,
+            )
+            self.taxes.append(env.get_component("PeriodicBracketTax"))
+
+    def tearDown(self):
+        self.shared_buffer.close()
+        self.shared_buffer.unlink()
+
+    def test_slots(self):
+        """Each slot holds the last capacity rows appended to it."""
+        rng = np.random.RandomState(0)
+        references = [[], [], []]
+        for _ in range(50):
+            slot = rng.randint(3)
+            rows = rng.rand(rng.randint(12), 2)
+            self.shared_buffer.append(slot, rows)
+            references[slot] = (references[slot] + rows.tolist())[-30:]
+            for s, reference in enumerate(references):
+                np.testing.assert_array_equal(
+                    self.shared_buffer.slot_rows(s), np.reshape(reference, (-1, 2))
+                )
+        np.testing.assert_array_equal(
+            self.shared_buffer.rows(), np.reshape(sum(references, []), (-1, 2))
+        )
+
+        # Unpickling attaches to the same shared memory
+        attached = pickle.loads(pickle.dumps(self.shared_buffer))
+        attached.append(1, [[1.0, 0.5]])
+        np.testing.assert_array_equal(self.shared_buffer.slot_rows(1)[-1], [1.0, 0.5])
+        attached.close()
+
+    def test_other_process(self):
+        """Rows appended by another process are visible."""
+        process = multiprocessing.get_context("spawn").Process(
+            target=append_to_shared_buffer,
+            args=(self.shared_buffer, 2, np.ones((5, 2))),
+        )
+        process.start()
+        process.join()
+        self.assertEqual(process.exitcode, 0)
+        np.testing.assert_array_equal(self.shared_buffer.slot_rows(2), np.ones((5, 2)))
+
+    def test_replicas_share_samples(self):
+        """Each replica uses the samples of all the replicas."""
+        rng = np.random.RandomState(1)
+        self.taxes[0]._update_saez_buffer(*rng.rand(2, 4))
+        for slot, tax in enumerate(self.taxes):
+            tax.attach_shared_saez_buffer(self.shared_buffer, slot)
+        for _ in range(10):
+            for tax in self.taxes:
+                tax._update_saez_buffer(*rng.rand(2, 4))
+
+        local_buffers = [tax.get_local_saez_buffer() for tax in self.taxes]
+        for tax in self.taxes:
+            np.testing.assert_array_equal(
+                tax.saez_buffer, np.concatenate(local_buffers)
+            )
+
+        # Pickled components keep a snapshot of the shared samples
+        tax = pickle.loads(pickle.dumps(self.taxes[0]))
+        self.assertIsNone(tax._shared_saez_buffer)
+        np.testing.assert_array_equal(tax.saez_buffer, np.concatenate(local_buffers))
+
+
+class TestSaezSchedule(unittest.TestCase):
+    """Unit test to check the vectorized Saez schedule computation"""
+
+    def setUp(self):
+        env = foundation.make_env_instance(
+            scenario_name="uniform/simple_wood_and_stone",
+            components=[{"Gather": {}}, {"PeriodicBracketTax": {"tax_model": "saez"}}],
+            n_agents=4,
+            world_size=[10, 10],
+            episode_length=10,
+        )
+        self.tax = env.get_component("PeriodicBracketTax")
+
+    def test_gap_interpolation(self):
+        """Rates of empty income bins are linearly interpolated."""
+        rng = np.random.RandomState(0)
+        for _ in range(200):
+            n = rng.randint(1, 30)
+            gz = rng.rand(n)
+            az = np.where(rng.rand(n) < 0.5, np.nan, rng.rand(n))
+            expected = reference_interpolate_gaps(
+                (1.0 - gz) / (1.0 - gz + az * 0.3 + 1e-9)
+            )
+            taus = PeriodicBracketTax.get_saez_marginal_rates(gz, az, 0.3)
+            np.testing.assert_allclose(taus, expected, rtol=1e-12, atol=1e-15)
+
+    def test_schedule(self):
+        """The elasticity and binned parameters are identical to a per-sample and
+        per-bin computation, and the bracket rates match it."""
+        rng = np.random.RandomState(1)
+        for n in [5, 50, 5000]:
+            incomes = rng.exponential(rng.choice([10, 100, 1000]), n)
+            incomes[rng.rand(n) < 0.1] = 0
+            rates = rng.rand(n)
+            buffer = np.stack([incomes, rates], axis=1)
+            elas, log_z0 = self.tax.estimate_uniform_income_elasticity(buffer)
+            self.assertTrue(np.isfinite(elas))
+            self.assertEqual((elas, log_z0), reference_elasticity(self.tax, buffer))
+
+            gz, az = self.tax.get_binned_saez_welfare_weight_and_pareto_params(incomes)
+            self.assertEqual(len(gz), self.tax._saez_n_estimation_bins + 1)
+            self.assertEqual(len(az), self.tax._saez_n_estimation_bins + 1)
+            ref_gz, ref_az = reference_binned_saez_params(self.tax, incomes)
+            np.testing.assert_array_equal(gz, ref_gz)
+            np.testing.assert_array_equal(az, ref_az)
+
+            bin_args = (
+                self.tax._saez_income_bin_edges,
+                self.tax._saez_income_bin_sizes,
+            )
+            ref_taus = reference_interpolate_gaps(
+                (1.0 - ref_gz) / (1.0 - ref_gz + ref_az * elas + 1e-9)
+            )
+            np.testing.assert_allclose(
+                self.tax.bracketize_schedule(
+                    self.tax.get_saez_marginal_rates(gz, az, elas), *bin_args
+                ),
+                reference_bracketize(self.tax, ref_taus, *bin_args),
+                rtol=1e-10,
+                atol=1e-12,
+            )
+
+
+class TestTaxEnactment(unittest.TestCase):
+    """Unit test to check the batched tax computations"""
+
+    def make_env(self, **tax_kwargs):
+        return foundation.make_env_instance(
+            scenario_name="uniform/simple_wood_and_stone",
+            components=[
+                {"Build": {}},
+                {"Gather": {}},
+                {"PeriodicBracketTax": dict(period=10, **tax_kwargs)},
+            ],
+            n_agents=12,
+            world_size=[15, 15],
+            episode_length=60,
+            dense_log_frequency=2,
+        )
+
+    def test_batched_rates_and_taxes(self):
+        """The batched rates, taxes and brackets match the per-income methods."""
+        env = self.make_env(tax_model="us-federal-single-filer-2018-scaled")
+        env.reset()
+        tax = env.get_component("PeriodicBracketTax")
+        rng = np.random.RandomState(0)
+        incomes = np.concatenate(
+            [rng.uniform(-100, 1000, 200), tax.bracket_cutoffs, [0.0, -1e-9]]
+        )
+        np.testing.assert_array_equal(
+            tax.marginal_rates(incomes), [tax.marginal_rate(z) for z in incomes]
+        )
+        np.testing.assert_array_equal(
+            tax.taxes_due_batch(incomes), [tax.taxes_due(z) for z in incomes]
+        )
+        np.testing.assert_array_equal(
+            tax.bracket_cutoffs[tax.income_bin_indices(incomes)],
+            [tax.income_bin(z) for z in incomes],
+        )
+
+    def test_enact_taxes(self):
+        """Period after period, the collected and redistributed taxes are identical
+        to a per-agent computation (summing the revenue in agent order)."""
+        env = self.make_env(tax_model="us-federal-single-filer-2018-scaled")
+        env.reset()
+        tax = env.get_component("PeriodicBracketTax")
+        rng = np.random.RandomState(0)
+        collected_taxes = tax.total_collected_taxes
+        for _ in range(100):
+            # Incomes around the bracket cutoffs and around zero
+            for agent in env.world.agents:
+                agent.state["inventory"]["Coin"] += rng.choice(
+                    [
+                        0.1,
+                        0.2,
+                        0.3,
+                        rng.exponential(20),
+                        rng.choice(tax.bracket_cutoffs),
+                    ]
+                )
+                agent.state["escrow"]["Coin"] = rng.choice([0, 0.1])
+            coin = env.world.get_agent_state_column(("inventory", "Coin"))
+            escrow = env.world.get_agent_state_column(("escrow", "Coin"))
+            expected = reference_enact_taxes(tax, coin, escrow, tax.last_coin)
+            collected_taxes += expected[4]
+
+            tax.enact_taxes()
+            self.assertEqual(
+                env.world.get_agent_state_column(("inventory", "Coin")).tolist(),
+                expected[0],
+            )
+            self.assertEqual(list(tax.last_coin), expected[1])
+            self.assertEqual(list(tax.last_income), expected[2])
+            self.assertEqual(list(tax.last_marginal_rate), expected[3])
+            self.assertEqual(tax.total_collected_taxes, collected_taxes)
+
+    def test_dense_logging(self):
+        """Per-agent tax records are only kept when dense logging, without changing
+        the metrics."""
+        env = self.make_env(tax_model="us-federal-single-filer-2018-scaled")
+        tax = env.get_component("PeriodicBracketTax")
+        metrics = []
+        for dense_logging in [True, False]:
+            env.reset(seed=1)
+            self.assertEqual(tax.dense_logging, dense_logging)
+            rng = np.random.RandomState(0)
+            for _ in range(env.episode_length):
+                # Random incomes, spanning all the brackets
+                for agent in env.world.agents:
+                    agent.state["inventory"]["Coin"] += rng.exponential(5)
+                env.step({})
+            self.assertEqual(len(tax.taxes), env.episode_length * dense_logging)
+            metrics.append(
+                {
+                    k: v
+                    for k, v in env.previous_episode_metrics.items()
+                    if k.startswith(tax.shorthand)
+                }
+            )
+
+        taxes = env.previous_episode_dense_log[tax.shorthand]
+        self.assertEqual(len(taxes), env.episode_length)
+        self.assertEqual(len(taxes[9]), 2 + env.n_agents)
+        self.assertGreater(metrics[0]["PeriodicTax/total_collected_taxes"], 0)
+        self.assertEqual(metrics[0], metrics[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the reward functions
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist.foundation.scenarios.utils import rewards
+
+
+class TestBatchedRewards(unittest.TestCase):
+    """Unit test to check the batched reward functions against per-agent calls"""
+
+    n_agents = 50
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.coin = rng.exponential(100, self.n_agents)
+        self.coin[:5] = [0, 0.5, 1, 2, 1e4]
+        self.labor = rng.uniform(0, 50, self.n_agents)
+
+    def test_agent_utilities(self):
+        """Utilities computed for all agents at once match per-agent utilities."""
+        # (NumPy may evaluate batched powers to within an ulp of the scalar ones)
+        for isoelastic_eta in [0.0, 0.23, 1.0]:
+            np.testing.assert_allclose(
+                rewards.isoelastic_coin_minus_labor(
+                    self.coin, self.labor, isoelastic_eta, 0.1
+                ),
+                [
+                    rewards.isoelastic_coin_minus_labor(c, l, isoelastic_eta, 0.1)
+                    for c, l in zip(self.coin, self.labor)
+                ],
+                rtol=1e-14,
+            )
+        np.testing.assert_allclose(
+            rewards.coin_minus_labor_cost(self.coin, self.labor, 2.0, 0.1),
+            [
+                rewards.coin_minus_labor_cost(c, l, 2.0, 0.1)
+                for c, l in zip(self.coin, self.labor)
+            ],
+            rtol=1e-14,
+        )
+
+    def test_filecoin_miner_rewards(self):
+        """Filecoin miner rewards computed for all agents at once match per-agent
+        rewards."""
+        rng = np.random.RandomState(1)
+        columns = [
+            1024.0 * (rng.rand(self.n_agents) < 0.2),
+            1024.0 * rng.randint(100, size=self.n_agents),
+            rng.uniform(0.05, 0.3, self.n_agents),
+            rng.uniform(0, 1, self.n_agents),
+        ]
+        np.testing.assert_array_equal(
+            rewards.filecoin_minus_energy_costs(*columns),
+            [
+                rewards.filecoin_minus_energy_costs(*row)
+                for row in zip(*[c.tolist() for c in columns])
+            ],
+        )
+
+    def test_planner_social_welfare(self):
+        """The social welfare dispatches to the welfare function of each type."""
+        utilities = rewards.isoelastic_coin_minus_labor(self.coin, self.labor, 0.23, 1)
+        self.assertEqual(
+            rewards.planner_social_welfare(
+                "coin_eq_times_productivity", self.coin, utilities, 0.4
+            ),
+            rewards.coin_eq_times_productivity(self.coin, 0.4),
+        )
+        self.assertEqual(
+            rewards.planner_social_welfare(
+                "inv_income_weighted_coin_endowments", self.coin, utilities
+            ),
+            rewards.inv_income_weighted_coin_endowments(self.coin),
+        )
+        self.assertEqual(
+            rewards.planner_social_welfare(
+                "inv_income_weighted_utility", self.coin, utilities
+            ),
+            rewards.inv_income_weighted_utility(self.coin, utilities),
+        )
+        with self.assertRaises(NotImplementedError):
+            rewards.planner_social_welfare("unknown", self.coin, utilities)
+
+
+if __name__ == "__main__":
+    unittest.main()
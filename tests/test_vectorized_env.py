@@ -0,0 +1,126 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the batched (multi-environment) CPU env wrapper
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist import foundation
+from ai_economist.foundation.vectorized_env_wrapper import VectorizedFoundationEnv
+
+env_config = {
+    "scenario_name": "uniform/simple_wood_and_stone",
+    "components": [
+        {"Build": {}},
+        {"ContinuousDoubleAuction": {"max_num_orders": 5}},
+        {"Gather": {}},
+    ],
+    "n_agents": 4,
+    "world_size": [15, 15],
+    "episode_length": 5,
+    "flatten_observations": True,
+    "flatten_masks": True,
+    "starting_agent_coin": 10,
+}
+
+
+def sample_actions(env, num_envs):
+    """Sample random (valid) actions for each agent, with a leading env dimension."""
+    actions = {}
+    for agent in env.all_agents:
+        if agent.multi_action_mode:
+            actions[agent.idx] = np.stack(
+                [np.random.randint(0, agent.action_spaces) for _ in range(num_envs)]
+            )
+        else:
+            actions[agent.idx] = np.random.randint(
+                0, agent.action_spaces, size=num_envs
+            )
+    return actions
+
+
+class TestVectorizedEnv(unittest.TestCase):
+    """Unit test to test the batched reset and step against sequential envs"""
+
+    num_envs = 3
+
+    def test_matches_sequential_envs(self):
+        """
+        The batched env should produce the same results as stepping N environments
+        one after another.
+        """
+        vec_env = VectorizedFoundationEnv(
+            env_config=env_config, num_envs=self.num_envs, auto_reset=False
+        )
+        seq_envs = [
+            foundation.make_env_instance(**env_config) for _ in range(self.num_envs)
+        ]
+
+        np.random.seed(1)
+        actions = [
+            sample_actions(vec_env.get_env(0), self.num_envs)
+            for _ in range(env_config["episode_length"])
+        ]
+
+        vec_env.seed(123)
+        vec_obs = [vec_env.reset()]
+        vec_rew = []
+        for t in range(env_config["episode_length"]):
+            obs, rew, done, _ = vec_env.step(actions[t])
+            vec_obs.append(obs)
+            vec_rew.append(rew)
+        self.assertTrue(done.all())
+
+        vec_env.seed(123)
+        seq_obs = [[env.reset() for env in seq_envs]]
+        seq_rew = []
+        for t in range(env_config["episode_length"]):
+            step_results = [
+                env.step({k: v[env_id].tolist() for k, v in actions[t].items()})
+                for env_id, env in enumerate(seq_envs)
+            ]
+            seq_obs.append([r[0] for r in step_results])
+            seq_rew.append([r[1] for r in step_results])
+
+        for t, obs in enumerate(vec_obs):
+            for env_id in range(self.num_envs):
+                for agent_idx, agent_obs in obs.items():
+                    for k, v in agent_obs.items():
+                        self.assertEqual(v.shape[0], self.num_envs)
+                        np.testing.assert_array_equal(
+                            v[env_id], seq_obs[t][env_id][agent_idx][k]
+                        )
+        for t, rew in enumerate(vec_rew):
+            for agent_idx, r in rew.items():
+                self.assertEqual(r.shape, (self.num_envs,))
+                np.testing.assert_array_equal(
+                    r,
+                    [seq_rew[t][env_id][agent_idx] for env_id in range(self.num_envs)],
+                )
+
+    def test_auto_reset(self):
+        """Done environments should be reset at the end of the step."""
+        vec_env = VectorizedFoundationEnv(
+            env_config=env_config, num_envs=self.num_envs, auto_reset=True
+        )
+        vec_env.reset()
+        for _ in range(env_config["episode_length"]):
+            _, _, done, info = vec_env.step(
+                sample_actions(vec_env.get_env(0), self.num_envs)
+            )
+        self.assertTrue(done.all())
+        self.assertFalse(vec_env.dones.any())
+        for env_id in range(self.num_envs):
+            self.assertIn("terminal_observation", info[env_id])
+            self.assertEqual(vec_env.get_env(env_id).world.timestep, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
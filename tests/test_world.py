@@ -0,0 +1,352 @@
+# Copyright (c) 2021, salesforce.com, inc.
+# All rights reserved.
+# SPDX-License-Identifier: BSD-3-Clause
+# For full license text, see the LICENSE file in the repo root
+# or https://opensource.org/licenses/BSD-3-Clause
+
+"""
+Unit tests for the world maps and the agent state table
+"""
+
+import unittest
+
+import numpy as np
+
+from ai_economist import foundation
+from ai_economist.foundation.base.world import Maps, World
+
+
+class TestMaps(unittest.TestCase):
+    """Unit test to check the bookkeeping of the world maps"""
+
+    size = [8, 9]
+    n_agents = 4
+
+    def setUp(self):
+        self.maps = Maps(
+            self.size, self.n_agents, ["Wood", "Stone"], ["House", "Water"]
+        )
+
+    def full_accessibility(self):
+        """Recompute the accessibility map from scratch, from the landmark maps."""
+        accessibility = np.ones([self.n_agents] + self.size, dtype=bool)
+        for landmark in self.maps._blocked:
+            accessibility &= self.maps.get(landmark)[None] == 0
+        for landmark in self.maps._private:
+            owner = self.maps.get(landmark, owner=True)[None]
+            agent_idx = np.arange(self.n_agents)[:, None, None]
+            accessibility &= np.logical_or(owner == -1, owner == agent_idx)
+        return accessibility
+
+    def test_incremental_accessibility(self):
+        """The incrementally updated accessibility matches a full recomputation
+        after random changes to the landmark maps."""
+        rng = np.random.RandomState(0)
+        for _ in range(500):
+            op = rng.randint(5)
+            r, c = rng.randint(self.size[0]), rng.randint(self.size[1])
+            if op == 0:
+                owner = self.maps.get_point("House", r, c, owner=True)
+                if owner == -1:
+                    owner = rng.randint(self.n_agents)
+                self.maps.set_point("House", r, c, rng.randint(2), owner=owner)
+            elif op == 1:
+                self.maps.set_point("Water", r, c, rng.randint(2))
+            elif op == 2:
+                health = rng.randint(2, size=self.size) * (rng.rand(*self.size) < 0.2)
+                owner = rng.randint(self.n_agents, size=self.size)
+                self.maps.set("House", dict(owner=owner, health=health))
+            elif op == 3:
+                self.maps.set("Water", (rng.rand(*self.size) < 0.1).astype(float))
+            elif rng.rand() < 0.1:
+                self.maps.clear(rng.choice([None, "House", "Water", "Wood"]))
+
+            accessibility = self.full_accessibility()
+            np.testing.assert_array_equal(self.maps.accessibility, accessibility)
+            np.testing.assert_array_equal(
+                self.maps.accessibility, self.maps._accessibility.prod(axis=0)
+            )
+
+    def test_state_and_empty(self):
+        """The map state buffer and the incrementally updated empty map match the
+        stacked entity maps after random changes to the maps."""
+        rng = np.random.RandomState(1)
+        empty = self.maps.empty
+        for _ in range(500):
+            op = rng.randint(5)
+            entity = rng.choice(["Wood", "Stone", "WoodSourceBlock", "Water"])
+            r, c = rng.randint(self.size[0]), rng.randint(self.size[1])
+            if op == 0:
+                self.maps.set_point(entity, r, c, rng.randint(3))
+            elif op == 1:
+                owner = self.maps.get_point("House", r, c, owner=True)
+                if owner == -1:
+                    owner = rng.randint(self.n_agents)
+                self.maps.set_point("House", r, c, rng.randint(2), owner=owner)
+            elif op == 2:
+                self.maps.set(
+                    entity, rng.randint(3, size=self.size) * (rng.rand() < 0.5)
+                )
+            elif op == 3:
+                self.maps.set_add(entity, rng.rand(*self.size) < 0.05)
+            elif rng.rand() < 0.1:
+                self.maps.clear(rng.choice([None, "House", "Wood"]))
+
+            stacked = np.stack([self.maps.get(k) for k in self.maps.keys()])
+            np.testing.assert_array_equal(self.maps.state, stacked)
+            np.testing.assert_array_equal(self.maps.empty, stacked.sum(axis=0) == 0)
+        self.assertTrue(np.shares_memory(self.maps.state, self.maps.get("Wood")))
+        self.assertFalse(empty.flags.writeable)
+
+    def test_set_point_blocking_landmark(self):
+        """Placing a blocking landmark only blocks its own location."""
+        self.maps.set_point("Water", 2, 3, 1)
+        self.assertEqual(self.maps.accessibility.sum(), self.n_agents * (8 * 9 - 1))
+        self.assertFalse(self.maps.is_accessible(2, 3, 0))
+
+    def test_state_dict_dtypes(self):
+        """The state dict returns each map with the dtype it was set with."""
+        self.maps.set("Wood", np.ones(self.size, dtype=np.int64))
+        self.maps.set_add("Wood", np.ones(self.size, dtype=bool))
+        self.maps.set("Stone", self.maps.get("Stone") + 1)
+        self.maps.set_point("Wood", 1, 2, 5)
+        self.maps.set_point("House", 1, 2, 1, owner=0)
+        state_dict = self.maps.state_dict
+
+        self.assertEqual(state_dict["Wood"].dtype, np.int64)
+        self.assertEqual(state_dict["Wood"][1, 2], 5)
+        self.assertEqual(state_dict["Wood"][0, 0], 2)
+        self.assertEqual(state_dict["Stone"].dtype, np.float64)
+        self.assertEqual(state_dict["Water"].dtype, np.float64)
+        self.assertEqual(state_dict["House"]["health"].dtype, np.float64)
+        self.assertEqual(state_dict["House"]["owner"].dtype, np.int16)
+
+        self.maps.clear("Wood")
+        self.assertEqual(self.maps.state_dict["Wood"].dtype, np.int64)
+
+    def test_dense_log_world_dtypes(self):
+        """The world maps of the dense log keep the dtypes set by the scenario."""
+        env = foundation.make_env_instance(
+            scenario_name="uniform/simple_wood_and_stone",
+            components=[{"Build": {}}, {"Gather": {}}],
+            n_agents=self.n_agents,
+            world_size=[15, 15],
+            episode_length=20,
+            seed=1,
+        )
+        env.reset(force_dense_logging=True)
+        for _ in range(env.episode_length):
+            env.step(
+                {
+                    agent.idx: np.random.randint(agent.action_spaces)
+                    for agent in env.world.agents
+                }
+            )
+        for world_maps in env.previous_episode_dense_log["world"]:
+            if not world_maps:
+                continue
+            for resource in ["Wood", "Stone", "WoodSourceBlock"]:
+                self.assertEqual(np.asarray(world_maps[resource]).dtype, np.int64)
+            self.assertEqual(
+                np.asarray(world_maps["House"]["health"]).dtype, np.float64
+            )
+
+
+class TestWorld(unittest.TestCase):
+    """Unit test to check the agent location bookkeeping of the world"""
+
+    def test_agent_locations(self):
+        """The agent index map and location array track the agent locations."""
+        world = World([6, 7], 5, ["Wood"], ["House"], False, False)
+        world.clear_agent_locs()
+        rng = np.random.RandomState(0)
+        for _ in range(300):
+            agent = world.agents[rng.randint(world.n_agents)]
+            if rng.rand() < 0.1:
+                world.maps.clear_agent_loc(agent)
+                agent.state["loc"] = [-1, -1]
+            elif rng.rand() < 0.02:
+                world.clear_agent_locs()
+            else:
+                world.set_agent_loc(agent, rng.randint(6), rng.randint(7))
+
+            loc_map = -np.ones([6, 7], dtype=np.int16)
+            for a in world.agents:
+                if a.loc[0] >= 0:
+                    loc_map[a.loc[0], a.loc[1]] = a.idx
+            np.testing.assert_array_equal(world.loc_map, loc_map)
+            np.testing.assert_array_equal(world.maps.unoccupied, loc_map == -1)
+            np.testing.assert_array_equal(
+                world.maps.agent_locs, [a.loc for a in world.agents]
+            )
+
+
+class TestAgentStateTable(unittest.TestCase):
+    """Unit test to check the agent state table and the agent state views"""
+
+    def make_world(self):
+        world = World([6, 7], 4, ["Wood", "Coin"], ["House"], False, False)
+        for agent in world.agents:
+            agent.register_inventory(["Wood", "Coin"])
+            agent.register_endogenous(["Labor"])
+            agent.state["build_payment"] = 10.0
+        return world
+
+    def test_views_and_columns(self):
+        """Agent states read and write the table columns."""
+        world = self.make_world()
+        world.agents[2].state["inventory"]["Coin"] = 5
+        world.build_agent_state_table()
+        table = world.agent_state_table
+
+        np.testing.assert_array_equal(table["inventory", "Coin"], [0, 0, 5, 0])
+        np.testing.assert_array_equal(table["build_payment"], [10, 10, 10, 10])
+
+        agent = world.agents[1]
+        agent.state["inventory"]["Wood"] += 3
+        agent.state["endogenous"]["Labor"] = 1.5
+        self.assertEqual(agent.inventory["Wood"], 3)
+        self.assertEqual(agent.total_endowment("Wood"), 3)
+        np.testing.assert_array_equal(
+            world.get_agent_state_column(("inventory", "Wood")), [0, 3, 0, 0]
+        )
+        np.testing.assert_array_equal(
+            world.get_agent_state_column(("endogenous", "Labor")), [0, 1.5, 0, 0]
+        )
+
+        world.set_agent_state_column(("inventory", "Coin"), np.arange(4))
+        self.assertEqual([a.inventory["Coin"] for a in world.agents], [0, 1, 2, 3])
+        self.assertFalse(
+            world.get_agent_state_column(("inventory", "Coin")).flags.writeable
+        )
+
+        # Assigning a dictionary to a group replaces its contents
+        agent.state["inventory"] = {"Wood": 1, "Coin": 2}
+        self.assertEqual(table["inventory", "Wood"][1], 1)
+        self.assertEqual(dict(agent.inventory), {"Wood": 1, "Coin": 2})
+        with self.assertRaises(KeyError):
+            agent.state["inventory"] = {"Wood": 1}
+        with self.assertRaises(TypeError):
+            agent.state["inventory"]["Coin"] = np.ones(3)
+
+        # Non-scalar and new fields are kept in the view
+        agent.state["endogenous"]["History"] = [1, 2]
+        agent.state["loc"] = [2, 3]
+        self.assertEqual(agent.loc, [2, 3])
+        self.assertEqual(
+            agent.state.to_dict(),
+            {
+                "loc": [2, 3],
+                "inventory": {"Wood": 1, "Coin": 2},
+                "escrow": {"Wood": 0, "Coin": 0},
+                "endogenous": {"Labor": 1.5, "History": [1, 2]},
+                "build_payment": 10.0,
+            },
+        )
+
+    def test_array_fields(self):
+        """Numeric array fields are stored as (n_agents, ...) columns."""
+        world = self.make_world()
+        for agent in world.agents:
+            agent.state["endogenous"]["History"] = np.zeros(3)
+        world.build_agent_state_table()
+        column = world.agent_state_table["endogenous", "History"]
+        self.assertEqual(column.shape, (4, 3))
+
+        history = world.agents[2].state["endogenous"]["History"]
+        history[:-1] = history[1:]
+        history[-1] = 5
+        world.agents[1].state["endogenous"]["History"] = [1, 2, 3]
+        np.testing.assert_array_equal(column[1:3], [[1, 2, 3], [0, 0, 5]])
+        with self.assertRaises(ValueError):
+            world.agents[1].state["endogenous"]["History"] = np.ones(4)
+
+        # Dictionary copies of the state do not share memory with the table
+        history = world.agents[2].state.to_dict()["endogenous"]["History"]
+        column[2] = 0
+        np.testing.assert_array_equal(history, [0, 0, 5])
+
+    def test_typed_fields(self):
+        """NumPy scalar fields keep their dtype, and strings use object columns."""
+        world = self.make_world()
+        for agent in world.agents:
+            agent.state["Total Infected"] = np.int32(0)
+            agent.state["Health Index"] = np.zeros(1, dtype=np.float32)
+            agent.state["Date"] = ""
+        world.build_agent_state_table()
+        table = world.agent_state_table
+        self.assertEqual(table["Total Infected"].dtype, np.int32)
+        self.assertEqual(table["Health Index"].dtype, np.float32)
+        self.assertEqual(table["Date"].dtype, object)
+        self.assertEqual(table["build_payment"].dtype, np.float64)
+
+        world.set_agent_state_column("Total Infected", np.arange(4.7, 8))
+        world.set_agent_state_column("Date", ["2020-03-22"] * 4)
+        agent = world.agents[1]
+        self.assertIsInstance(agent.state["Total Infected"], np.int32)
+        self.assertEqual(agent.state["Total Infected"], 5)
+        self.assertEqual(agent.state["Date"], "2020-03-22")
+        agent.state["Health Index"] += np.float32(0.25)
+        np.testing.assert_array_equal(table["Health Index"][:, 0], [0, 0.25, 0, 0])
+
+    def test_python_scalar_fields(self):
+        """Python ints and bools get int64 and bool columns, which are promoted
+        (rather than truncating) when floats or ints are written to them."""
+        world = self.make_world()
+        for agent in world.agents:
+            agent.state["Vaccinated"] = False
+        world.build_agent_state_table()
+        table = world.agent_state_table
+        self.assertEqual(table["inventory", "Wood"].dtype, np.int64)
+        self.assertEqual(table["Vaccinated"].dtype, np.bool_)
+
+        agent = world.agents[1]
+        agent.state["inventory"]["Wood"] += 3
+        self.assertEqual(table["inventory", "Wood"].dtype, np.int64)
+        agent.state["inventory"]["Coin"] += 2.5
+        self.assertEqual(table["inventory", "Coin"].dtype, np.float64)
+        self.assertEqual(agent.inventory["Coin"], 2.5)
+        world.set_agent_state_column(("endogenous", "Labor"), np.full(4, 0.5))
+        self.assertEqual(agent.endogenous["Labor"], 0.5)
+        world.set_agent_state_column("Vaccinated", [0, 2, 0, 0])
+        self.assertEqual(table["Vaccinated"].dtype, np.int64)
+        self.assertEqual(agent.state["Vaccinated"], 2)
+        np.testing.assert_array_equal(
+            world.get_agent_state_column(("inventory", "Wood")), [0, 3, 0, 0]
+        )
+
+    def test_environment_with_table(self):
+        """An episode with the agent state table matches an episode without."""
+        results = []
+        for use_agent_state_table in [False, True]:
+            env = foundation.make_env_instance(
+                scenario_name="uniform/simple_wood_and_stone",
+                components=[
+                    {"Build": {}},
+                    {"ContinuousDoubleAuction": {"max_num_orders": 5}},
+                    {"Gather": {}},
+                    {"PeriodicBracketTax": {"period": 10}},
+                ],
+                n_agents=4,
+                world_size=[15, 15],
+                episode_length=50,
+                use_agent_state_table=use_agent_state_table,
+                seed=1,
+            )
+            env.reset(force_dense_logging=True)
+            rewards = []
+            for _ in range(env.episode_length):
+                actions = {
+                    agent.idx: np.random.randint(agent.action_spaces)
+                    for agent in env.world.agents
+                }
+                _, rew, _, _ = env.step(actions)
+                rewards.append(rew)
+            results.append(
+                (rewards, env.previous_episode_dense_log, env.previous_episode_metrics)
+            )
+        self.assertEqual(results[0], results[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
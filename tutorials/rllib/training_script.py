@@ -7,6 +7,7 @@
 import argparse
 import logging
 import os
+import socket
 import sys
 import time
 
@@ -15,6 +16,7 @@ from utils import remote, saving
 import tf_models
 import yaml
 from env_wrapper import RLlibEnvWrapper
+from ai_economist.foundation.components.utils import SharedRingBuffers
 from ray.rllib.agents.ppo import PPOTrainer
 from ray.tune.logger import NoopLogger, pretty_print
 
@@ -199,12 +201,10 @@ def set_up_dirs_and_maybe_restore(run_directory, run_configuration, trainer_obj)
     )
 
 
-def maybe_sync_saez_buffer(trainer_obj, result_dict, run_configuration):
-    if result_dict["episodes_this_iter"] == 0:
-        return
-
+def get_saez_buffer_size(run_configuration):
+    """Return the Saez buffer size of each env (or None if not using the Saez
+    formula)."""
     # This logic just detects if we're using the Saez formula
-    sync_saez = False
     for component in run_configuration["env"]["components"]:
         assert isinstance(component, dict)
         c_name = list(component.keys())[0]
@@ -212,11 +212,44 @@ def maybe_sync_saez_buffer(trainer_obj, result_dict, run_configuration):
         if c_name in ["PeriodicBracketTax"]:
             tax_model = c_kwargs.get("tax_model", "")
             if tax_model == "saez":
-                sync_saez = True
-                break
+                return c_kwargs.get("saez_buffer_size", 500)
+    return None
+
+
+def maybe_share_saez_buffer(trainer_obj, run_configuration):
+    """If using the Saez formula, create a shared-memory buffer through which the
+    envs share their Saez samples, and attach the envs to it. Returns the buffer, or
+    None if not using the Saez formula or if the buffer cannot be shared (in which
+    case the samples are synced by maybe_sync_saez_buffer)."""
+    saez_buffer_size = get_saez_buffer_size(run_configuration)
+    if saez_buffer_size is None:
+        return None
+
+    if not run_configuration["general"].get("share_saez_buffer", True):
+        return None
+    if sys.version_info < (3, 8):
+        logger.info("Shared memory requires Python 3.8+: syncing the Saez buffers.")
+        return None
+    # Shared memory is only visible to the processes of this machine.
+    worker_hosts = trainer_obj.workers.foreach_worker(lambda w: socket.gethostname())
+    if set(worker_hosts) != {socket.gethostname()}:
+        logger.info("Rollout workers run on other nodes: syncing the Saez buffers.")
+        return None
+
+    # One slot per (remote) env replica
+    trainer_config = run_configuration["trainer"]
+    n_replicas = trainer_config["num_workers"] * trainer_config["num_envs_per_worker"]
+    shared_saez_buffer = SharedRingBuffers(n_replicas, saez_buffer_size)
+    remote.attach_shared_saez_buffers(trainer_obj, shared_saez_buffer)
+    return shared_saez_buffer
+
+
+def maybe_sync_saez_buffer(trainer_obj, result_dict, run_configuration):
+    if result_dict["episodes_this_iter"] == 0:
+        return
 
     # Do the actual syncing
-    if sync_saez:
+    if get_saez_buffer_size(run_configuration) is not None:
         remote.accumulate_and_broadcast_saez_buffers(trainer_obj)
 
 
@@ -286,6 +319,16 @@ if __name__ == "__main__":
         num_parallel_episodes_done,
     ) = set_up_dirs_and_maybe_restore(run_dir, run_config, trainer)
 
+    # Share the Saez samples across env replicas (if using the Saez formula). Each
+    # env reads the samples of all replicas when setting its tax rates. Without a
+    # shared buffer, the samples are synced after each training iteration.
+    shared_saez_buffer = maybe_share_saez_buffer(trainer, run_config)
+
+    # Have the logged envs stream their dense logs to disk while they are created,
+    # rather than keeping them in memory until the end of the episode.
+    if run_config["env"].get("dense_log_frequency", 0) > 0:
+        saving.stream_dense_logs(trainer, os.path.join(dense_log_dir, "streamed"))
+
     # ======================
     # === Start training ===
     # ======================
@@ -316,7 +359,8 @@ if __name__ == "__main__":
             logger.info(pretty_print(result))
 
         # === Saez logic ===
-        maybe_sync_saez_buffer(trainer, result, run_config)
+        if shared_saez_buffer is None:
+            maybe_sync_saez_buffer(trainer, result, run_config)
 
         # === Dense logging ===
         maybe_store_dense_log(trainer, result, dense_log_frequency, dense_log_dir)
@@ -333,4 +377,8 @@ if __name__ == "__main__":
     saving.save_tf_model_weights(trainer, ckpt_dir, global_step, suffix="planner")
     logger.info("Final snapshot saved! All done.")
 
+    if shared_saez_buffer is not None:
+        shared_saez_buffer.close()
+        shared_saez_buffer.unlink()
+
     ray.shutdown()  # shutdown Ray after use
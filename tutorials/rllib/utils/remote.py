@@ -61,9 +61,7 @@ def accumulate_and_broadcast_saez_buffers(trainer):
 
     replica_buffers = remote_env_fun(trainer, extract_local_saez_buffers)
 
-    global_buffer = []
-    for local_buffer in replica_buffers.values():
-        global_buffer += local_buffer
+    global_buffer = np.concatenate(list(replica_buffers.values()))
 
     def set_global_buffer(env_wrapper):
         env_wrapper.env.get_component(component_name).set_global_saez_buffer(
@@ -71,3 +69,20 @@ def accumulate_and_broadcast_saez_buffers(trainer):
         )
 
     _ = remote_env_fun(trainer, set_global_buffer)
+
+
+def attach_shared_saez_buffers(trainer, shared_saez_buffer):
+    """
+    Attach the PeriodicBracketTax component of each env to shared_saez_buffer (a
+    SharedRingBuffers instance), using the env_id as slot. The envs then read each
+    other's Saez samples directly, so accumulate_and_broadcast_saez_buffers is not
+    needed. All the envs must run on the machine that created shared_saez_buffer.
+    """
+    component_name = "PeriodicBracketTax"
+
+    def attach_shared_buffer(env_wrapper):
+        env_wrapper.env.get_component(component_name).attach_shared_saez_buffer(
+            shared_saez_buffer, env_wrapper.env_id
+        )
+
+    _ = remote_env_fun(trainer, attach_shared_buffer)
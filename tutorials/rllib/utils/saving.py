@@ -90,16 +90,50 @@ def make_run_dir_path(args, log_group):
     return run_dir, debug_dir, dense_log_dir, ckpt_dir, restore
 
 
+def stream_dense_logs(trainer, stream_directory, chunk_length=100):
+    """Have the (first 4) remote envs stream their dense logs to disk while they are
+    being created, under stream_directory/env<env_id>/, instead of keeping them in
+    memory until the end of the episode. write_dense_logs then copies the streamed
+    logs rather than serializing them."""
+
+    def set_directory(env_wrapper):
+        if 0 <= env_wrapper.env_id < 4:
+            env_wrapper.env.set_dense_log_directory(
+                os.path.join(stream_directory, "env{:03d}".format(env_wrapper.env_id)),
+                chunk_length=chunk_length,
+            )
+
+    remote_env_fun(trainer, set_directory)
+
+
+def copy_directory(src, dst):
+    """Copy the files under src to dst, keeping the directory structure. Unlike
+    shutil.copytree (before Python 3.8), dst may already exist."""
+    for dirpath, _, filenames in os.walk(src):
+        dst_dirpath = os.path.join(dst, os.path.relpath(dirpath, src))
+        if not os.path.isdir(dst_dirpath):
+            os.makedirs(dst_dirpath)
+        for filename in filenames:
+            shutil.copy2(
+                os.path.join(dirpath, filename), os.path.join(dst_dirpath, filename)
+            )
+
+
 def write_dense_logs(trainer, log_directory, suffix=""):
     def save_log(env_wrapper):
         if 0 <= env_wrapper.env_id < 4:
             my_path = os.path.join(
                 log_directory,
-                "env{:03d}{}.lz4".format(
+                "env{:03d}{}".format(
                     env_wrapper.env_id, "." + suffix if suffix != "" else ""
                 ),
             )
-            foundation.utils.save_episode_log(env_wrapper.env, my_path)
+            streamed_log = env_wrapper.env.previous_episode_dense_log_dirpath
+            if streamed_log is not None:
+                # Already on disk (columnar format): no need to serialize it
+                copy_directory(streamed_log, my_path)
+            else:
+                foundation.utils.save_episode_log(env_wrapper.env, my_path + ".lz4")
 
     remote_env_fun(trainer, save_log)
 
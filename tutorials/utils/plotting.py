@@ -120,8 +120,31 @@ def plot_log_state(dense_log, t, ax=None, remap_key=None):
     plot_map(maps, locs, ax, cmap_order)
 
 
+def _world_timesteps(dense_log):
+    """Timesteps for which the dense log includes a snapshot of the world maps."""
+    if hasattr(dense_log, "world_timesteps"):  # Columnar (memory-mapped) log
+        return dense_log.world_timesteps
+    return [i for i, w in enumerate(dense_log["world"]) if w]
+
+
+def _state_trajectory(dense_log, agent_idx, *keys):
+    """Trajectory of the agent state field indexed by keys (e.g. "inventory", "Coin").
+
+    Columnar (memory-mapped) logs only read the requested column from disk.
+    """
+    if hasattr(dense_log, "get_state_trajectory"):
+        return dense_log.get_state_trajectory(str(agent_idx), *keys)
+    values = []
+    for states in dense_log["states"]:
+        value = states[str(agent_idx)]
+        for k in keys:
+            value = value[k]
+        values.append(value)
+    return np.array(values)
+
+
 def _format_logs_and_eps(dense_logs, eps):
-    if isinstance(dense_logs, dict):
+    if not isinstance(dense_logs, (list, tuple)):
         return [dense_logs], [0]
     else:
         assert isinstance(dense_logs, (list, tuple))
@@ -178,7 +201,7 @@ def vis_world_range(
 ):
     dense_logs, eps = _format_logs_and_eps(dense_logs, eps)
 
-    viable_ts = np.array([i for i, w in enumerate(dense_logs[0]["world"]) if w])
+    viable_ts = np.array(_world_timesteps(dense_logs[0]))
     if tN is None:
         tN = viable_ts[-1]
     assert 0 <= t0 < tN
@@ -361,10 +384,8 @@ def breakdown(log, remap_key=None):
     for r, ax in zip(rs, axes):
         for i in range(n):
             ax.plot(
-                [
-                    x[str(aidx[i])]["inventory"][r] + x[str(aidx[i])]["escrow"][r]
-                    for x in log["states"]
-                ],
+                _state_trajectory(log, aidx[i], "inventory", r)
+                + _state_trajectory(log, aidx[i], "escrow", r),
                 label=i,
                 color=cmap(i),
             )
@@ -375,7 +396,7 @@ def breakdown(log, remap_key=None):
     ax = axes[-1]
     for i in range(n):
         ax.plot(
-            [x[str(aidx[i])]["endogenous"]["Labor"] for x in log["states"]],
+            _state_trajectory(log, aidx[i], "endogenous", "Labor"),
             label=i,
             color=cmap(i),
         )
@@ -393,8 +414,9 @@ def breakdown(log, remap_key=None):
         squeeze=False,
     )
     for i, ax in enumerate(axes[0]):
-        rows = np.array([x[str(aidx[i])]["loc"][0] for x in log["states"]]) * -1
-        cols = np.array([x[str(aidx[i])]["loc"][1] for x in log["states"]])
+        locs = _state_trajectory(log, aidx[i], "loc")
+        rows = locs[:, 0] * -1
+        cols = locs[:, 1]
         ax.plot(cols[::20], rows[::20])
         ax.plot(cols[0], rows[0], "r*", markersize=15)
         ax.plot(cols[-1], rows[-1], "g*", markersize=15)